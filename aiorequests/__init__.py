@@ -1,10 +1,69 @@
-from pkg_resources import resource_string
+import importlib
+import os
+import sys
+import types
 
-from aiorequests.api import (head, get, post, put, patch, delete, request,
-                             options)
-from aiorequests.content import collect, content, text_content, json_content
+__all__ = ['head', 'get', 'post', 'put', 'patch', 'delete', 'request',
+           'options', 'map', 'as_completed', 'collect', 'content',
+           'text_content', 'json_content']
 
-__all__ = ['head', 'get', 'post', 'put', 'patch', 'delete', 'request', 'options'
-           'collect', 'content', 'text_content', 'json_content']
+with open(os.path.join(os.path.dirname(__file__), '_version'), 'rb') as f:
+    __version__ = f.read().strip()
 
-__version__ = resource_string(__name__, "_version").strip()
+# aiohttp is only imported once one of these is used.
+_LAZY = {
+    'head': 'aiorequests.api',
+    'get': 'aiorequests.api',
+    'post': 'aiorequests.api',
+    'put': 'aiorequests.api',
+    'patch': 'aiorequests.api',
+    'delete': 'aiorequests.api',
+    'request': 'aiorequests.api',
+    'options': 'aiorequests.api',
+    'map': 'aiorequests.api',
+    'as_completed': 'aiorequests.api',
+    'collect': 'aiorequests.content',
+    'content': 'aiorequests.content',
+    'text_content': 'aiorequests.content',
+    'json_content': 'aiorequests.content',
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is not None:
+        value = getattr(importlib.import_module(module), name)
+        globals()[name] = value
+        return value
+
+    # Submodules, so that aiorequests.api works after "import aiorequests".
+    submodule = '{0}.{1}'.format(__name__, name)
+    try:
+        return importlib.import_module(submodule)
+    except ImportError as e:
+        if e.name != submodule:
+            raise
+    raise AttributeError(
+        "module 'aiorequests' has no attribute '{0}'".format(name))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing aiorequests.content binds the module over the content()
+        # function, which is what the package exports under that name.
+        if name in _LAZY and isinstance(value, types.ModuleType):
+            return
+        super(_Package, self).__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # No module __getattr__ (PEP 562) to load them on first use.
+    for _name in __all__:
+        __getattr__(_name)
@@ -4,7 +4,12 @@ Strictly internal utilities.
 
 import asyncio
 
-from aiohttp import ClientSession
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession, DummyCookieJar
+
+from aiorequests.pool import PooledConnector
+from aiorequests.timeouts import trace_config
 
 # TODO: Are these functions needed? asyncio implementes something similar
 def default_loop(loop):
@@ -16,9 +21,25 @@ def default_loop(loop):
     return loop
 
 
+def origin_of(url):
+    """
+    Return the origin of ``url``, as ``scheme://host[:port]``.
+    """
+    parts = urlsplit(url)
+    return '%s://%s' % (parts.scheme, parts.netloc)
+
+
 _global_pool = [None]
 
 
+def _session(loop, connector):
+    # Cookies are kept by every HTTPClient in its own jar: one shared by
+    # the session would send them to every client of the pool.
+    return ClientSession(connector=connector,
+                         cookie_jar=DummyCookieJar(loop=loop),
+                         trace_configs=[trace_config()], loop=loop)
+
+
 def get_global_pool():
     return _global_pool[0]
 
@@ -27,10 +48,19 @@ def set_global_pool(pool):
     _global_pool[0] = pool
 
 
-def default_pool(loop, pool, persistent):
+def default_pool(loop, pool, persistent, **connector_options):
     """
     Return the specified pool or a a pool with the specified loop and
     persistence.
+
+    Unless ``persistent`` is ``False`` a single keep-alive session is shared
+    by every caller, so connections (and their TCP/TLS handshakes) are reused
+    across requests.  A non-persistent pool closes each connection once its
+    response has been released.
+
+    Any ``connector_options`` (see :class:`aiorequests.pool.PooledConnector`)
+    give the caller a dedicated pool, since the shared one cannot be sized
+    for everybody.
     """
     loop = default_loop(loop)
 
@@ -38,9 +68,17 @@ def default_pool(loop, pool, persistent):
         return pool
 
     if persistent is False:
-        return ClientSession()
+        return _session(loop, PooledConnector(force_close=True, loop=loop,
+                                              **connector_options))
+
+    if connector_options:
+        return _session(loop, PooledConnector(loop=loop, **connector_options))
 
-    if get_global_pool() is None:
-        set_global_pool(ClientSession())
+    global_pool = get_global_pool()
+    # A pool only works on the loop it was made for, so each asyncio.run()
+    # gets a new one.
+    if (global_pool is None or global_pool.closed or
+            global_pool._loop is not loop):
+        set_global_pool(_session(loop, PooledConnector(loop=loop)))
 
     return get_global_pool()
@@ -1,3 +1,5 @@
+import asyncio
+
 import aiohttp
 
 from aiorequests.client import HTTPClient
@@ -10,7 +12,7 @@ def head(url, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).head(url, **kwargs)
+    return _request('HEAD', url, **kwargs)
 
 
 def get(url, headers=None, **kwargs):
@@ -19,7 +21,7 @@ def get(url, headers=None, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).get(url, headers=headers, **kwargs)
+    return _request('GET', url, headers=headers, **kwargs)
 
 
 def post(url, data=None, **kwargs):
@@ -28,7 +30,7 @@ def post(url, data=None, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).post(url, data=data, **kwargs)
+    return _request('POST', url, data=data, **kwargs)
 
 
 def put(url, data=None, **kwargs):
@@ -37,7 +39,7 @@ def put(url, data=None, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).put(url, data=data, **kwargs)
+    return _request('PUT', url, data=data, **kwargs)
 
 
 def patch(url, data=None, **kwargs):
@@ -46,7 +48,7 @@ def patch(url, data=None, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).patch(url, data=data, **kwargs)
+    return _request('PATCH', url, data=data, **kwargs)
 
 
 def delete(url, **kwargs):
@@ -55,7 +57,7 @@ def delete(url, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).delete(url, **kwargs)
+    return _request('DELETE', url, **kwargs)
 
 
 def options(url, **kwargs):
@@ -64,7 +66,36 @@ def options(url, **kwargs):
 
     See :py:func:`aiorequests.request`
     """
-    return _client(**kwargs).options(url, **kwargs)
+    return _request('OPTIONS', url, **kwargs)
+
+
+def map(specs, concurrency=10, per_host=None, **kwargs):
+    """
+    Send many requests with bounded concurrency, yielding responses in the
+    order of ``specs``.
+
+    See :py:meth:`aiorequests.client.HTTPClient.map`
+    """
+    client = _client(**kwargs)
+    iterator = client.map(specs, concurrency=concurrency, per_host=per_host)
+    if not client._owns_pool:
+        return iterator
+    return _ClosingIterator(client, iterator)
+
+
+def as_completed(specs, concurrency=10, per_host=None, **kwargs):
+    """
+    Send many requests with bounded concurrency, yielding responses as they
+    complete.
+
+    See :py:meth:`aiorequests.client.HTTPClient.as_completed`
+    """
+    client = _client(**kwargs)
+    iterator = client.as_completed(specs, concurrency=concurrency,
+                                   per_host=per_host)
+    if not client._owns_pool:
+        return iterator
+    return _ClosingIterator(client, iterator)
 
 
 def request(method, url, **kwargs):
@@ -82,13 +113,21 @@ def request(method, url, **kwargs):
         the URL, any query string parameters in the URL already will be
         preserved.
 
-    :type params: dict w/ str or list/tuple of str values, list of 2-tuples, or
-        None.
+    :type params: dict w/ str or list/tuple of str values, list of 2-tuples,
+        :class:`aiorequests.urls.EncodedParams` to reuse an encoded query
+        string, or None.
 
-    :param data: Optional request body.
-    :type data: str, file-like, IBodyProducer, or None
+    :param data: Optional request body.  Async iterators, async file-like
+        objects and generators are streamed as they produce the body, with
+        ``Transfer-Encoding: chunked`` unless a ``Content-Length`` header
+        gives its length.
+    :type data: str, file-like, async iterator, generator,
+        :class:`aiorequests.streaming.StreamingBody`, IBodyProducer, or None
 
-    :param reactor: Optional twisted reactor.
+    :param loop: Optional asyncio event loop.
+
+    :param pool: Optional ``aiohttp.ClientSession`` to send the request
+        through.  Defaults to a shared keep-alive session.
 
     :param bool persistent: Use persistent HTTP connections.  Default: ``True``
     :param bool allow_redirects: Follow HTTP redirects.  Default: ``True``
@@ -98,16 +137,35 @@ def request(method, url, **kwargs):
 
     :param cookies: Cookies to send with this request.  The HTTP kind, not the
         tasty kind.
-    :type cookies: ``dict`` or ``cookielib.CookieJar``
+    :type cookies: ``dict``, ``cookielib.CookieJar`` or
+        :class:`aiorequests.cookies.CookieStore`
+
+    :param bool coalesce: Share the upstream request and response body with
+        identical ``GET`` or ``HEAD`` requests already in flight.  Default:
+        ``False``
+
+    :param bool cache: Consult the client's response cache, if it has one.
+        Default: ``True``
+
+    :param retry: :class:`aiorequests.retry.RetryPolicy` for this request,
+        or ``False`` to not retry.  Default: the client's policy.
+
+    :param hedge: :class:`aiorequests.hedge.HedgePolicy` for this request,
+        or ``False`` to not hedge.  Default: the client's policy.
+
+    :param bool verify: Verify the server's TLS certificate.  Default:
+        ``True``
 
-    :param int timeout: Request timeout seconds. If a response is not
-        received within this timeframe, a connection is aborted with
-        ``CancelledError``.
+    :param timeout: Seconds until the request, including reading its body,
+        is aborted with :class:`aiorequests.timeouts.TotalTimeout`, or a
+        :class:`aiorequests.timeouts.Timeouts` with a deadline for each
+        phase of the request.  Every attempt of a retried request gets the
+        full deadlines.
 
     :rtype: Deferred that fires with an IResponse provider.
 
     """
-    return _client(**kwargs).request(method, url, **kwargs)
+    return _request(method, url, **kwargs)
 
 
 #
@@ -115,4 +173,93 @@ def request(method, url, **kwargs):
 #
 
 def _client(*args, **kwargs):
-    return HTTPClient()
+    return HTTPClient(pool=kwargs.get('pool'), loop=kwargs.get('loop'),
+                      persistent=kwargs.get('persistent'))
+
+
+def _request(method, url, **kwargs):
+    client = _client(**kwargs)
+    if not client._owns_pool:
+        return client.request(method, url, **kwargs)
+    return _closing(client, client.request(method, url, **kwargs))
+
+
+@asyncio.coroutine
+def _closing(client, sending):
+    """
+    Return the response of ``sending`` and close the pool ``client`` made
+    for it once the connection of the response is released, which happens
+    when its body has been read.
+    """
+    try:
+        response = yield from sending
+    except BaseException:
+        yield from client.close()
+        raise
+    yield from _close_once_released(client, [response])
+    return response
+
+
+@asyncio.coroutine
+def _close_once_released(client, responses):
+    """
+    Close the pool ``client`` made once the connections of ``responses``
+    are released, which happens when their bodies have been read.
+    """
+    connections = [
+        connection for connection in (
+            getattr(getattr(response, 'original', None), 'connection', None)
+            for response in responses)
+        if connection is not None]
+    if not connections:
+        yield from client.close()
+        return
+
+    remaining = [len(connections)]
+
+    def released():
+        remaining[0] -= 1
+        if not remaining[0]:
+            asyncio.ensure_future(client.close(), loop=client._loop)
+
+    for connection in connections:
+        connection.add_callback(released)
+
+
+class _ClosingIterator(object):
+    """
+    A :class:`aiorequests.batch.BatchIterator` that closes the pool
+    ``client`` made for it once it stops, and the bodies of the responses it
+    yielded have been read.
+    """
+    def __init__(self, client, iterator):
+        self._client = client
+        self._iterator = iterator
+        self._responses = []
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        try:
+            response = yield from self._iterator.__anext__()
+        except BaseException:
+            yield from self._close()
+            raise
+        self._responses.append(response)
+        return response
+
+    def cancel(self):
+        """
+        Cancel every request still in flight and close the pool.
+        """
+        self._iterator.cancel()
+        return asyncio.ensure_future(self._close(), loop=self._client._loop)
+
+    @asyncio.coroutine
+    def _close(self):
+        # Requests still in flight would fail once the pool is closed.
+        self._iterator.cancel()
+        responses, self._responses = self._responses, []
+        yield from _close_once_released(self._client, responses)
@@ -0,0 +1,176 @@
+"""
+Bounded-concurrency execution of many requests.
+"""
+
+import asyncio
+
+from collections import OrderedDict, deque
+
+from aiorequests._utils import origin_of
+
+
+class BatchIterator(object):
+    """
+    Asynchronous iterator that sends requests from ``specs`` through
+    ``client`` and yields their responses.
+
+    At most ``concurrency`` requests are in flight, and at most ``per_host``
+    to any one origin; requests for busy origins wait in line while other
+    origins are served.  ``specs`` is only consumed as fast as responses are
+    taken from the iterator, so it may be an unbounded generator.
+
+    :param client: The :class:`aiorequests.client.HTTPClient` to use.
+    :param specs: Iterable (or asynchronous iterable) of
+        ``(method, url)`` or ``(method, url, kwargs)`` tuples.
+    :param int concurrency: Maximum number of requests in flight.
+    :param int per_host: Maximum number of requests in flight per origin.
+        ``None`` for no per-origin limit.
+    :param bool ordered: Yield responses in the order of ``specs`` rather
+        than as they complete.
+    :param bool return_exceptions: Yield exceptions of failed requests
+        instead of raising them.
+    """
+    def __init__(self, client, specs, concurrency=10, per_host=None,
+                 ordered=False, return_exceptions=False, loop=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self._client = client
+        self._loop = loop or asyncio.get_event_loop()
+        if hasattr(specs, '__aiter__'):
+            self._specs = specs.__aiter__()
+            self._async_specs = True
+        else:
+            self._specs = iter(specs)
+            self._async_specs = False
+        self._concurrency = concurrency
+        self._per_host = per_host
+        self._ordered = ordered
+        self._return_exceptions = return_exceptions
+
+        self._exhausted = False
+        self._index = 0
+        self._next_index = 0
+        self._running = set()
+        self._active = {}
+        self._parked = OrderedDict()
+        self._parked_count = 0
+        self._finished = deque() if not ordered else {}
+        self._wakeup = None
+
+    def __aiter__(self):
+        return self
+
+    def _host_free(self, host):
+        return not self._per_host or self._active.get(host, 0) < self._per_host
+
+    def _start(self, index, host, spec):
+        method, url = spec[0], spec[1]
+        kwargs = spec[2] if len(spec) > 2 else {}
+
+        self._active[host] = self._active.get(host, 0) + 1
+        task = asyncio.ensure_future(
+            self._client.request(method, url, **kwargs), loop=self._loop)
+        self._running.add(task)
+        task.add_done_callback(
+            lambda t: self._on_done(t, index, host))
+
+    def _on_done(self, task, index, host):
+        self._running.discard(task)
+        self._active[host] -= 1
+        if not self._active[host]:
+            del self._active[host]
+
+        if self._ordered:
+            self._finished[index] = task
+        else:
+            self._finished.append(task)
+
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def _start_parked(self):
+        for host in list(self._parked):
+            if not self._host_free(host):
+                continue
+            queue = self._parked[host]
+            index, spec = queue.popleft()
+            self._parked_count -= 1
+            if queue:
+                # Round-robin: the next parked request of this origin goes
+                # to the back of the line.
+                self._parked.move_to_end(host)
+            else:
+                del self._parked[host]
+            self._start(index, host, spec)
+            return True
+        return False
+
+    @asyncio.coroutine
+    def _next_spec(self):
+        try:
+            if self._async_specs:
+                return (yield from self._specs.__anext__())
+            return next(self._specs)
+        except (StopIteration, StopAsyncIteration):
+            self._exhausted = True
+            return None
+
+    @asyncio.coroutine
+    def _fill(self):
+        while len(self._running) < self._concurrency:
+            if self._start_parked():
+                continue
+            if (self._exhausted or
+                    self._parked_count >= self._concurrency or
+                    len(self._finished) >= self._concurrency):
+                return
+            spec = yield from self._next_spec()
+            if spec is None:
+                return
+
+            index = self._index
+            self._index += 1
+            host = origin_of(spec[1])
+            if self._host_free(host):
+                self._start(index, host, spec)
+            else:
+                self._parked.setdefault(host, deque()).append((index, spec))
+                self._parked_count += 1
+
+    def _pop_finished(self):
+        if not self._ordered:
+            return self._finished.popleft() if self._finished else None
+        task = self._finished.pop(self._next_index, None)
+        if task is not None:
+            self._next_index += 1
+        return task
+
+    @asyncio.coroutine
+    def __anext__(self):
+        while True:
+            yield from self._fill()
+
+            task = self._pop_finished()
+            if task is not None:
+                if task.cancelled() or task.exception() is None:
+                    return task.result()
+                if self._return_exceptions:
+                    return task.exception()
+                raise task.exception()
+
+            if not self._running:
+                raise StopAsyncIteration
+
+            self._wakeup = self._loop.create_future()
+            yield from self._wakeup
+            self._wakeup = None
+
+    def cancel(self):
+        """
+        Cancel every request still in flight and stop reading ``specs``.
+        """
+        self._exhausted = True
+        self._parked.clear()
+        self._parked_count = 0
+        for task in list(self._running):
+            task.cancel()
@@ -0,0 +1,164 @@
+"""
+Per-origin circuit breaking.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+
+from aiorequests._utils import origin_of
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to an origin whose circuit is open.
+    """
+    def __init__(self, origin):
+        super(CircuitOpenError, self).__init__(
+            'Circuit for {0} is open.'.format(origin))
+        self.origin = origin
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.successes = 0
+
+
+class CircuitBreaker(object):
+    """
+    Stop sending requests to an origin after ``failure_threshold``
+    consecutive failures.
+
+    While the circuit of an origin is open its requests fail at once with
+    :class:`CircuitOpenError`.  After ``reset_timeout`` seconds it becomes
+    half-open and lets ``probes`` requests through at a time; it closes
+    again when that many succeed in a row and opens again on the first
+    failure.
+
+    :param int failure_threshold: Consecutive failures that open a circuit.
+    :param float reset_timeout: Seconds a circuit stays open.
+    :param int probes: Requests let through, and successes needed, while
+        half-open.
+    :param statuses: Response statuses that count as failures.  Default:
+        5xx.
+    :param exceptions: Exceptions that count as failures.  Default:
+        connection errors and timeouts.
+    :param hooks: Callables called with ``(origin, old_state, new_state)``
+        on every transition.
+    :param clock: Callable returning monotonic seconds.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, probes=1,
+                 statuses=range(500, 600),
+                 exceptions=(aiohttp.ClientConnectionError,
+                             asyncio.TimeoutError),
+                 hooks=(), clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+        self.hooks = list(hooks)
+        self._clock = clock
+        self._circuits = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def state(self, url):
+        """
+        Return the state of the circuit of the origin of ``url``.
+        """
+        circuit = self._circuits.get(origin_of(url))
+        if circuit is None:
+            return CLOSED
+        if (circuit.state == OPEN and
+                self._clock() - circuit.opened_at >= self.reset_timeout):
+            return HALF_OPEN
+        return circuit.state
+
+    def states(self):
+        """
+        Return a ``dict`` of the origins seen so far and their states.
+        """
+        return dict((origin, self.state(origin)) for origin in self._circuits)
+
+    def _transition(self, origin, circuit, state):
+        old, circuit.state = circuit.state, state
+        if state == OPEN:
+            circuit.opened_at = self._clock()
+        elif state == HALF_OPEN:
+            circuit.probes = circuit.successes = 0
+        else:
+            circuit.failures = 0
+        for hook in self.hooks:
+            hook(origin, old, state)
+
+    def acquire(self, url):
+        """
+        Let a request to ``url`` through or raise :class:`CircuitOpenError`.
+        """
+        origin = origin_of(url)
+        circuit = self._circuits.get(origin)
+        if circuit is None:
+            circuit = self._circuits[origin] = _Circuit()
+
+        if circuit.state == OPEN:
+            if self._clock() - circuit.opened_at < self.reset_timeout:
+                raise CircuitOpenError(origin)
+            self._transition(origin, circuit, HALF_OPEN)
+        if circuit.state == HALF_OPEN:
+            if circuit.probes >= self.probes:
+                raise CircuitOpenError(origin)
+            circuit.probes += 1
+        return origin, circuit, circuit.state
+
+    def _release(self, token, failed):
+        origin, circuit, state = token
+        if circuit.state != state:
+            # The circuit changed while the request was in flight.
+            return
+        if state == HALF_OPEN:
+            circuit.probes -= 1
+            if failed:
+                self._transition(origin, circuit, OPEN)
+            elif failed is False:
+                circuit.successes += 1
+                if circuit.successes >= self.probes:
+                    self._transition(origin, circuit, CLOSED)
+        elif failed is not None:
+            if failed:
+                circuit.failures += 1
+                if circuit.failures >= self.failure_threshold:
+                    self._transition(origin, circuit, OPEN)
+            else:
+                circuit.failures = 0
+
+    @asyncio.coroutine
+    def call(self, send, url):
+        """
+        Call the coroutine function ``send`` if the circuit of ``url``
+        allows it and count its outcome.
+        """
+        token = self.acquire(url)
+        # None: cancelled or failed for another reason, which says nothing
+        # about the health of the origin.
+        failed = None
+        try:
+            resp = yield from send()
+            failed = resp.status in self.statuses
+            return resp
+        except self.exceptions:
+            failed = True
+            raise
+        finally:
+            self._release(token, failed)
@@ -0,0 +1,86 @@
+"""
+Reusable buffers for reading response bodies without copying them around.
+"""
+
+
+class BufferPool(object):
+    """
+    Idle ``bytearray`` buffers kept for reuse, in power-of-two sizes, so
+    that reading many large bodies does not allocate and free as much
+    memory every time.
+
+    :param int min_size: Smallest buffer handed out.
+    :param int max_size: Buffers larger than this are not kept.
+    :param int max_bytes: Total size of the idle buffers kept.
+    """
+    def __init__(self, min_size=64 * 1024, max_size=16 * 1024 * 1024,
+                 max_bytes=64 * 1024 * 1024):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.idle_bytes = 0
+        self.allocated = 0
+        self.reused = 0
+        self._free = {}
+
+    def _size(self, size):
+        rounded = self.min_size
+        while rounded < size:
+            rounded *= 2
+        return rounded
+
+    def acquire(self, size):
+        """
+        Return a buffer of at least ``size`` bytes.
+        """
+        size = self._size(size)
+        free = self._free.get(size)
+        if free:
+            self.reused += 1
+            self.idle_bytes -= size
+            return free.pop()
+        self.allocated += 1
+        return bytearray(size)
+
+    def release(self, buffer):
+        """
+        Give back a buffer from :meth:`acquire` once nothing uses it.
+        """
+        size = len(buffer)
+        if (size > self.max_size or size != self._size(size) or
+                self.idle_bytes + size > self.max_bytes):
+            return
+        self._free.setdefault(size, []).append(buffer)
+        self.idle_bytes += size
+
+
+class PooledBody(object):
+    """
+    A response body read into a buffer of a :class:`BufferPool`.
+
+    ``view`` is a ``memoryview`` of the body, which slices without copying.
+    Call :meth:`release`, or use the body as a context manager, to give the
+    buffer back once neither it nor slices of it are used any more.
+    """
+    def __init__(self, pool, buffer, length):
+        self._pool = pool
+        self._buffer = buffer
+        self.view = memoryview(buffer)[:length]
+
+    def __len__(self):
+        return len(self.view)
+
+    def __bytes__(self):
+        return self.view.tobytes()
+
+    def release(self):
+        if self._buffer is not None:
+            self.view.release()
+            self._pool.release(self._buffer)
+            self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,708 @@
+"""
+HTTP response caches (RFC 7234, private cache semantics): in memory, on
+disk, or both.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import time
+
+from collections import OrderedDict, namedtuple
+from email.utils import mktime_tz, parsedate_tz
+
+from multidict import CIMultiDict, CIMultiDictProxy
+
+
+HIT = 'hit'
+MISS = 'miss'
+REVALIDATED = 'revalidated'
+
+# Status codes that may be cached without explicit freshness information,
+# RFC 7231 section 6.1.
+_HEURISTIC_STATUSES = frozenset([200, 203, 204, 300, 301, 404, 405, 410, 414,
+                                 501])
+
+# Headers of a 304 response that must not replace the stored ones.
+_NOT_UPDATED = frozenset(['content-length', 'content-encoding',
+                          'transfer-encoding', 'content-range'])
+
+_HEURISTIC_FRACTION = 0.1
+_HEURISTIC_MAX = 24 * 60 * 60
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def parse_cache_control(value):
+    """
+    Parse a ``Cache-Control`` header into a ``dict`` of lower-cased
+    directives; directives without an argument map to ``None``.
+    """
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(','):
+        name, _, arg = part.strip().partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def _seconds(directives, name):
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _http_date(value):
+    if not value:
+        return None
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+def header_items(headers):
+    """
+    Return ``(name, value)`` pairs of request headers given as a ``dict``
+    (possibly with list values) or a list of pairs.
+    """
+    if not headers:
+        return []
+    if hasattr(headers, 'items'):
+        headers = headers.items()
+    items = []
+    for name, value in headers:
+        if isinstance(value, list):
+            items.extend((name, v) for v in value)
+        else:
+            items.append((name, value))
+    return items
+
+
+def _vary(response):
+    return tuple(name.strip().lower()
+                 for name in response.headers.get('Vary', '').split(',')
+                 if name.strip())
+
+
+def _request_header(headers, name):
+    name = name.lower()
+    values = [str(v) for k, v in header_items(headers) if k.lower() == name]
+    return ', '.join(values) if values else None
+
+
+class CacheEntry(object):
+    """
+    A stored response.
+    """
+    def __init__(self, url, response, body, vary, now):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.version = response.version
+        self.headers = CIMultiDict(response.headers)
+        self.body = body
+        self.vary = vary
+        self.response_time = now
+        self.key = None
+        # Called with the body once a response of the entry has read it.
+        self.on_read = None
+        self.size = len(body) + sum(len(k) + len(v)
+                                    for k, v in self.headers.items())
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+    def directives(self):
+        return parse_cache_control(self.headers.get('Cache-Control'))
+
+    def freshness_lifetime(self):
+        directives = self.directives()
+        max_age = _seconds(directives, 'max-age')
+        if max_age is not None:
+            return max_age
+
+        date = _http_date(self.headers.get('Date')) or self.response_time
+        expires = self.headers.get('Expires')
+        if expires is not None:
+            expires = _http_date(expires)
+            # Invalid dates, such as "0", mean already expired.
+            return max(0, expires - date) if expires is not None else 0
+
+        last_modified = _http_date(self.last_modified)
+        if last_modified is not None and self.status in _HEURISTIC_STATUSES:
+            return min(_HEURISTIC_MAX,
+                       max(0, date - last_modified) * _HEURISTIC_FRACTION)
+        return 0
+
+    def age(self, now):
+        try:
+            age = max(0, int(self.headers.get('Age', 0)))
+        except ValueError:
+            age = 0
+        return age + max(0, now - self.response_time)
+
+    def is_fresh(self, now, request_directives=None):
+        request_directives = request_directives or {}
+        if 'no-cache' in self.directives() or 'no-cache' in request_directives:
+            return False
+        lifetime = self.freshness_lifetime()
+        max_age = _seconds(request_directives, 'max-age')
+        if max_age is not None:
+            lifetime = min(lifetime, max_age)
+        return self.age(now) < lifetime
+
+    def conditional_headers(self):
+        headers = []
+        if self.etag is not None:
+            headers.append(('If-None-Match', self.etag))
+        if self.last_modified is not None:
+            headers.append(('If-Modified-Since', self.last_modified))
+        return headers
+
+    def freshen(self, headers, now):
+        """
+        Update the entry from the headers of a ``304 Not Modified``.
+        """
+        for name in set(k.lower() for k in headers.keys()):
+            if name in _NOT_UPDATED:
+                continue
+            self.headers.popall(name, None)
+            for value in headers.getall(name):
+                self.headers.add(name, value)
+        self.response_time = now
+
+    def response(self, original=None):
+        return CachedResponse(self, original)
+
+
+class CachedResponse(object):
+    """
+    A response served from a :class:`CacheEntry`, with the parts of the
+    ``aiohttp.ClientResponse`` interface that :class:`_Response` relies on.
+    Other attributes, such as ``cookies``, are those of ``original``, the
+    response the entry was just stored from, if any.
+    """
+    def __init__(self, entry, original=None):
+        self.url = entry.url
+        self.status = entry.status
+        self.reason = entry.reason
+        self.version = entry.version
+        self.headers = CIMultiDictProxy(CIMultiDict(entry.headers))
+        self._body = entry.body
+        self._on_read = entry.on_read
+        self._original = original
+        self._stream = None
+
+    def __getattr__(self, name):
+        if self._original is None:
+            raise AttributeError(name)
+        return getattr(self._original, name)
+
+    @property
+    def content(self):
+        """
+        The body as a stream, for bodies kept on disk; ``None`` for those in
+        memory.
+        """
+        if self._stream is None and isinstance(self._body, _DiskBody):
+            self._stream = _MappedStream(self._body)
+        return self._stream
+
+    def _get_encoding(self, encoding):
+        content_type = self.headers.get('Content-Type', '')
+        for param in content_type.split(';')[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'charset':
+                return value.strip('"\'')
+        return encoding
+
+    def get_encoding(self):
+        return self._get_encoding('utf-8')
+
+    @asyncio.coroutine
+    def read(self):
+        body = self._body
+        if isinstance(body, _DiskBody):
+            loop = asyncio.get_event_loop()
+            body = yield from loop.run_in_executor(None, body.read)
+            if self._on_read is not None:
+                self._on_read(body)
+        return bytes(body)
+
+    @asyncio.coroutine
+    def text(self, encoding=None, errors='strict'):
+        body = yield from self.read()
+        return body.decode(encoding or self.get_encoding(), errors)
+
+    @asyncio.coroutine
+    def json(self, *, encoding=None, loads=json.loads, **kwargs):
+        body = yield from self.text(encoding=encoding)
+        if not body.strip():
+            return None
+        return loads(body)
+
+    def release(self):
+        if self._stream is not None:
+            self._stream.close()
+
+    def close(self):
+        self.release()
+
+
+class MemoryCache(object):
+    """
+    A private HTTP cache that keeps responses in memory and evicts the least
+    recently used ones once their bodies and headers exceed ``max_bytes``.
+
+    :param int max_bytes: Total size of the cache.
+    :param int max_entry_bytes: Largest response that will be stored.
+        Default: ``max_bytes``.
+    :param clock: Callable returning the current time in seconds since the
+        epoch.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None,
+                 clock=time.time):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.size = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        # url -> (vary header names, keys of the stored variants)
+        self._urls = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def now(self):
+        return self._clock()
+
+    @staticmethod
+    def _key(url, request_headers, vary):
+        return (url, tuple(_request_header(request_headers, name)
+                           for name in vary))
+
+    def lookup(self, url, request_headers):
+        """
+        Return the stored entry matching ``url`` and the ``Vary`` headers of
+        the request, or ``None``.
+        """
+        stored = self._urls.get(url)
+        if stored is None:
+            return None
+        key = self._key(url, request_headers, stored[0])
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def storable(self, method, request_headers, response):
+        if method != 'GET':
+            return False
+        request_directives = parse_cache_control(
+            _request_header(request_headers, 'Cache-Control'))
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in request_directives or 'no-store' in directives:
+            return False
+        if response.headers.get('Vary', '').strip() == '*':
+            return False
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > self.max_entry_bytes:
+            return False
+        if 'max-age' in directives or 'Expires' in response.headers:
+            return True
+        if 'no-cache' in directives:
+            return ('ETag' in response.headers or
+                    'Last-Modified' in response.headers)
+        return (response.status in _HEURISTIC_STATUSES and
+                'Last-Modified' in response.headers)
+
+    def store(self, url, request_headers, response, body):
+        """
+        Store ``response`` with its ``body`` and return the new entry, or
+        ``None`` if it is too large.
+        """
+        entry = CacheEntry(url, response, body, _vary(response), self.now())
+        if entry.size > self.max_entry_bytes:
+            return None
+        self._put(request_headers, entry)
+        return entry
+
+    def _put(self, request_headers, entry):
+        stored = self._urls.get(entry.url)
+        if stored is not None and stored[0] != entry.vary:
+            self.invalidate(entry.url)
+        key = self._key(entry.url, request_headers, entry.vary)
+        self._remove(key)
+
+        entry.key = key
+        self._save(entry)
+        self._add(entry)
+
+    def _save(self, entry):
+        pass
+
+    def _add(self, entry):
+        self._urls.setdefault(entry.url, (entry.vary, set()))[1].add(entry.key)
+        self._entries[entry.key] = entry
+        self.size += entry.size
+
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def freshen(self, entry, headers):
+        """
+        Update ``entry`` from the headers of a ``304 Not Modified``.
+        """
+        entry.freshen(headers, self.now())
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        keys = self._urls[key[0]][1]
+        keys.discard(key)
+        if not keys:
+            del self._urls[key[0]]
+
+    def invalidate(self, url):
+        """
+        Drop every stored variant of ``url``.
+        """
+        stored = self._urls.get(url)
+        if stored is not None:
+            for key in list(stored[1]):
+                self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._urls.clear()
+        self.size = 0
+
+
+# The parts of a response CacheEntry needs, as read back from disk.
+_StoredResponse = namedtuple('_StoredResponse',
+                             ['status', 'reason', 'version', 'headers'])
+
+
+class _DiskBody(object):
+    """
+    The body of a :class:`DiskCache` entry, left in its file until it is
+    served so that cached entries do not hold file descriptors open.  It
+    is mapped into memory only while it is read.
+
+    ``file`` is an open file of a body that has no path, such as one
+    spooled to disk but too large to keep.
+    """
+    __slots__ = ('path', 'size', '_file')
+
+    def __init__(self, path, size=None, file=None):
+        self.path = path
+        self.size = os.stat(path).st_size if size is None else size
+        self._file = file
+
+    def __len__(self):
+        return self.size
+
+    def map(self):
+        """
+        Map the body into memory; the caller closes the map.  The file
+        itself is closed straight away.
+        """
+        f = self._file if self._file is not None else open(self.path, 'rb')
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            if f is not self._file:
+                f.close()
+
+    def read(self):
+        """
+        Return the whole body.  This blocks on the disk, so the event loop
+        runs it in an executor.
+        """
+        if not self.size:
+            return b''
+        with self.map() as body:
+            return body[:]
+
+    def __bytes__(self):
+        return self.read()
+
+
+class _MappedStream(object):
+    """
+    A :class:`_DiskBody` read chunk by chunk, like the ``content`` stream of
+    a response, from a map that is closed once the body has been read.
+    """
+    def __init__(self, body):
+        self._body = body
+        self._map = None
+        self._offset = 0
+
+    @asyncio.coroutine
+    def read(self, n=-1):
+        if self._offset >= self._body.size:
+            return b''
+        if self._map is None:
+            self._map = self._body.map()
+        end = self._body.size if n < 0 else self._offset + n
+        chunk = self._map[self._offset:end]
+        self._offset += len(chunk)
+        if self._offset >= self._body.size:
+            self.close()
+        return chunk
+
+    def readany(self):
+        return self.read(_CHUNK_SIZE)
+
+    def close(self):
+        # Nothing more is served once closed.
+        self._offset = self._body.size
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class DiskCache(MemoryCache):
+    """
+    A :class:`MemoryCache` that keeps response bodies in files under
+    ``path`` and only their headers in memory.  Bodies are written to their
+    files as they arrive and mapped from them when served, off the event
+    loop or chunk by chunk, and the cache is reloaded from ``path`` when it
+    is opened again, so it survives restarts of the process.
+
+    Every response is stored as a ``<digest>.body`` file and a
+    ``<digest>.meta`` file with its URL, ``Vary`` key, status and headers;
+    the least recently used ones are deleted once they exceed
+    ``max_bytes``.
+
+    :param str path: Directory to keep the cache in.
+    :param int max_bytes: Disk budget of the cache.
+    :param int max_entry_bytes: Largest response that will be stored.
+        Default: ``max_bytes``.
+    :param clock: Callable returning the current time in seconds since the
+        epoch.
+    """
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024,
+                 max_entry_bytes=None, clock=time.time):
+        super(DiskCache, self).__init__(max_bytes, max_entry_bytes, clock)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _file(self, key, suffix):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + suffix)
+
+    def _load(self):
+        names = os.listdir(self.path)
+        metas = []
+        for name in names:
+            path = os.path.join(self.path, name)
+            if name.endswith('.meta'):
+                metas.append((os.stat(path).st_mtime, path))
+            elif name.endswith('.tmp'):
+                # Left behind by a write that did not finish.
+                _unlink(path)
+
+        # Oldest first, so they are also the first to be evicted.
+        for _, path in sorted(metas):
+            body_path = path[:-len('.meta')] + '.body'
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                response = _StoredResponse(
+                    meta['status'], meta['reason'], tuple(meta['version']),
+                    CIMultiDict(meta['headers']))
+                entry = CacheEntry(meta['url'], response, _DiskBody(body_path),
+                                   tuple(meta['vary']),
+                                   meta['response_time'])
+                entry.key = (meta['url'], tuple(meta['values']))
+            except (OSError, ValueError, KeyError, TypeError):
+                _unlink(path)
+                _unlink(body_path)
+                continue
+            self._add(entry)
+
+        for name in names:
+            if name.endswith('.body'):
+                path = os.path.join(self.path, name)
+                if not os.path.exists(path[:-len('.body')] + '.meta'):
+                    _unlink(path)
+
+    def _write_meta(self, entry):
+        meta = {
+            'url': entry.url,
+            'vary': list(entry.vary),
+            'values': list(entry.key[1]),
+            'status': entry.status,
+            'reason': entry.reason,
+            'version': list(entry.version),
+            'headers': list(entry.headers.items()),
+            'response_time': entry.response_time,
+        }
+        _write(self._file(entry.key, '.meta'),
+               json.dumps(meta).encode('utf-8'))
+
+    @asyncio.coroutine
+    def spool(self, url, request_headers, response, read, loop):
+        """
+        Store ``response`` with the body that the coroutine function
+        ``read`` returns chunk by chunk, until an empty one.  The chunks are
+        written to a temporary file, off the event loop, that is moved into
+        place once complete, so the body is never held in memory.
+
+        Return the new entry.  It is not kept if the body turns out to be
+        larger than ``max_entry_bytes``, but can still be served.
+        """
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        size = 0
+        try:
+            with open(fd, 'wb') as f:
+                while True:
+                    chunk = yield from read()
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    yield from loop.run_in_executor(None, f.write, chunk)
+            entry = CacheEntry(url, response, _DiskBody(tmp, size),
+                               _vary(response), self.now())
+            if entry.size <= self.max_entry_bytes:
+                self._put(request_headers, entry)
+            else:
+                entry.body = _DiskBody(None, size, open(tmp, 'rb'))
+                _unlink(tmp)
+        except BaseException:
+            _unlink(tmp)
+            raise
+        return entry
+
+    def _save(self, entry):
+        body_path = self._file(entry.key, '.body')
+        if isinstance(entry.body, _DiskBody):
+            # Spooled to a temporary file already.
+            os.replace(entry.body.path, body_path)
+        else:
+            _write(body_path, entry.body)
+        # The meta file marks the entry as complete, so it goes last.
+        self._write_meta(entry)
+        entry.body = _DiskBody(body_path)
+
+    def lookup(self, url, request_headers):
+        entry = super(DiskCache, self).lookup(url, request_headers)
+        if entry is not None:
+            # Remember the use for the eviction order after a restart.
+            try:
+                os.utime(self._file(entry.key, '.meta'))
+            except OSError:
+                pass
+        return entry
+
+    def freshen(self, entry, headers):
+        super(DiskCache, self).freshen(entry, headers)
+        self._write_meta(entry)
+
+    def _remove(self, key):
+        if key in self._entries:
+            _unlink(self._file(key, '.meta'))
+            _unlink(self._file(key, '.body'))
+        super(DiskCache, self)._remove(key)
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+
+class TieredCache(object):
+    """
+    A :class:`MemoryCache` in front of a :class:`DiskCache`.  Responses are
+    stored on disk, and those small enough for the memory cache there as
+    well; entries found only on disk are copied into memory when they fit,
+    once a response of theirs has been read.
+    """
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+
+    def __len__(self):
+        return len(self.disk)
+
+    def now(self):
+        return self.memory.now()
+
+    def storable(self, method, request_headers, response):
+        return self.disk.storable(method, request_headers, response)
+
+    def lookup(self, url, request_headers):
+        entry = self.memory.lookup(url, request_headers)
+        if entry is not None:
+            return entry
+        entry = self.disk.lookup(url, request_headers)
+        if entry is not None and entry.size <= self.memory.max_entry_bytes:
+            entry.on_read = functools.partial(self._promote, url,
+                                              request_headers, entry)
+        return entry
+
+    def _promote(self, url, request_headers, entry, body):
+        entry.on_read = None
+        promoted = self.memory.store(url, request_headers, entry, body)
+        if promoted is not None:
+            promoted.response_time = entry.response_time
+
+    def store(self, url, request_headers, response, body):
+        entry = self.disk.store(url, request_headers, response, body)
+        if len(body) <= self.memory.max_entry_bytes:
+            self.memory.store(url, request_headers, response, body)
+        return entry
+
+    @asyncio.coroutine
+    def spool(self, url, request_headers, response, read, loop):
+        entry = yield from self.disk.spool(url, request_headers, response,
+                                           read, loop)
+        if entry.key is not None and entry.size <= self.memory.max_entry_bytes:
+            body = yield from loop.run_in_executor(None, entry.body.read)
+            self.memory.store(url, request_headers, response, body)
+        return entry
+
+    def freshen(self, entry, headers):
+        for cache in (self.memory, self.disk):
+            stored = cache._entries.get(entry.key)
+            if stored is not None:
+                cache.freshen(stored, headers)
+
+    def invalidate(self, url):
+        self.memory.invalidate(url)
+        self.disk.invalidate(url)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
@@ -1,7 +1,8 @@
-import mimetypes
 import uuid
 import asyncio
 import functools
+import json
+import weakref
 
 from io import BytesIO, StringIO
 from os import path
@@ -10,68 +11,342 @@ from urllib.parse import urlparse, urlunparse, urlencode
 
 import aiohttp
 
-from aiorequests._utils import default_loop
+from aiorequests._utils import default_loop, default_pool
 from aiorequests.auth import add_auth
-from aiorequests.response import _Response
+from aiorequests.cookies import CookieStore, FileCookieStore
+from aiorequests.cache import (
+    HIT, MISS, REVALIDATED, header_items, parse_cache_control
+)
+from aiorequests.pool import WarmResult, open_connections
+from aiorequests.response import _InMemoryBody, _Response
+from aiorequests.retry import replayable_body
+from aiorequests.streaming import StreamingBody, stream_kind
+from aiorequests.timeouts import Deadlines, TimerWheel, Timeouts
+from aiorequests.urls import BaseURL, EncodedParams
 
-from http.cookiejar import CookieJar
-from requests.cookies import cookiejar_from_dict, merge_cookies
 
-
-class _BodyBufferingProtocol(object):
-    def __init__(self, original, buffer, finished):
+class _BufferedResponse(object):
+    """
+    Read the body of ``original`` once and hand out any number of
+    independent views of the response, each with its own readable body.
+    """
+    def __init__(self, original, loop=None, deadlines=None):
         self.original = original
-        self.buffer = buffer
-        self.finished = finished
+        self._loop = default_loop(loop)
+        self._deadlines = deadlines
+        self._body = None
+
+    @asyncio.coroutine
+    def read(self):
+        if self._body is None:
+            self._body = asyncio.ensure_future(self._read(), loop=self._loop)
+        return (yield from asyncio.shield(self._body, loop=self._loop))
+
+    @asyncio.coroutine
+    def _read(self):
+        try:
+            if self._deadlines is None:
+                return (yield from self.original.read())
+            return (yield from self._deadlines.guard_read(
+                self.original, self.original.read()))
+        finally:
+            self.original.release()
+            if self._deadlines is not None:
+                self._deadlines.close()
+
+    def view(self):
+        return _ResponseView(self)
+
+
+class _ResponseView(object):
+    """
+    One consumer's view of a :class:`_BufferedResponse`.  It reads like the
+    original response, but ``read``, ``text`` and ``json`` are served from
+    the shared buffer.
+    """
+    # Not the stream of the original, which the buffer reads from.
+    content = None
 
-    def dataReceived(self, data):
-        self.buffer.append(data)
-        self.original.dataReceived(data)
+    def __init__(self, buffered):
+        self._buffered = buffered
 
-    def connectionLost(self, reason):
-        self.original.connectionLost(reason)
-        self.finished.errback(reason)
+    def __getattr__(self, name):
+        return getattr(self._buffered.original, name)
 
+    @asyncio.coroutine
+    def read(self):
+        return (yield from self._buffered.read())
 
-class _BufferedResponse(object):
-    def __init__(self, original):
-        self.original = original
-        self._buffer = []
-        self._waiters = []
-        self._waiting = None
-        self._finished = False
-        self._reason = None
-
-    def _deliverWaiting(self, reason):
-        self._reason = reason
-        self._finished = True
-        for waiter in self._waiters:
-            for segment in self._buffer:
-                waiter.dataReceived(segment)
-            waiter.connectionLost(reason)
-
-    def deliverBody(self, protocol):
-        if self._waiting is None and not self._finished:
-            self._waiting = Deferred()
-            self._waiting.addBoth(self._deliverWaiting)
-            self.original.deliverBody(
-                _BodyBufferingProtocol(
-                    protocol,
-                    self._buffer,
-                    self._waiting
-                )
-            )
-        elif self._finished:
-            for segment in self._buffer:
-                protocol.dataReceived(segment)
-            protocol.connectionLost(self._reason)
-        else:
-            self._waiters.append(protocol)
+    @asyncio.coroutine
+    def text(self, encoding=None, errors='strict'):
+        body = yield from self.read()
+        if encoding is None:
+            encoding = self._buffered.original.get_encoding()
+        return body.decode(encoding, errors=errors)
+
+    @asyncio.coroutine
+    def json(self, *, encoding=None, loads=json.loads, **kwargs):
+        body = yield from self.text(encoding=encoding)
+        if not body.strip():
+            return None
+        return loads(body)
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PreparedRequest(object):
+    """
+    A request encoded once by :meth:`HTTPClient.prepare`, to be sent any
+    number of times with :meth:`send`.  It cannot be changed; prepare
+    another one instead.
+    """
+    __slots__ = ('_client', 'method', 'url', '_args', '_cookies', '_timeout',
+                 '_policies')
+
+    def __init__(self, client, method, url, request_args, cookies, timeout,
+                 *policies):
+        headers = request_args.get('headers')
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+        if headers is not None:
+            request_args['headers'] = tuple(headers)
+        for name, value in (('_client', client), ('method', method),
+                            ('url', url), ('_args', tuple(request_args.items())),
+                            ('_cookies', cookies), ('_timeout', timeout),
+                            ('_policies', policies)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PreparedRequest is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("PreparedRequest is immutable")
+
+    @property
+    def headers(self):
+        """
+        The encoded headers, as a ``tuple`` of ``(name, value)`` pairs.
+        """
+        return dict(self._args).get('headers', ())
+
+    def send(self):
+        """
+        Send the request.
+
+        :rtype: coroutine returning the response, as :meth:`HTTPClient.request`
+            does.
+        """
+        return self._client._execute(self.method, self.url, dict(self._args),
+                                     self._cookies, self._timeout,
+                                     *self._policies)
+
+    def __repr__(self):
+        return '<PreparedRequest {0} {1}>'.format(self.method, self.url)
 
 
 class HTTPClient(object):
-    def __init__(self, cookiejar=None):
-        self._cookiejar = cookiejar or cookiejar_from_dict({})
+    def __init__(self, cookiejar=None, pool=None, loop=None, persistent=None,
+                 limit=None, limit_per_host=None, keepalive_timeout=None,
+                 max_lifetime=None, resolver=None, ssl_contexts=None,
+                 coalesce=False, cache=None, retry=None, hedge=None,
+                 breaker=None, rate_limiter=None, concurrency_limiter=None,
+                 base_url=None, buffer_pool=None):
+        if isinstance(cookiejar, str):
+            cookiejar = FileCookieStore(cookiejar)
+        elif not isinstance(cookiejar, CookieStore):
+            cookiejar = CookieStore(cookiejar)
+        self._cookiejar = cookiejar
+        self._base_url = BaseURL(base_url) if base_url else None
+        self._buffer_pool = buffer_pool
+        self._loop = default_loop(loop)
+        self._coalesce = coalesce
+        self._in_flight = {}
+        self._cache = cache
+        self._retry = retry
+        self._hedge = hedge
+        self._breaker = breaker
+        self._rate_limiter = rate_limiter
+        self._concurrency_limiter = concurrency_limiter
+        self._wheel = TimerWheel(loop=self._loop)
+        # response -> Deadlines of the request, until its body is read
+        self._deadlines = weakref.WeakKeyDictionary()
+
+        connector_options = dict(
+            (k, v) for k, v in (('limit', limit),
+                                ('limit_per_host', limit_per_host),
+                                ('keepalive_timeout', keepalive_timeout),
+                                ('max_lifetime', max_lifetime),
+                                ('resolver', resolver),
+                                ('ssl_contexts', ssl_contexts))
+            if v is not None)
+
+        self._owns_pool = pool is None and (persistent is False or
+                                            bool(connector_options))
+        self._pool = default_pool(self._loop, pool, persistent,
+                                  **connector_options)
+
+    def pool_stats(self):
+        """
+        Live connection counters of the underlying pool.
+
+        :rtype: ``dict`` mapping ``'host:port'`` to
+            :class:`aiorequests.pool.PoolStats`, empty if the pool does not
+            keep counters.
+        """
+        stats = getattr(self._pool.connector, 'stats', None)
+        if stats is None:
+            return {}
+        return stats()
+
+    def circuit_states(self):
+        """
+        States of the circuits of the client's breaker.
+
+        :rtype: ``dict`` mapping origins to ``'closed'``, ``'open'`` or
+            ``'half-open'``, empty without a breaker.
+        """
+        if self._breaker is None:
+            return {}
+        return self._breaker.states()
+
+    def concurrency_stats(self):
+        """
+        Current limits and queues of the client's concurrency limiter.
+
+        :rtype: ``dict`` mapping origins to
+            :class:`aiorequests.concurrency.LimiterStats`, empty without a
+            limiter.
+        """
+        if self._concurrency_limiter is None:
+            return {}
+        return self._concurrency_limiter.stats()
+
+    @asyncio.coroutine
+    def close(self):
+        """
+        Close the connection pool if this client created it, and the file
+        of its cookie jar if it has one.
+
+        The shared global pool and pools passed in by the caller are left
+        open, since other clients may still be using them.
+        """
+        close_jar = getattr(self._cookiejar, 'close', None)
+        if close_jar is not None:
+            close_jar()
+        if self._owns_pool:
+            yield from self._pool.close()
+
+    @asyncio.coroutine
+    def warm(self, origins, per_host=1, verify=True, timeout=None):
+        """
+        Open connections to ``origins`` ahead of traffic.
+
+        :param origins: URLs whose scheme, host and port are connected to.
+        :param int per_host: Connections to open for every origin.
+        :param bool verify: Whether requests to these origins will verify
+            TLS certificates; connections are only reused by requests with
+            the same setting.
+        :param float timeout: Connect timeout of each connection.
+
+        :rtype: :class:`aiorequests.pool.WarmResult` with the number of
+            connections parked in the pool, the number that failed and the
+            seconds it took.
+        """
+        start = self._loop.time()
+        results = yield from asyncio.gather(
+            *[open_connections(self._pool.connector, origin, per_host,
+                               verify=verify, timeout=timeout,
+                               loop=self._loop)
+              for origin in origins], loop=self._loop)
+
+        return WarmResult(sum(opened for opened, _ in results),
+                          sum(failed for _, failed in results),
+                          self._loop.time() - start)
+
+    @asyncio.coroutine
+    def download(self, url, path, chunk_size=1024 * 1024, resume=True,
+                 fsync='end', progress=None, segments=1, segment_retry=None,
+                 **kwargs):
+        """
+        Stream the response to a ``GET`` of ``url`` into the file ``path``.
+
+        The body is written to ``path + '.part'``, preallocated from the
+        ``Content-Length``, and renamed to ``path`` once complete.  Writes
+        run in the loop's default executor, overlapping with receiving the
+        next chunk, so at most two chunks are in memory whatever the size
+        of the file.  If the download fails or is cancelled, the next
+        download of the same URL to the same path continues where it
+        stopped with a ``Range`` request, provided the response had a
+        strong ``ETag`` or a ``Last-Modified`` date to send as ``If-Range``;
+        otherwise, or if the object changed, it starts over.
+
+        With ``segments`` above 1, a large object is instead split into that
+        many byte ranges, fetched concurrently over separate connections of
+        the pool and each written at its own offset, which gets past the
+        throughput limit of a single connection.  This needs a ``HEAD``
+        response with the size of the object, ``Accept-Ranges: bytes`` and
+        a validator; without them, the object is downloaded in one piece.
+        A segment that fails is retried on its own, continuing where it
+        stopped, and an interrupted download resumes every segment.
+
+        Takes the arguments of :meth:`request` as well.
+
+        :param int chunk_size: Bytes written to the file at a time.
+        :param bool resume: Continue an earlier, interrupted download.
+        :param fsync: When to ``fsync`` the file: ``'end'``, before it is
+            renamed; ``'always'``, at every checkpoint of the download's
+            progress as well; or ``None``, never.
+        :param progress: Callable called with the bytes written so far and
+            the size of the file, or ``None`` if unknown, after every chunk.
+        :param int segments: Ranges to download concurrently.
+        :param segment_retry: How often, and after how long, a failed
+            segment is retried.  Default: ``RetryPolicy()``.
+        :type segment_retry: :class:`aiorequests.retry.RetryPolicy`
+
+        :rtype: :class:`aiorequests.download.DownloadResult`
+        :raises aiorequests.download.DownloadError: if the response is an
+            error or the body ends short.
+        """
+        from aiorequests.download import download
+        return (yield from download(self, url, path, chunk_size=chunk_size,
+                                    resume=resume, fsync=fsync,
+                                    progress=progress, segments=segments,
+                                    segment_retry=segment_retry, **kwargs))
+
+    def map(self, specs, concurrency=10, per_host=None,
+            return_exceptions=False):
+        """
+        Send many requests with bounded concurrency and iterate over their
+        responses in the order of ``specs``::
+
+            async for response in client.map(specs, concurrency=50):
+                ...
+
+        ``specs`` yields ``(method, url)`` or ``(method, url, kwargs)``
+        tuples and is only consumed as fast as responses are taken, so it
+        may be an unbounded generator.
+
+        See :class:`aiorequests.batch.BatchIterator`.
+        """
+        from aiorequests.batch import BatchIterator
+        return BatchIterator(self, specs, concurrency, per_host, ordered=True,
+                             return_exceptions=return_exceptions,
+                             loop=self._loop)
+
+    def as_completed(self, specs, concurrency=10, per_host=None,
+                     return_exceptions=False):
+        """
+        Like :py:meth:`map`, but yield responses as soon as they complete.
+        """
+        from aiorequests.batch import BatchIterator
+        return BatchIterator(self, specs, concurrency, per_host,
+                             ordered=False,
+                             return_exceptions=return_exceptions,
+                             loop=self._loop)
 
     def get(self, url, **kwargs):
         return self.request('GET', url, **kwargs)
@@ -94,8 +369,28 @@ class HTTPClient(object):
     def options(self, url, **kwargs):
         return self.request('OPTIONS', url, **kwargs)
 
+    def prepare(self, method, url, **kwargs):
+        """
+        Encode a request once to send it any number of times.
+
+        Takes the arguments of :meth:`request`.  Headers, query string,
+        auth, cookies and form data are encoded here, and the client's
+        policies for the request are chosen here, rather than on every
+        send.  The body is sent as given every time, so it should be
+        ``bytes`` or ``str`` rather than a file or an iterator.
+
+        :rtype: :class:`PreparedRequest`
+        """
+        return PreparedRequest(self, *self._build(method, url, kwargs))
+
+    @asyncio.coroutine
     def request(self, method, url, **kwargs):
+        return (yield from self._execute(*self._build(method, url, kwargs)))
+
+    def _build(self, method, url, kwargs):
         method = method.upper()
+        if self._base_url is not None:
+            url = self._base_url.join(url)
 
         # Join parameters provided in the URL
         # and the ones passed as argument.
@@ -144,13 +439,17 @@ class HTTPClient(object):
             if isinstance(data, (dict, list, tuple)):
                 headers['Content-Type'] = 'application/x-www-form-urlencoded'
                 data = urlencode(data, doseq=True)
-
-        cookies = kwargs.get('cookies', {})
-
-        if not isinstance(cookies, CookieJar):
-            cookies = cookiejar_from_dict(cookies)
-
-        cookies = merge_cookies(self._cookiejar, cookies)
+            elif (not isinstance(data, StreamingBody) and
+                    stream_kind(data) is not None):
+                # Sent as it is produced, with the declared length if any.
+                data = StreamingBody(data, size=_content_length(headers))
+
+        # The client's own cookies are looked up when the request is sent.
+        cookies = kwargs.get('cookies')
+        if cookies:
+            if not isinstance(cookies, CookieStore):
+                cookies = CookieStore(cookies)
+            cookies = cookies.lookup(url)
         allow_redirects = kwargs.get('allow_redirects', True)
 
         auth = kwargs.get('auth')
@@ -163,26 +462,305 @@ class HTTPClient(object):
             headers['accept-encoding'] = 'gzip'
         else:
             headers.append(('accept-encoding', 'gzip'))
-        loop = asyncio.get_event_loop()
-        timeout = kwargs.get('timeout')
+        timeout = Timeouts.coerce(kwargs.get('timeout'))
 
         request_args = {
             'auth': auth,
             'allow_redirects': allow_redirects if not allow_redirects else None,
             'headers': headers,
             'data': data,
-            'cookies': cookies if cookies else None
         }
 
         for k in list(request_args.keys()):
             if not request_args[k]:
                 request_args.pop(k)
 
-        resp = yield from asyncio.wait_for(loop.create_task(aiohttp.request(
-            method, url, **request_args)), timeout)
+        if kwargs.get('verify') is False:
+            request_args['ssl'] = False
+
+        coalesce = kwargs.get('coalesce', self._coalesce)
+        cache = self._cache if kwargs.get('cache', True) else None
+        retry = kwargs.get('retry', self._retry) or None
+        hedge = kwargs.get('hedge', self._hedge) or None
+        return (method, url, request_args, cookies, timeout, coalesce, cache,
+                retry, hedge)
+
+    @asyncio.coroutine
+    def _execute(self, method, url, request_args, cookies, timeout, coalesce,
+                 cache, retry, hedge):
+        jar_cookies = self._cookiejar.lookup(url)
+        if cookies:
+            jar_cookies.update(cookies)
+        if jar_cookies:
+            request_args['cookies'] = jar_cookies
+
+        payloads = []
+        if retry is not None and retry.retries_method(method):
+            body, payloads = replayable_body(request_args.get('data'))
+            if payloads is None:
+                # A body that can only be sent once cannot be retried.
+                retry, payloads = None, []
+            elif body is not None:
+                request_args['data'] = body
+        else:
+            retry = None
+
+        if hedge is not None and (
+                not hedge.hedges_method(method) or
+                not isinstance(request_args.get('data'),
+                               (type(None), bytes, str))):
+            # Both copies would read from the same file or iterator.
+            hedge = None
+
+        try:
+            if cache is not None and method == 'GET':
+                resp, cache_status = yield from self._send_cached(
+                    cache, url, request_args, timeout, coalesce, retry,
+                    hedge)
+            else:
+                resp = yield from self._dispatch(method, url, request_args,
+                                                 timeout, coalesce, retry,
+                                                 hedge)
+                cache_status = None
+                if (cache is not None and method not in _SAFE_METHODS and
+                        resp.status < 400):
+                    cache.invalidate(url)
+        finally:
+            for payload in payloads:
+                payload.close()
+
+        self._extract_cookies(resp)
+        return _Response(resp, self._cookiejar.snapshot(),
+                         request_cookies=cookies, cache_status=cache_status,
+                         buffer_pool=self._buffer_pool,
+                         deadlines=self._deadlines.pop(resp, None))
+
+    def _extract_cookies(self, resp):
+        for r in tuple(getattr(resp, 'history', ())) + (resp,):
+            set_cookies = getattr(r, 'cookies', None)
+            if set_cookies:
+                self._cookiejar.extract(str(r.url), set_cookies)
+
+    @asyncio.coroutine
+    def _dispatch(self, method, url, request_args, timeout, coalesce,
+                  retry=None, hedge=None):
+        if coalesce and method in ('GET', 'HEAD'):
+            return (yield from self._send_coalesced(method, url, request_args,
+                                                    timeout, retry, hedge))
+        return (yield from self._send(method, url, request_args, timeout,
+                                      retry, hedge))
+
+    @asyncio.coroutine
+    def _send_cached(self, cache, url, request_args, timeout, coalesce,
+                     retry=None, hedge=None):
+        """
+        Serve a ``GET`` from ``cache`` if it is fresh there, revalidate it if
+        it is stale and store the response if it may be cached.
+
+        :rtype: tuple of the response and ``'hit'``, ``'miss'`` or
+            ``'revalidated'``.
+        """
+        request_headers = request_args.get('headers')
+        cache_headers = _cache_headers(request_args)
+        request_directives = parse_cache_control(
+            dict((k.lower(), v) for k, v in header_items(request_headers))
+            .get('cache-control'))
+
+        entry = cache.lookup(url, cache_headers)
+        if entry is not None:
+            if entry.is_fresh(cache.now(), request_directives):
+                return entry.response(), HIT
+            conditional = entry.conditional_headers()
+            if conditional:
+                request_args = dict(request_args)
+                request_args['headers'] = (header_items(request_headers) +
+                                           conditional)
+
+        resp = yield from self._dispatch('GET', url, request_args, timeout,
+                                         coalesce, retry, hedge)
+
+        if resp.status == 304 and entry is not None:
+            resp.release()
+            deadlines = self._deadlines.pop(resp, None)
+            if deadlines is not None:
+                deadlines.close()
+            cache.freshen(entry, resp.headers)
+            return entry.response(), REVALIDATED
+
+        if not cache.storable('GET', cache_headers, resp):
+            return resp, MISS
+
+        if hasattr(cache, 'spool'):
+            entry = yield from self._spool(cache, url, cache_headers, resp)
+            return entry.response(resp), MISS
+
+        buffered = _BufferedResponse(resp, loop=self._loop,
+                                     deadlines=self._deadlines.pop(resp, None))
+        body = yield from buffered.read()
+        cache.store(url, cache_headers, resp, body)
+        return buffered.view(), MISS
+
+    @asyncio.coroutine
+    def _spool(self, cache, url, request_headers, resp):
+        """
+        Store ``resp`` in a cache that keeps bodies on disk as its body
+        arrives, rather than reading it into memory first.
+        """
+        deadlines = self._deadlines.pop(resp, None)
+        stream = getattr(resp, 'content', None)
+        if hasattr(stream, 'readany'):
+            read = stream.readany
+        else:
+            # Shared with coalesced requests, and so already read.
+            read = _InMemoryBody(resp.read, 64 * 1024).read
+
+        def guarded():
+            if deadlines is None:
+                return read()
+            return deadlines.guard_read(resp, read())
+
+        try:
+            return (yield from cache.spool(url, request_headers, resp,
+                                           guarded, self._loop))
+        finally:
+            resp.release()
+            if deadlines is not None:
+                deadlines.close()
+
+    @asyncio.coroutine
+    def _send(self, method, url, request_args, timeout, retry=None,
+              hedge=None):
+        @asyncio.coroutine
+        def timed():
+            copies = []
+
+            @asyncio.coroutine
+            def request(url):
+                if not timeout:
+                    return (yield from self._pool.request(method, url,
+                                                          **request_args))
+                # Each hedged copy has deadlines of its own, so that the
+                # phases of one do not arm or close the timers of another.
+                deadlines = Deadlines(timeout, self._wheel)
+                copies.append(deadlines)
+                try:
+                    resp = yield from deadlines.guard(self._pool.request(
+                        method, url, trace_request_ctx=deadlines,
+                        **request_args))
+                except BaseException:
+                    deadlines.close()
+                    raise
+                # Kept for reading the body.
+                self._deadlines[resp] = deadlines
+                return resp
+
+            try:
+                if hedge is not None:
+                    resp = yield from hedge.call(request, url, self._loop)
+                else:
+                    resp = yield from request(url)
+            except BaseException:
+                for deadlines in copies:
+                    deadlines.close()
+                raise
+            for deadlines in copies:
+                if deadlines is not self._deadlines.get(resp):
+                    deadlines.close()
+            return resp
+
+        def attempt():
+            if self._concurrency_limiter is not None:
+                return self._concurrency_limiter.call(timed, url)
+            return timed()
+
+        @asyncio.coroutine
+        def send():
+            if self._rate_limiter is not None:
+                yield from self._rate_limiter.acquire(method, url)
+            if self._breaker is not None:
+                return (yield from self._breaker.call(attempt, url))
+            return (yield from attempt())
+
+        if retry is None:
+            return (yield from send())
+        return (yield from retry.call(send, loop=self._loop))
+
+    @asyncio.coroutine
+    def _send_buffered(self, method, url, request_args, timeout, retry=None,
+                       hedge=None):
+        resp = yield from self._send(method, url, request_args, timeout,
+                                     retry, hedge)
+        buffered = _BufferedResponse(resp, loop=self._loop,
+                                     deadlines=self._deadlines.pop(resp, None))
+        yield from buffered.read()
+        return buffered
+
+    @asyncio.coroutine
+    def _send_coalesced(self, method, url, request_args, timeout,
+                        retry=None, hedge=None):
+        """
+        Share one upstream request between all identical requests that are
+        in flight at the same time.
+        """
+        key = _request_key(method, url, request_args)
+        shared = self._in_flight.get(key)
+        if shared is None:
+            shared = asyncio.ensure_future(
+                self._send_buffered(method, url, request_args, timeout,
+                                    retry, hedge),
+                loop=self._loop)
+            self._in_flight[key] = shared
+
+            def forget(_):
+                if self._in_flight.get(key) is shared:
+                    del self._in_flight[key]
+
+            shared.add_done_callback(forget)
+
+        waiting = asyncio.shield(shared, loop=self._loop)
+        if timeout.total is None:
+            buffered = yield from waiting
+        else:
+            # Only the total deadline applies to joining a shared request.
+            deadlines = Deadlines(Timeouts(total=timeout.total), self._wheel)
+            try:
+                buffered = yield from deadlines.guard(waiting)
+            finally:
+                deadlines.close()
+        return buffered.view()
+
 
+_SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE'])
+
+
+def _request_key(method, url, request_args):
+    headers = header_items(request_args.get('headers'))
+    cookies = request_args.get('cookies') or {}
+    return (method, url,
+            tuple(sorted((k.lower(), str(v)) for k, v in headers)),
+            request_args.get('auth'),
+            tuple(sorted(cookies.items())),
+            request_args.get('allow_redirects'),
+            request_args.get('ssl'))
+
+
+def _cache_headers(request_args):
+    """
+    The request headers a cache matches ``Vary`` against, with the
+    ``Authorization`` and ``Cookie`` headers that ``auth`` and ``cookies``
+    will add, so that responses for different users are kept apart.
+    """
+    headers = header_items(request_args.get('headers'))
+    names = set(name.lower() for name, _ in headers)
+    auth = request_args.get('auth')
+    if auth is not None and 'authorization' not in names:
+        headers.append(('Authorization', auth.encode()))
+    cookies = request_args.get('cookies')
+    if cookies:
+        headers.append(('Cookie', '; '.join(
+            '{0}={1}'.format(k, v) for k, v in sorted(cookies.items()))))
+    return headers
 
-        return _Response(resp, cookies)
 
 def _convert_params(params):
     if hasattr(params, "items"):
@@ -192,6 +770,13 @@ def _convert_params(params):
     else:
         raise ValueError("Unsupported format")
 
+def _content_length(headers):
+    for key, value in header_items(headers):
+        if key.lower() == 'content-length':
+            return int(value)
+    return None
+
+
 def _convert_files(files):
     """Files can be passed in a variety of formats:
 
@@ -228,13 +813,29 @@ def _convert_files(files):
 
 
 def _combine_query_params(url, params):
+    if isinstance(params, EncodedParams):
+        query = params.query
+    else:
+        query = urlencode(params, doseq=True)
+    if not query:
+        # Such as params={'a': []}; a bare '?' would change the URL.
+        return url
+
+    if '#' not in url:
+        # Nothing after the query string, so no need to parse the URL.
+        if '?' not in url:
+            return url + '?' + query
+        if url.endswith('?'):
+            return url + query
+        return url + '&' + query
+
     parsed_url = urlparse(url)
 
     qs = []
     if parsed_url.query:
         qs.extend([parsed_url.query, '&'])
 
-    qs.append(urlencode(params, doseq=True))
+    qs.append(query)
 
     return urlunparse((parsed_url[0], parsed_url[1],
                        parsed_url[2], parsed_url[3],
@@ -251,6 +852,7 @@ def _from_file(orig_file):
 
 def _guess_content_type(filename):
     if filename:
+        import mimetypes
         guessed = mimetypes.guess_type(filename)[0]
     else:
         guessed = None
@@ -0,0 +1,221 @@
+"""
+Adaptive per-origin concurrency limits.
+"""
+
+import asyncio
+import math
+
+from collections import deque, namedtuple
+
+import aiohttp
+
+from aiorequests._utils import origin_of
+
+
+LimiterStats = namedtuple('LimiterStats', ['limit', 'in_flight', 'queued'])
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """
+    Raised instead of queueing a request to an origin whose queue is full,
+    or that waited in the queue for too long.
+    """
+    def __init__(self, origin):
+        super(ConcurrencyLimitExceeded, self).__init__(
+            'Too many requests queued for {0}.'.format(origin))
+        self.origin = origin
+
+
+class AIMD(object):
+    """
+    Additive increase, multiplicative decrease: grow the limit by
+    ``increase`` after every success while it is being used, and multiply
+    it by ``backoff`` after every failure or response slower than
+    ``timeout``.
+    """
+    def __init__(self, increase=1, backoff=0.9, timeout=None):
+        self.increase = increase
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def update(self, limit, in_flight, latency, dropped):
+        if dropped or (self.timeout is not None and latency > self.timeout):
+            return limit * self.backoff
+        if in_flight * 2 >= limit:
+            return limit + self.increase
+        return limit
+
+
+class Gradient(object):
+    """
+    Follow the ratio of the long-term to the current latency, in the manner
+    of TCP Vegas: the limit shrinks as requests queue up at the origin and
+    take longer than usual, and grows by about ``sqrt(limit)`` while they do
+    not.
+
+    :param float tolerance: How much slower than usual requests may get
+        before the limit shrinks.
+    :param float smoothing: Weight of each new estimate of the limit.
+    :param int window: Samples the long-term latency averages over.
+    """
+    def __init__(self, tolerance=1.5, smoothing=0.2, window=600):
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._decay = 2.0 / (window + 1)
+        self.long_latency = None
+
+    def update(self, limit, in_flight, latency, dropped):
+        if self.long_latency is None:
+            self.long_latency = latency
+        else:
+            self.long_latency += (latency - self.long_latency) * self._decay
+            if self.long_latency > 2 * latency:
+                # Recovering from a slow period: forget it faster.
+                self.long_latency *= 0.95
+
+        if dropped:
+            gradient = 0.5
+        elif in_flight * 2 < limit:
+            # Too little load to tell anything about the origin.
+            return limit
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.long_latency /
+                                    max(latency, 1e-9)))
+        estimate = limit * gradient + math.sqrt(limit)
+        return limit * (1 - self.smoothing) + estimate * self.smoothing
+
+
+class _Origin(object):
+    def __init__(self, algorithm, limit):
+        self.algorithm = algorithm
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters = deque()
+
+
+class ConcurrencyLimiter(object):
+    """
+    Limit the requests in flight to each origin to a limit that adapts to
+    the latency and errors seen, and queue or shed the others.
+
+    :param algorithm: Callable returning a new limit algorithm, such as
+        :class:`AIMD` or :class:`Gradient`, for every origin.
+    :param int initial_limit: Limit of an origin before anything is known.
+    :param int min_limit: Lowest limit.
+    :param int max_limit: Highest limit.
+    :param int max_queue: Requests that may wait per origin; more raise
+        :class:`ConcurrencyLimitExceeded`.  ``None`` for no bound.
+    :param float queue_timeout: Seconds a request may wait before it is
+        shed.  ``None`` to wait as long as it takes.
+    :param statuses: Response statuses that count as failures.
+    """
+    def __init__(self, algorithm=Gradient, initial_limit=20, min_limit=1,
+                 max_limit=1000, max_queue=None, queue_timeout=None,
+                 statuses=(429, 502, 503, 504),
+                 exceptions=(aiohttp.ClientError, asyncio.TimeoutError),
+                 loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self._algorithm = algorithm
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+        self._origins = {}
+
+    def _get(self, origin):
+        state = self._origins.get(origin)
+        if state is None:
+            state = self._origins[origin] = _Origin(self._algorithm(),
+                                                    self.initial_limit)
+        return state
+
+    def stats(self):
+        """
+        :rtype: ``dict`` mapping origins to :class:`LimiterStats`.
+        """
+        return dict(
+            (origin, LimiterStats(int(state.limit), state.in_flight,
+                                  sum(1 for w in state.waiters
+                                      if not w.done())))
+            for origin, state in self._origins.items())
+
+    def _wake(self, state):
+        while state.waiters and state.in_flight < int(state.limit):
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                state.in_flight += 1
+                waiter.set_result(None)
+
+    @asyncio.coroutine
+    def acquire(self, url):
+        """
+        Wait for a slot for a request to ``url``.
+
+        :return: The origin, to pass to :meth:`release`.
+        """
+        origin = origin_of(url)
+        state = self._get(origin)
+        if not state.waiters and state.in_flight < int(state.limit):
+            state.in_flight += 1
+            return origin
+        if (self.max_queue is not None and
+                len(state.waiters) >= self.max_queue):
+            raise ConcurrencyLimitExceeded(origin)
+
+        waiter = self._loop.create_future()
+        state.waiters.append(waiter)
+        try:
+            yield from asyncio.wait_for(waiter, self.queue_timeout,
+                                        loop=self._loop)
+        except asyncio.TimeoutError:
+            state.waiters.remove(waiter)
+            raise ConcurrencyLimitExceeded(origin)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Given a slot, but cancelled before it could be used.
+                state.in_flight -= 1
+                self._wake(state)
+            else:
+                # Still in line: it must not count against max_queue.
+                state.waiters.remove(waiter)
+            raise
+        return origin
+
+    def release(self, origin, latency=None, dropped=False):
+        """
+        Free the slot of a finished request and adapt the limit to how it
+        went.  ``latency`` is ``None`` if the outcome says nothing about the
+        origin.
+        """
+        state = self._origins[origin]
+        if latency is not None:
+            limit = state.algorithm.update(state.limit, state.in_flight,
+                                           latency, dropped)
+            state.limit = max(self.min_limit, min(self.max_limit, limit))
+        state.in_flight -= 1
+        self._wake(state)
+
+    @asyncio.coroutine
+    def call(self, send, url):
+        """
+        Call the coroutine function ``send`` once there is a slot for
+        ``url``.
+        """
+        origin = yield from self.acquire(url)
+        started = self._loop.time()
+        latency = None
+        dropped = False
+        try:
+            resp = yield from send()
+            dropped = resp.status in self.statuses
+            latency = self._loop.time() - started
+            return resp
+        except self.exceptions:
+            dropped = True
+            latency = self._loop.time() - started
+            raise
+        finally:
+            self.release(origin, latency, dropped)
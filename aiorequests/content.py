@@ -2,7 +2,6 @@ import asyncio
 import cgi
 import json
 
-from asyncio import Protocol
 
 def _encoding_from_headers(headers):
     content_types = headers.getRawHeaders('content-type')
@@ -18,60 +17,52 @@ def _encoding_from_headers(headers):
         return params.get('charset').strip("'\"")
 
 
-class _BodyCollector(Protocol):
-    def __init__(self, finished, collector):
-        self.finished = finished
-        self.collector = collector
-
-    def dataReceived(self, data):
-        self.collector(data)
-
-    def connectionLost(self, reason):
-        if reason.check(ResponseDone):
-            self.finished.callback(None)
-        elif reason.check(PotentialDataLoss):
-            # http://twistedmatrix.com/trac/ticket/4840
-            self.finished.callback(None)
-        else:
-            self.finished.errback(reason)
+def _chunks(response):
+    if hasattr(response, 'iter_chunks'):
+        # aiorequests' own response, which also enforces its deadlines.
+        return response.iter_chunks()
+    return response.content.iter_any()
 
 
+@asyncio.coroutine
 def collect(response, collector):
     """
     Incrementally collect the body of the response.
 
     This function may only be called **once** for a given response.
 
-    :param IResponse response: The HTTP response to collect the body from.
+    :param response: The HTTP response to collect the body from.
     :param collector: A callable to be called each time data is available
-        from the response body.
+        from the response body.  If it returns an awaitable, no more of the
+        body is read until that is done, so that a slow collector holds back
+        the connection rather than the body piling up in memory.
     :type collector: single argument callable
 
-    :rtype: Deferred that fires with None when the entire body has been read.
+    :rtype: coroutine returning None when the entire body has been read.
     """
-    if response.length == 0:
-        return succeed(None)
-
-    d = Deferred()
-    response.deliverBody(_BodyCollector(d, collector))
-    return d
+    chunks = _chunks(response)
+    while True:
+        try:
+            chunk = yield from chunks.__anext__()
+        except StopAsyncIteration:
+            return
+        result = collector(chunk)
+        if asyncio.iscoroutine(result) or asyncio.isfuture(result):
+            yield from result
 
 
+@asyncio.coroutine
 def content(response):
     """
     Read the contents of an HTTP response.
 
-    This function may be called multiple times for a response, it uses a
-    ``WeakKeyDictionary`` to cache the contents of the response.
-
-    :param IResponse response: The HTTP Response to get the contents of.
+    :param response: The HTTP Response to get the contents of.
 
-    :rtype: Deferred that fires with the content as a str.
+    :rtype: coroutine returning the content as ``bytes``.
     """
     _content = []
-    d = collect(response, _content.append)
-    d.addCallback(lambda _: ''.join(_content))
-    return d
+    yield from collect(response, _content.append)
+    return b''.join(_content)
 
 
 @asyncio.coroutine
@@ -0,0 +1,413 @@
+"""
+A cookie store indexed by domain and path.
+"""
+
+import json
+import os
+import time
+
+from http.cookiejar import Cookie, CookieJar, http2time
+from urllib.parse import urlsplit
+
+
+def create_cookie(name, value, domain='', path='/', expires=None,
+                  secure=False, httponly=False):
+    """
+    Make an ``http.cookiejar.Cookie`` without the many arguments it takes.
+    """
+    return Cookie(0, name, value, None, False, domain, bool(domain),
+                  domain.startswith('.'), path, True, secure, expires,
+                  expires is None, None, None,
+                  {'HttpOnly': None} if httponly else {})
+
+
+def _is_ip(host):
+    return ':' in host or host.replace('.', '').isdigit()
+
+
+# Second-level labels under a country code that are registries, not
+# sites (co.uk, com.au), as http.cookiejar's DefaultCookiePolicy has them.
+_REGISTRY_LABELS = frozenset([
+    'co', 'ac', 'com', 'edu', 'org', 'net', 'gov', 'mil', 'int', 'aero',
+    'biz', 'cat', 'coop', 'info', 'jobs', 'mobi', 'museum', 'name', 'pro',
+    'travel', 'eu'])
+
+
+def _is_public_suffix(domain):
+    """
+    Whether ``domain`` is one every site under it shares, so that it may
+    not be a cookie's ``Domain``: a top-level domain, or a registry such as
+    ``co.uk``.
+    """
+    labels = domain.split('.')
+    if len(labels) == 1:
+        return True
+    return (len(labels) == 2 and len(labels[1]) == 2 and
+            labels[0] in _REGISTRY_LABELS)
+
+
+def _domain_keys(host):
+    """
+    Keys of the cookies that may be sent to ``host``: the ones without a
+    domain, its host-only ones and those of every domain it is part of.
+    """
+    keys = ['', host, '.' + host]
+    if not _is_ip(host):
+        labels = host.split('.')
+        for i in range(1, len(labels)):
+            keys.append('.' + '.'.join(labels[i:]))
+    return keys
+
+
+def _path_matches(path, cookie_path):
+    if not path.startswith(cookie_path):
+        return False
+    return (len(path) == len(cookie_path) or cookie_path.endswith('/') or
+            path[len(cookie_path)] == '/')
+
+
+def _default_path(path):
+    if not path.startswith('/') or path.count('/') == 1:
+        return '/'
+    return path[:path.rindex('/')]
+
+
+class CookieStore(object):
+    """
+    Cookies of :class:`aiorequests.client.HTTPClient`, kept as
+    ``http.cookiejar.Cookie`` objects under their domain and path, so a
+    request only looks at the cookies of its own host and the domains above
+    it.  Expired cookies are dropped when they are next looked up.
+
+    Reads like a ``requests`` cookie jar: ``store['name']`` is the value of
+    the first cookie called ``name``, and iterating yields the cookies.
+
+    :param cookies: Cookies to start with, as a ``dict`` of names and values
+        or a cookie jar.
+    :param clock: Callable returning the current time in seconds since the
+        epoch.
+    """
+    def __init__(self, cookies=None, clock=time.time):
+        self._clock = clock
+        # domain -> path -> name -> Cookie
+        self._domains = {}
+        # Domains whose dicts are this store's own, or None for all of them.
+        self._owned = None
+        # Whether _domains is also the one of a snapshot.
+        self._shared = False
+        if cookies:
+            self.update(cookies)
+
+    def snapshot(self):
+        """
+        Return a copy of the store.  Until either is changed, both share
+        their cookies; then only the top-level index and the domains
+        changed are copied.
+        """
+        other = CookieStore(clock=self._clock)
+        other._domains = self._domains
+        other._shared = self._shared = True
+        return other
+
+    def _writable(self, domain):
+        if self._shared:
+            self._domains = dict(self._domains)
+            self._owned = set()
+            self._shared = False
+        paths = self._domains.get(domain)
+        if self._owned is not None and domain not in self._owned:
+            paths = dict((path, dict(names))
+                         for path, names in (paths or {}).items())
+            self._domains[domain] = paths
+            self._owned.add(domain)
+        elif paths is None:
+            paths = self._domains[domain] = {}
+        return paths
+
+    def _expired(self, cookie, now):
+        return cookie.expires is not None and cookie.expires <= now
+
+    def update(self, cookies):
+        """
+        Add the cookies of a cookie jar, or of a ``dict`` of names and
+        values, the latter for any host and path.
+        """
+        if isinstance(cookies, (CookieJar, CookieStore)):
+            for cookie in cookies:
+                self.set_cookie(cookie)
+        else:
+            for name, value in cookies.items():
+                self.set(name, value)
+
+    def set(self, name, value, domain='', path='/', expires=None,
+            secure=False):
+        self.set_cookie(create_cookie(name, value, domain=domain, path=path,
+                                      expires=expires, secure=secure))
+
+    def set_cookie(self, cookie):
+        """
+        Add or replace ``cookie``; an expired one removes the cookie of
+        that name, domain and path instead.
+        """
+        if self._expired(cookie, self._clock()):
+            self.remove(cookie.name, cookie.domain, cookie.path)
+            return
+        paths = self._writable(cookie.domain)
+        paths.setdefault(cookie.path, {})[cookie.name] = cookie
+
+    def remove(self, name, domain='', path='/'):
+        paths = self._domains.get(domain)
+        if not paths or name not in paths.get(path, ()):
+            return
+        paths = self._writable(domain)
+        names = paths[path]
+        del names[name]
+        if not names:
+            del paths[path]
+            if not paths:
+                del self._domains[domain]
+
+    def clear(self):
+        self._domains = {}
+        self._owned = None
+        self._shared = False
+
+    def clear_expired(self):
+        now = self._clock()
+        for cookie in [c for c in self if self._expired(c, now)]:
+            self.remove(cookie.name, cookie.domain, cookie.path)
+
+    def cookies_for(self, url):
+        """
+        Return the cookies to send with a request to ``url``, those with
+        the longest paths first.
+        """
+        if not self._domains:
+            return []
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        path = parts.path or '/'
+        secure = parts.scheme in ('https', 'wss')
+        now = self._clock()
+
+        found = []
+        expired = []
+        for key in _domain_keys(host):
+            paths = self._domains.get(key)
+            if not paths:
+                continue
+            for cookie_path, names in paths.items():
+                if not _path_matches(path, cookie_path):
+                    continue
+                for cookie in names.values():
+                    if self._expired(cookie, now):
+                        expired.append(cookie)
+                    elif secure or not cookie.secure:
+                        found.append(cookie)
+        for cookie in expired:
+            self.remove(cookie.name, cookie.domain, cookie.path)
+        found.sort(key=lambda c: len(c.path), reverse=True)
+        return found
+
+    def lookup(self, url):
+        """
+        Return the names and values of the cookies to send to ``url``.  Of
+        cookies with the same name, the one with the longest path wins.
+        """
+        values = {}
+        for cookie in reversed(self.cookies_for(url)):
+            values[cookie.name] = cookie.value
+        return values
+
+    def extract(self, url, cookies):
+        """
+        Store cookies a response to ``url`` set.
+
+        :param cookies: ``http.cookies.SimpleCookie`` of the response, as
+            ``aiohttp`` parses it; cookies for domains ``url`` is not part
+            of, or for public suffixes such as ``com``, are ignored.
+        """
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        now = self._clock()
+        for name, morsel in cookies.items():
+            domain = morsel['domain'].lower().lstrip('.')
+            if domain:
+                if host != domain and not host.endswith('.' + domain):
+                    continue
+                if _is_ip(domain) or _is_public_suffix(domain):
+                    if domain != host:
+                        continue
+                    # Only for the host itself, such as localhost.
+                else:
+                    domain = '.' + domain
+            else:
+                domain = host
+
+            expires = None
+            if morsel['max-age']:
+                try:
+                    expires = now + int(morsel['max-age'])
+                except ValueError:
+                    pass
+            elif morsel['expires']:
+                expires = http2time(morsel['expires'])
+
+            self.set_cookie(create_cookie(
+                name, morsel.value, domain=domain,
+                path=morsel['path'] or _default_path(parts.path),
+                expires=expires, secure=bool(morsel['secure']),
+                httponly=bool(morsel['httponly'])))
+
+    def __iter__(self):
+        for paths in list(self._domains.values()):
+            for names in list(paths.values()):
+                for cookie in list(names.values()):
+                    yield cookie
+
+    def __len__(self):
+        return sum(len(names) for paths in self._domains.values()
+                   for names in paths.values())
+
+    def __bool__(self):
+        return bool(self._domains)
+
+    def __contains__(self, name):
+        return any(cookie.name == name for cookie in self)
+
+    def __getitem__(self, name):
+        for cookie in self:
+            if cookie.name == name:
+                return cookie.value
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [cookie.name for cookie in self]
+
+    def values(self):
+        return [cookie.value for cookie in self]
+
+    def items(self):
+        return [(cookie.name, cookie.value) for cookie in self]
+
+    def __repr__(self):
+        return '<CookieStore[{0}]>'.format(
+            ', '.join('{0}={1} for {2}{3}'.format(c.name, c.value, c.domain,
+                                                  c.path) for c in self))
+
+
+class FileCookieStore(CookieStore):
+    """
+    A :class:`CookieStore` kept in a file, so sessions survive restarts.
+    ``HTTPClient(cookiejar='cookies.jsonl')`` opens one.
+
+    The file is a log with one JSON line per cookie set or removed, so
+    storing a cookie appends a line rather than rewriting the file.  Once
+    the log has grown to twice the cookies it holds, and at least
+    ``compact_after`` lines, it is rewritten with only the live cookies.
+
+    :param str path: File to load the cookies from and log changes to.
+    :param bool keep_session_cookies: Also keep cookies without an expiry
+        date, which a browser would drop when it is closed.
+    :param int compact_after: Lines the log may have before it is first
+        compacted.
+    :param clock: Callable returning the current time in seconds since the
+        epoch.
+    """
+    def __init__(self, path, keep_session_cookies=True, compact_after=1000,
+                 clock=time.time):
+        super(FileCookieStore, self).__init__(clock=clock)
+        self.path = path
+        self.keep_session_cookies = keep_session_cookies
+        self.compact_after = compact_after
+        self._file = None
+        self._load()
+        self.compact()
+
+    def _load(self):
+        # Nothing is logged while self._file is None.
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record[0] == 's':
+                        (name, value, domain, path, expires, secure,
+                         httponly) = record[1:]
+                        self.set_cookie(create_cookie(
+                            name, value, domain=domain, path=path,
+                            expires=expires, secure=secure,
+                            httponly=httponly))
+                    elif record[0] == 'd':
+                        self.remove(*record[1:])
+                except (ValueError, TypeError, IndexError):
+                    # Cut short by a crash while it was written.
+                    continue
+
+    def _persists(self, cookie):
+        return cookie.expires is not None or self.keep_session_cookies
+
+    def _record(self, cookie):
+        return ['s', cookie.name, cookie.value, cookie.domain, cookie.path,
+                cookie.expires, bool(cookie.secure),
+                cookie.has_nonstandard_attr('HttpOnly')]
+
+    def _log(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        self._lines += 1
+        if self._lines >= self._compact_at:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the log with only the cookies that are still live.
+        """
+        if self._file is not None:
+            self._file.close()
+        now = self._clock()
+        records = [self._record(cookie) for cookie in self
+                   if not self._expired(cookie, now) and
+                   self._persists(cookie)]
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(records)
+        self._compact_at = max(self.compact_after, 2 * len(records))
+
+    def close(self):
+        if self._file is not None:
+            self.compact()
+            self._file.close()
+            self._file = None
+
+    def set_cookie(self, cookie):
+        super(FileCookieStore, self).set_cookie(cookie)
+        if (self._file is not None and self._persists(cookie) and
+                not self._expired(cookie, self._clock())):
+            self._log(self._record(cookie))
+
+    def remove(self, name, domain='', path='/'):
+        paths = self._domains.get(domain)
+        if not paths or name not in paths.get(path, ()):
+            return
+        super(FileCookieStore, self).remove(name, domain, path)
+        if self._file is not None:
+            self._log(['d', name, domain, path])
+
+    def clear(self):
+        super(FileCookieStore, self).clear()
+        if self._file is not None:
+            self.compact()
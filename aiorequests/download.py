@@ -0,0 +1,472 @@
+"""
+Downloading responses straight to files.
+"""
+
+import asyncio
+import json
+import os
+
+from collections import namedtuple
+
+import aiohttp
+
+
+FSYNC_POLICIES = (None, 'end', 'always')
+
+
+class DownloadError(Exception):
+    """
+    Raised when a download fails with an error status or ends short.  What
+    was received is kept to resume from.
+    """
+    def __init__(self, url, reason):
+        super(DownloadError, self).__init__(
+            'Download of {0} failed: {1}.'.format(url, reason))
+        self.url = url
+        self.reason = reason
+
+
+class DownloadResult(namedtuple('DownloadResult', ['path', 'size', 'received',
+                                                   'elapsed', 'resumed_from'])):
+    """
+    What :meth:`aiorequests.client.HTTPClient.download` did: ``size`` bytes
+    are in ``path``, ``received`` of them were received in ``elapsed``
+    seconds, the other ``resumed_from`` were already there from an earlier
+    attempt.
+    """
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        """
+        Bytes received per second.
+        """
+        return self.received / max(self.elapsed, 1e-9)
+
+
+def _content_range(value):
+    """
+    Parse ``bytes <start>-<end>/<total>`` into ``(start, total)``; either
+    is ``None`` if it is unknown or missing.
+    """
+    try:
+        unit, _, spec = value.strip().partition(' ')
+        span, _, total = spec.partition('/')
+        start = None if span == '*' else int(span.partition('-')[0])
+        return start, None if total == '*' else int(total)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def _validator(headers):
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        # Weak validators cannot be used with If-Range.
+        return etag
+    return headers.get('Last-Modified')
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(state_path, state):
+    tmp = state_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _preallocate(f, size):
+    fallocate = getattr(os, 'posix_fallocate', None)
+    if fallocate is not None:
+        try:
+            fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            # Not supported by the file system.
+            pass
+    if os.fstat(f.fileno()).st_size < size:
+        f.truncate(size)
+
+
+def _open_part(part, offset, size):
+    f = open(part, 'r+b' if offset else 'wb')
+    try:
+        if size:
+            _preallocate(f, size)
+        f.seek(offset)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _checkpoint(f, state_path, state, fsync):
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+    _save_state(state_path, state)
+
+
+def _finish(f, part, path, state_path, size, fsync):
+    f.truncate(size)
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+    f.close()
+    os.replace(part, path)
+    _unlink(state_path)
+
+
+def _pwrite(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view = view[n:]
+        offset += n
+
+
+def _segments(size, count):
+    """
+    Split ``size`` bytes into ``count`` contiguous ``[start, end, next]``
+    ranges, ``next`` being the first byte not written yet.
+    """
+    step, extra = divmod(size, count)
+    segments = []
+    start = 0
+    for i in range(count):
+        end = start + step + (1 if i < extra else 0)
+        segments.append([start, end, start])
+        start = end
+    return segments
+
+
+class _Changed(DownloadError):
+    """
+    A segment got the whole object instead of its range: the object changed
+    since the download started.
+    """
+
+
+class _Retryable(DownloadError):
+    """
+    A segment failed in a way that asking again may fix: a server error, or
+    a range that was cut short.
+    """
+
+
+def _release(response):
+    release = getattr(response.original, 'release', None)
+    if release is not None:
+        release()
+
+
+@asyncio.coroutine
+def download(client, url, path, chunk_size=1024 * 1024, resume=True,
+             fsync='end', progress=None, segments=1, segment_retry=None,
+             min_segment_size=8 * 1024 * 1024, checkpoint=32 * 1024 * 1024,
+             **kwargs):
+    """
+    See :meth:`aiorequests.client.HTTPClient.download`.
+
+    :param int min_segment_size: Fewer than ``segments`` segments are used
+        for objects that would otherwise be split into smaller segments.
+    :param int checkpoint: Bytes received between two saves of the
+        progress made.
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError("fsync must be one of {0!r}".format(FSYNC_POLICIES))
+    loop = client._loop
+
+    if segments > 1:
+        result = yield from _download_segments(
+            client, url, path, segments, segment_retry, min_segment_size,
+            chunk_size, resume, fsync, progress, checkpoint, kwargs)
+        if result is not None:
+            return result
+
+    def run(function, *args):
+        return loop.run_in_executor(None, function, *args)
+
+    part = path + '.part'
+    state_path = part + '.json'
+    headers = dict(kwargs.pop('headers', None) or {})
+    kwargs.setdefault('cache', False)
+    kwargs.setdefault('coalesce', False)
+
+    state = (yield from run(_load_state, state_path)) if resume else None
+    offset = 0
+    request_headers = headers
+    if (state and state.get('url') == url and state.get('validator') and
+            state.get('written') and os.path.exists(part)):
+        offset = state['written']
+        request_headers = dict(headers, Range='bytes={0}-'.format(offset))
+        request_headers['If-Range'] = state['validator']
+
+    started = loop.time()
+    resp = yield from client.request('GET', url, headers=request_headers,
+                                     **kwargs)
+    status = resp.status_code
+    if offset and status == 416:
+        _release(resp)
+        _, total = _content_range(resp.headers.get('Content-Range'))
+        if total == offset:
+            # Interrupted after the last byte was written.
+            f = yield from run(_open_part, part, offset, None)
+            yield from run(_finish, f, part, path, state_path, offset,
+                           fsync is not None)
+            return DownloadResult(path, offset, 0, loop.time() - started,
+                                  offset)
+        status = None
+    if status is not None and status >= 400:
+        _release(resp)
+        raise DownloadError(url, 'status {0}'.format(status))
+
+    if status == 206:
+        start, total = _content_range(resp.headers.get('Content-Range'))
+        if start != offset:
+            _release(resp)
+            status = None
+    elif status is not None:
+        # The whole object, because it changed or ranges are not supported.
+        offset = 0
+        try:
+            total = int(resp.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            total = None
+
+    if status is None:
+        # Cannot continue where we stopped: start over.
+        yield from run(_unlink, state_path)
+        return (yield from download(
+            client, url, path, chunk_size=chunk_size, resume=False,
+            fsync=fsync, progress=progress, checkpoint=checkpoint,
+            headers=headers, **kwargs))
+
+    state = {'url': url, 'validator': _validator(resp.headers),
+             'size': total, 'written': offset}
+    f = yield from run(_open_part, part, offset, total)
+    done = saved = offset
+    buffers = [bytearray(chunk_size), bytearray(chunk_size)]
+    turn = 0
+    pending = None
+    pending_size = 0
+    finished = False
+    try:
+        yield from run(_save_state, state_path, state)
+        while True:
+            # Receive into one buffer while the other is written out.
+            n = yield from resp.readinto(buffers[turn])
+            if pending is not None:
+                # Shielded: a write cannot be called off once it started.
+                yield from asyncio.shield(pending, loop=loop)
+                pending = None
+                done += pending_size
+                if progress is not None:
+                    progress(done, total)
+                if done - saved >= checkpoint:
+                    state['written'] = saved = done
+                    yield from run(_checkpoint, f, state_path, dict(state),
+                                   fsync == 'always')
+            if not n:
+                break
+            pending = run(f.write, memoryview(buffers[turn])[:n])
+            pending_size = n
+            turn ^= 1
+
+        if total is not None and done != total:
+            raise DownloadError(url, 'ended after {0} of {1} bytes'
+                                .format(done, total))
+        yield from run(_finish, f, part, path, state_path, done,
+                       fsync is not None)
+        finished = True
+    finally:
+        if not finished:
+            if pending is not None:
+                yield from asyncio.wait([pending], loop=loop)
+                if not pending.cancelled() and pending.exception() is None:
+                    done += pending_size
+            state['written'] = done
+            f.close()
+            _save_state(state_path, state)
+
+    return DownloadResult(path, done, done - offset, loop.time() - started,
+                          offset)
+
+
+@asyncio.coroutine
+def _download_segments(client, url, path, count, retry, min_segment_size,
+                       chunk_size, resume, fsync, progress, checkpoint,
+                       kwargs):
+    """
+    Download ``url`` as ``count`` ranges fetched concurrently, each written
+    at its offset in the preallocated part file.
+
+    Returns ``None``, without having written anything, if the server does
+    not tell the size of the object, does not support ranges, gives no
+    validator to check that every range is of the same object, or if the
+    object is too small to be split.
+    """
+    from aiorequests.retry import RetryPolicy
+
+    loop = client._loop
+    retry = retry or RetryPolicy()
+    # Not DownloadError: a 4xx status will be the same for every attempt.
+    retried = retry.exceptions + (aiohttp.ClientError, ConnectionError,
+                                  _Retryable)
+
+    def run(function, *args):
+        return loop.run_in_executor(None, function, *args)
+
+    part = path + '.part'
+    state_path = part + '.json'
+    headers = dict(kwargs.pop('headers', None) or {})
+    kwargs.setdefault('cache', False)
+    kwargs.setdefault('coalesce', False)
+
+    started = loop.time()
+    head = yield from client.request('HEAD', url, headers=headers, **kwargs)
+    _release(head)
+    validator = _validator(head.headers)
+    try:
+        size = int(head.headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        size = None
+    count = min(count, (size or 0) // max(min_segment_size, 1))
+    if (head.status_code >= 400 or
+            head.headers.get('Accept-Ranges', '').lower() != 'bytes' or
+            not validator or count < 2):
+        kwargs['headers'] = headers
+        return None
+
+    state = (yield from run(_load_state, state_path)) if resume else None
+    if (state and state.get('url') == url and
+            state.get('validator') == validator and
+            state.get('size') == size and state.get('segments') and
+            os.path.exists(part)):
+        segments = state['segments']
+    else:
+        segments = _segments(size, count)
+        state = {'url': url, 'validator': validator, 'size': size,
+                 'segments': segments}
+    resumed = sum(next_ - start for start, _, next_ in segments)
+    done = saved = resumed
+    saving = []
+
+    f = yield from run(_open_part, part, resumed, size)
+    fd = f.fileno()
+
+    def written(n):
+        nonlocal done, saved
+        done += n
+        if progress is not None:
+            progress(done, size)
+        if done - saved >= checkpoint and not saving:
+            # One save at a time: they share the temporary file.
+            saved = done
+            snapshot = dict(state, segments=[list(segment)
+                                             for segment in segments])
+            save = run(_checkpoint, f, state_path, snapshot,
+                       fsync == 'always')
+            saving.append(save)
+            save.add_done_callback(lambda _: saving.clear())
+
+    @asyncio.coroutine
+    def fetch(segment):
+        buffer = bytearray(min(chunk_size, segment[1] - segment[0]))
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                yield from fetch_once(segment, buffer)
+                return
+            except retried:
+                if attempt >= retry.max_attempts:
+                    raise
+            yield from asyncio.sleep(retry.delay(attempt), loop=loop)
+
+    @asyncio.coroutine
+    def fetch_once(segment, buffer):
+        start, end = segment[2], segment[1]
+        range_headers = dict(headers, Range='bytes={0}-{1}'.format(
+            start, end - 1))
+        range_headers['If-Range'] = validator
+        resp = yield from client.request('GET', url, headers=range_headers,
+                                         **kwargs)
+        status = resp.status_code
+        if status != 206:
+            _release(resp)
+            if status < 400:
+                raise _Changed(url, 'the object changed')
+            if status >= 500:
+                raise _Retryable(url, 'status {0}'.format(status))
+            raise DownloadError(url, 'status {0}'.format(status))
+        if _content_range(resp.headers.get('Content-Range'))[0] != start:
+            _release(resp)
+            raise _Changed(url, 'the range does not match')
+
+        try:
+            while segment[2] < end:
+                view = memoryview(buffer)[:end - segment[2]]
+                n = yield from resp.readinto(view)
+                if not n:
+                    raise _Retryable(url, 'range ended at {0} of {1}-{2}'
+                                     .format(segment[2], start, end - 1))
+                write = run(_pwrite, fd, view[:n], segment[2])
+                try:
+                    yield from asyncio.shield(write, loop=loop)
+                except asyncio.CancelledError:
+                    # The write cannot be called off: the file must not be
+                    # closed under it.
+                    yield from asyncio.wait([write], loop=loop)
+                    raise
+                segment[2] += n
+                written(n)
+        finally:
+            _release(resp)
+
+    tasks = [asyncio.ensure_future(fetch(segment), loop=loop)
+             for segment in segments if segment[2] < segment[1]]
+    finished = False
+    try:
+        if tasks:
+            yield from asyncio.wait(tasks, loop=loop,
+                                    return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+        yield from run(_finish, f, part, path, state_path, size,
+                       fsync is not None)
+        finished = True
+    finally:
+        if not finished:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                yield from asyncio.wait(tasks, loop=loop)
+            changed = any(not task.cancelled() and
+                          isinstance(task.exception(), _Changed)
+                          for task in tasks)
+            if saving:
+                yield from asyncio.wait(saving, loop=loop)
+            f.close()
+            if changed:
+                # Start over next time.
+                _unlink(state_path)
+            else:
+                _save_state(state_path, state)
+
+    return DownloadResult(path, size, done - resumed,
+                          loop.time() - started, resumed)
@@ -0,0 +1,150 @@
+"""
+Hedged requests: a second copy of a slow request, first answer wins.
+"""
+
+import asyncio
+import itertools
+
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+from aiorequests._utils import origin_of
+from aiorequests.retry import IDEMPOTENT_METHODS
+
+
+class HedgePolicy(object):
+    """
+    When to send a second copy of a request and where to.
+
+    A request is hedged if its response headers have not arrived after
+    ``delay`` seconds or, without a fixed ``delay``, after the
+    ``percentile`` of the latencies recently seen for its origin.  The copy
+    goes to the next of the ``alternates`` of the origin, or to the same
+    URL.  Share one policy between requests to share the latency history.
+
+    :param float delay: Fixed delay before hedging.
+    :param float percentile: Latency percentile to hedge at when there is no
+        fixed ``delay``.
+    :param int min_samples: Latencies to see for an origin before hedging
+        requests to it at the percentile.
+    :param int window: Latencies to remember per origin.
+    :param dict alternates: Maps origins such as ``'https://a.example.com'``
+        to lists of origins serving the same content.
+    :param methods: Methods that may be hedged.  Default: the idempotent
+        ones.
+
+    The counters ``hedged`` and ``hedges_won`` count the copies sent and
+    how many of them answered first.
+    """
+    def __init__(self, delay=None, percentile=95, min_samples=20,
+                 window=1000, alternates=None, methods=IDEMPOTENT_METHODS):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.methods = frozenset(m.upper() for m in methods)
+        self._alternates = dict(
+            (origin.rstrip('/'), itertools.cycle(others))
+            for origin, others in (alternates or {}).items() if others)
+        self._latencies = {}
+        # origin -> percentile, dropped whenever a latency is recorded
+        self._thresholds = {}
+
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def hedges_method(self, method):
+        return method.upper() in self.methods
+
+    def record(self, url, seconds):
+        origin = origin_of(url)
+        latencies = self._latencies.get(origin)
+        if latencies is None:
+            latencies = self._latencies[origin] = deque(maxlen=self.window)
+        latencies.append(seconds)
+        self._thresholds.pop(origin, None)
+
+    def hedge_delay(self, url):
+        """
+        Seconds to wait for ``url`` before hedging, or ``None`` to not hedge.
+        """
+        if self.delay is not None:
+            return self.delay
+        origin = origin_of(url)
+        threshold = self._thresholds.get(origin)
+        if threshold is None:
+            latencies = self._latencies.get(origin, ())
+            if len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+            index = int(round(self.percentile / 100.0 * (len(ordered) - 1)))
+            threshold = self._thresholds[origin] = ordered[index]
+        return threshold
+
+    def hedge_url(self, url):
+        alternates = self._alternates.get(origin_of(url))
+        if alternates is None:
+            return url
+        parts = urlsplit(url)
+        alternate = urlsplit(next(alternates))
+        return urlunsplit((alternate.scheme, alternate.netloc) + parts[2:])
+
+    @asyncio.coroutine
+    def call(self, send, url, loop):
+        """
+        Call the coroutine function ``send`` with ``url`` and, if it is slow
+        to answer, again with :meth:`hedge_url`.  Return the first response
+        and cancel the other attempt.
+        """
+        delay = self.hedge_delay(url)
+        started = loop.time()
+        primary = asyncio.ensure_future(send(url), loop=loop)
+        attempts = [primary]
+        winner = None
+        try:
+            if delay is not None:
+                yield from asyncio.wait(attempts, timeout=delay, loop=loop)
+                if not primary.done():
+                    self.hedged += 1
+                    attempts.append(asyncio.ensure_future(
+                        send(self.hedge_url(url)), loop=loop))
+
+            pending = list(attempts)
+            while True:
+                done, pending = yield from asyncio.wait(
+                    pending, loop=loop, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((attempt for attempt in attempts
+                               if attempt in done and
+                               attempt.exception() is None), None)
+                if winner is not None:
+                    break
+                if not pending:
+                    # Every attempt failed; report the original's error.
+                    return primary.result()
+
+            if winner is not primary:
+                self.hedges_won += 1
+            # When the copy wins this is a lower bound of the latency of
+            # the original, which is still what the percentile is about.
+            self.record(url, loop.time() - started)
+            return winner.result()
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    _discard(attempt)
+
+
+def _discard(attempt):
+    """
+    Cancel a losing attempt, or release its response if it has one, so the
+    connection goes back to the pool or is closed.
+    """
+    def release(attempt):
+        if not attempt.cancelled() and attempt.exception() is None:
+            attempt.result().release()
+
+    if attempt.done():
+        release(attempt)
+    else:
+        attempt.cancel()
+        attempt.add_done_callback(release)
@@ -0,0 +1,183 @@
+"""
+Connection pool sizing, eviction and accounting.
+"""
+
+import asyncio
+import weakref
+
+from collections import defaultdict, namedtuple
+
+from aiohttp import ClientRequest, ClientTimeout, TCPConnector
+from yarl import URL
+
+from aiorequests.resolver import CachingResolver
+from aiorequests.tls import SSLContextCache
+
+
+PoolStats = namedtuple('PoolStats', ['open', 'idle', 'in_use', 'waiting'])
+
+
+def _host_label(req):
+    return '{0}:{1}'.format(req.host, req.port)
+
+
+def _connected(protocol):
+    transport = getattr(protocol, 'transport', None)
+    return transport is not None and not transport.is_closing()
+
+
+def _tls_sessions(protocol):
+    """
+    Return the ``ssl.SSLObject`` of a connection and the
+    :class:`aiorequests.tls.TLSSessionStore` of its context, if any.
+    """
+    transport = getattr(protocol, 'transport', None)
+    if transport is None:
+        return None, None
+    ssl_object = transport.get_extra_info('ssl_object')
+    if ssl_object is None:
+        return None, None
+    return ssl_object, getattr(ssl_object.context, 'sessions', None)
+
+
+class PooledConnector(TCPConnector):
+    """
+    A ``TCPConnector`` that retires connections after a maximum lifetime and
+    reports live per-host counters.
+
+    Only the public ``connect()`` of the connector is extended, and idle
+    connections are still kept and closed by ``TCPConnector`` itself
+    according to ``limit``, ``limit_per_host`` and ``keepalive_timeout``.
+
+    :param float max_lifetime: Seconds after which a connection is closed
+        instead of being used again, no matter how busy it is.  ``None``
+        keeps connections for as long as they stay healthy.
+    :param resolver: Resolver for host names.  Anything but a
+        :class:`aiorequests.resolver.CachingResolver` is wrapped in one, which
+        replaces the connector's own DNS cache.
+    :param ssl_contexts: :class:`aiorequests.tls.SSLContextCache` providing
+        the TLS context of verified requests, unless ``ssl`` is given.
+        Sessions are remembered per host and resumed by new connections.
+
+    Every other keyword argument (``limit``, ``limit_per_host``,
+    ``keepalive_timeout``, ...) is passed to ``TCPConnector`` unchanged.
+    """
+    def __init__(self, max_lifetime=None, resolver=None, ssl_contexts=None,
+                 **kwargs):
+        if not isinstance(resolver, CachingResolver):
+            resolver = CachingResolver(resolver, loop=kwargs.get('loop'))
+        kwargs['use_dns_cache'] = False
+        self._ssl_contexts = ssl_contexts or SSLContextCache()
+        if all(kwargs.get(name) is None for name in
+               ('ssl', 'ssl_context', 'verify_ssl', 'fingerprint')):
+            kwargs['ssl'] = self._ssl_contexts.context(verify=True)
+        super(PooledConnector, self).__init__(resolver=resolver, **kwargs)
+        self._max_lifetime = max_lifetime
+        self._created = weakref.WeakKeyDictionary()
+        # 'host:port' -> protocols opened, and handed out, by connect()
+        self._opened = defaultdict(weakref.WeakSet)
+        self._in_use = defaultdict(weakref.WeakSet)
+        self._connecting = defaultdict(int)
+
+    @property
+    def max_lifetime(self):
+        return self._max_lifetime
+
+    def _expired(self, protocol):
+        if self._max_lifetime is None:
+            return False
+        created = self._created.get(protocol)
+        if created is None:
+            return False
+        return self._loop.time() - created >= self._max_lifetime
+
+    @asyncio.coroutine
+    def connect(self, req, *args, **kwargs):
+        label = _host_label(req)
+        self._connecting[label] += 1
+        try:
+            while True:
+                connection = yield from super(PooledConnector, self).connect(
+                    req, *args, **kwargs)
+                protocol = connection.protocol
+                ssl_object, sessions = _tls_sessions(protocol)
+                if protocol not in self._created:
+                    self._created[protocol] = self._loop.time()
+                    self._opened[label].add(protocol)
+                    if sessions is not None:
+                        sessions.record(ssl_object)
+                    break
+                if not self._expired(protocol):
+                    # TLS 1.3 tickets arrive after the handshake, keep the
+                    # newest one.
+                    if sessions is not None and ssl_object.server_hostname:
+                        sessions.set(ssl_object.server_hostname,
+                                     ssl_object.session)
+                    break
+                connection.close()
+        finally:
+            self._connecting[label] -= 1
+            if not self._connecting[label]:
+                del self._connecting[label]
+
+        in_use = self._in_use[label]
+        in_use.add(protocol)
+        connection.add_callback(lambda: in_use.discard(protocol))
+        return connection
+
+    def stats(self):
+        """
+        Return live connection counters.  ``waiting`` counts the requests
+        still waiting for a connection, to be opened or to be freed.
+
+        :rtype: ``dict`` mapping ``'host:port'`` to :class:`PoolStats`.
+        """
+        counters = {}
+        for label in set(self._opened) | set(self._connecting):
+            opened = [p for p in self._opened.get(label, ()) if _connected(p)]
+            in_use = sum(1 for p in self._in_use.get(label, ())
+                         if _connected(p))
+            waiting = self._connecting.get(label, 0)
+            if opened or waiting:
+                counters[label] = PoolStats(len(opened),
+                                            len(opened) - in_use,
+                                            in_use, waiting)
+        return counters
+
+
+WarmResult = namedtuple('WarmResult', ['opened', 'failed', 'elapsed'])
+
+
+@asyncio.coroutine
+def open_connections(connector, url, count, verify=True, timeout=None,
+                     loop=None):
+    """
+    Open up to ``count`` connections to the origin of ``url`` and leave them
+    idle in ``connector``'s pool.
+
+    Connections are resolved, connected and, for ``https``, handshaken
+    exactly like the ones requests would open, so later requests pick them
+    up.  ``count`` is capped by the connector's global and per-host limits.
+
+    :rtype: tuple of the number of parked connections and of failures.
+    """
+    loop = loop or asyncio.get_event_loop()
+    for limit in (connector.limit, connector.limit_per_host):
+        if limit:
+            count = min(count, limit)
+
+    req = ClientRequest('GET', URL(url), loop=loop,
+                        ssl=None if verify else False)
+    connect_timeout = ClientTimeout(total=None, sock_connect=timeout)
+    results = yield from asyncio.gather(
+        *[connector.connect(req, [], connect_timeout) for _ in range(count)],
+        loop=loop, return_exceptions=True)
+
+    opened = 0
+    for result in results:
+        if isinstance(result, Exception):
+            continue
+        result.release()
+        opened += 1
+
+    return opened, len(results) - opened
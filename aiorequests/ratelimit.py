@@ -0,0 +1,138 @@
+"""
+Client-side rate limiting with token buckets.
+"""
+
+import asyncio
+
+from collections import deque
+
+from aiorequests._utils import origin_of
+
+
+def _origin(method, url):
+    return origin_of(url)
+
+
+class TokenBucket(object):
+    """
+    Hands out up to ``rate`` tokens per second, and up to ``burst`` at once
+    after a quiet period.  Waiters are served strictly in order, so a
+    costly request is not starved by a stream of cheap ones.
+
+    :param float rate: Tokens added per second.
+    :param float burst: Capacity of the bucket.  Default: ``rate``.
+    """
+    def __init__(self, rate, burst=None, loop=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._loop = loop or asyncio.get_event_loop()
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = float(self.burst)
+        self._updated = self._loop.time()
+        self._waiters = deque()
+        self._wakeup = None
+
+    @property
+    def waiting(self):
+        return sum(1 for _, waiter in self._waiters if not waiter.done())
+
+    def _refill(self):
+        now = self._loop.time()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _serve(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters:
+            cost, waiter = self._waiters[0]
+            if waiter.done():
+                # Cancelled while waiting.
+                self._waiters.popleft()
+                continue
+            if self.tokens < cost:
+                self._wakeup = self._loop.call_later(
+                    (cost - self.tokens) / self.rate, self._serve)
+                return
+            self._waiters.popleft()
+            self.tokens -= cost
+            waiter.set_result(None)
+
+    @asyncio.coroutine
+    def acquire(self, cost=1):
+        """
+        Wait until ``cost`` tokens are available and take them.
+        """
+        if cost > self.burst:
+            raise ValueError("cost {0} exceeds the burst size {1}"
+                             .format(cost, self.burst))
+        self._refill()
+        if not self._waiters and self.tokens >= cost:
+            self.tokens -= cost
+            return
+
+        waiter = self._loop.create_future()
+        self._waiters.append((cost, waiter))
+        if self._wakeup is None:
+            self._serve()
+        try:
+            yield from waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Served, but cancelled before it could run: give back.
+                self.tokens += cost
+            if self._wakeup is not None:
+                self._wakeup.cancel()
+            self._serve()
+            raise
+
+
+class RateLimiter(object):
+    """
+    Token buckets per origin, or per any other key, for
+    :class:`aiorequests.client.HTTPClient` to wait on before sending a
+    request.
+
+    :param float rate: Requests (or cost units) per second of each bucket.
+    :param float burst: Capacity of each bucket.  Default: ``rate``.
+    :param key: Callable taking the method and URL of a request and
+        returning the key of its bucket, or ``None`` to not limit it.
+        Default: the origin of the URL.
+    :param cost: Callable taking the method and URL of a request and
+        returning the tokens it takes.  Default: 1.
+    :param dict limits: Maps keys to ``(rate, burst)`` of their buckets, for
+        keys with quotas other than ``rate`` and ``burst``.
+    """
+    def __init__(self, rate, burst=None, key=None, cost=None, limits=None,
+                 loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self.rate = rate
+        self.burst = burst
+        self._key = key or _origin
+        self._cost = cost
+        self._limits = limits or {}
+        self._buckets = {}
+
+    def bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self._limits.get(key, (self.rate, self.burst))
+            bucket = self._buckets[key] = TokenBucket(rate, burst,
+                                                      loop=self._loop)
+        return bucket
+
+    def buckets(self):
+        return dict(self._buckets)
+
+    @asyncio.coroutine
+    def acquire(self, method, url):
+        """
+        Wait until the request may be sent.
+        """
+        key = self._key(method, url)
+        if key is None:
+            return
+        cost = self._cost(method, url) if self._cost is not None else 1
+        yield from self.bucket(key).acquire(cost)
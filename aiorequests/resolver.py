@@ -0,0 +1,122 @@
+"""
+Cached hostname resolution.
+"""
+
+import asyncio
+import socket
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+
+def _override_hosts(hostname, addresses, port, family):
+    hosts = []
+    for address in addresses:
+        address_family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        if family not in (0, socket.AF_UNSPEC, address_family):
+            continue
+        hosts.append({
+            'hostname': hostname,
+            'host': address,
+            'port': port,
+            'family': address_family,
+            'proto': 0,
+            'flags': socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+        })
+    return hosts
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Resolver that caches answers of another resolver.
+
+    Successful lookups are kept for the ``ttl`` reported by the wrapped
+    resolver (the smallest ``'ttl'`` of the returned hosts) or ``ttl`` when it
+    reports none.  Failed and timed out lookups are kept for
+    ``negative_ttl`` and raise the same error again until they expire.
+    Concurrent lookups of the same name share a single query.
+
+    :param resolver: The ``aiohttp`` resolver doing the actual lookups.
+        Default: ``aiohttp.resolver.DefaultResolver``.
+    :param float ttl: Seconds to keep answers without a TTL of their own.
+    :param float negative_ttl: Seconds to keep failed lookups.
+    :param float timeout: Give up on a lookup after this many seconds.
+    :param overrides: Static answers that never reach the resolver.
+    :type overrides: ``dict`` mapping host names to lists of IP addresses.
+    :param int maxsize: Maximum number of cached names.
+    """
+    def __init__(self, resolver=None, ttl=60, negative_ttl=5, timeout=None,
+                 overrides=None, maxsize=1024, loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self._resolver = resolver or DefaultResolver(loop=self._loop)
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._timeout = timeout
+        self._overrides = dict(overrides or {})
+        self._maxsize = maxsize
+        self._cache = {}
+        self._pending = {}
+
+    def clear(self):
+        """
+        Forget every cached answer.
+        """
+        self._cache.clear()
+
+    def _store(self, key, ttl, result):
+        now = self._loop.time()
+        if len(self._cache) >= self._maxsize:
+            for k, (expires, _) in list(self._cache.items()):
+                if expires <= now:
+                    del self._cache[k]
+        while len(self._cache) >= self._maxsize:
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now + ttl, result)
+
+    @asyncio.coroutine
+    def _lookup(self, key):
+        host, port, family = key
+        try:
+            hosts = yield from asyncio.wait_for(
+                self._resolver.resolve(host, port, family=family),
+                self._timeout, loop=self._loop)
+        except asyncio.TimeoutError:
+            error = socket.gaierror(socket.EAI_AGAIN,
+                                    'Timeout resolving {0}'.format(host))
+            self._store(key, self._negative_ttl, error)
+            raise error
+        except OSError as e:
+            self._store(key, self._negative_ttl, e)
+            raise
+
+        ttls = [h['ttl'] for h in hosts if h.get('ttl') is not None]
+        self._store(key, min(ttls) if ttls else self._ttl, hosts)
+        return hosts
+
+    @asyncio.coroutine
+    def resolve(self, host, port=0, family=socket.AF_INET):
+        if host in self._overrides:
+            return _override_hosts(host, self._overrides[host], port, family)
+
+        key = (host, port, family)
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires, result = cached
+            if expires > self._loop.time():
+                if isinstance(result, Exception):
+                    raise result
+                return list(result)
+            del self._cache[key]
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._lookup(key), loop=self._loop)
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+            self._pending[key] = pending
+
+        hosts = yield from asyncio.shield(pending, loop=self._loop)
+        return list(hosts)
+
+    @asyncio.coroutine
+    def close(self):
+        yield from self._resolver.close()
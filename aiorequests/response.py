@@ -1,13 +1,113 @@
-from requests.cookies import cookiejar_from_dict
+import asyncio
+import functools
 
-from aiorequests.content import content, json_content, text_content
+from collections import deque
+
+from aiorequests.buffers import BufferPool, PooledBody
+from aiorequests.content import (
+    collect, content, json_content, text_content
+)
+from aiorequests.cookies import CookieStore
+
+
+# Allocates every buffer afresh, for clients without a pool.
+_NO_POOL = BufferPool(min_size=4096, max_bytes=0)
+
+
+class _InMemoryBody(object):
+    """
+    Chunks of a body that is read whole anyway: served from a cache, or
+    shared with coalesced requests.
+    """
+    def __init__(self, read, chunk_size):
+        self._read = read
+        self._chunk_size = chunk_size
+        self._body = None
+        self._offset = 0
+
+    @asyncio.coroutine
+    def read(self):
+        if self._body is None:
+            self._body = yield from self._read()
+        size = self._chunk_size or len(self._body)
+        chunk = self._body[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return chunk
+
+
+class _BodyIterator(object):
+    """
+    Asynchronous iterator over the chunks that ``read`` returns until it
+    returns an empty one.
+    """
+    def __init__(self, response, read):
+        self._response = response
+        self._read = read
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        chunk = yield from self._response._read_chunk(self._read)
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
+
+
+class _LineIterator(object):
+    """
+    Asynchronous iterator over the lines of the chunks of ``chunks``, split
+    on ``delimiter``, or on newlines without their ``\\r\\n`` or ``\\n``.
+    """
+    def __init__(self, chunks, delimiter=None):
+        self._chunks = chunks
+        self._delimiter = delimiter
+        self._pending = b''
+        self._lines = deque()
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        while not self._lines:
+            if self._chunks is None:
+                raise StopAsyncIteration
+            try:
+                chunk = yield from self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._chunks = None
+                if self._pending:
+                    self._lines.append(self._pending)
+                    self._pending = b''
+                continue
+            lines = (self._pending + chunk).split(self._delimiter or b'\n')
+            self._pending = lines.pop()
+            self._lines.extend(lines)
+        line = self._lines.popleft()
+        if self._delimiter is None and line.endswith(b'\r'):
+            line = line[:-1]
+        return line
 
 
 # TODO: almost deprecated with the aiohttp native response
 class _Response(object):
-    def __init__(self, original, cookiejar):
+    def __init__(self, original, cookiejar, cache_status=None,
+                 deadlines=None, request_cookies=None, buffer_pool=None):
         self.original = original
         self._cookiejar = cookiejar
+        # Cookies sent with the request only, added to cookies() on demand.
+        self._request_cookies = request_cookies
+        # 'hit', 'miss' or 'revalidated' when the client has a cache.
+        self.cache_status = cache_status
+        # aiorequests.timeouts.Deadlines still to enforce on the body.
+        self._deadlines = deadlines
+        self._buffer_pool = buffer_pool or _NO_POOL
+        # What readinto() reads from, and the rest of a chunk it could not
+        # fit into the last buffer.
+        self._reader = None
+        self._leftover = None
 
         self.url = self.original.url
         self.status_code = self.original.status
@@ -26,18 +126,141 @@ class _Response(object):
 
     encoding = property(_get_encoding, _set_encoding)
 
+    @asyncio.coroutine
+    def _read(self, reading):
+        if self._deadlines is None:
+            return (yield from reading)
+        try:
+            return (yield from self._deadlines.guard_read(self.original,
+                                                          reading))
+        finally:
+            self._deadlines.close()
+
+    @asyncio.coroutine
+    def _read_chunk(self, read):
+        if self._deadlines is None:
+            return (yield from read())
+        try:
+            chunk = yield from self._deadlines.guard_read(self.original,
+                                                          read())
+        except BaseException:
+            self._deadlines.close()
+            raise
+        if not chunk:
+            self._deadlines.close()
+        return chunk
+
+    def _chunk_reader(self, chunk_size):
+        stream = getattr(self.original, 'content', None)
+        if not hasattr(stream, 'readany'):
+            return _InMemoryBody(self.original.read, chunk_size).read
+        if chunk_size is None:
+            return stream.readany
+        return functools.partial(stream.read, chunk_size)
+
+    def iter_content(self, chunk_size=64 * 1024):
+        """
+        Iterate over the body in chunks of up to ``chunk_size`` bytes as it
+        arrives, with ``async for``.  The body is not kept, so it can only
+        be iterated over, or read, once.
+        """
+        return _BodyIterator(self, self._chunk_reader(chunk_size))
+
+    def iter_chunks(self):
+        """
+        Iterate over the body in chunks as they arrive, whatever their size.
+        """
+        return _BodyIterator(self, self._chunk_reader(None))
+
+    def iter_lines(self, chunk_size=64 * 1024, delimiter=None):
+        """
+        Iterate over the lines of the body as they arrive.
+
+        :param bytes delimiter: What lines end with.  Default: ``\\n`` or
+            ``\\r\\n``, which are left out of the lines.
+        """
+        return _LineIterator(self.iter_content(chunk_size), delimiter)
+
+    @asyncio.coroutine
+    def readinto(self, buffer):
+        """
+        Read the body into ``buffer``, a ``bytearray``, ``memoryview`` or
+        other writable buffer, until it is full or the body ends.
+
+        :return: The number of bytes read, 0 once the whole body has been.
+        """
+        if self._reader is None:
+            self._reader = self._chunk_reader(None)
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view):
+            chunk = self._leftover
+            if chunk is None:
+                data = yield from self._read_chunk(self._reader)
+                if not data:
+                    break
+                chunk = memoryview(data)
+            n = min(len(chunk), len(view) - filled)
+            view[filled:filled + n] = chunk[:n]
+            self._leftover = chunk[n:] if n < len(chunk) else None
+            filled += n
+        return filled
+
+    @asyncio.coroutine
+    def body(self):
+        """
+        Read the whole body into a buffer of the client's
+        :class:`aiorequests.buffers.BufferPool`, sized up front when the
+        response has a ``Content-Length``.
+
+        :rtype: :class:`aiorequests.buffers.PooledBody`, to release once
+            done with.
+        """
+        pool = self._buffer_pool
+        try:
+            length = int(self.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            length = 0
+        buffer = pool.acquire(length)
+        filled = 0
+        try:
+            while True:
+                filled += yield from self.readinto(memoryview(buffer)[filled:])
+                if filled < len(buffer):
+                    break
+                # Full: make sure there is more before growing.
+                if self._leftover is None:
+                    data = yield from self._read_chunk(self._reader)
+                    if not data:
+                        break
+                    self._leftover = memoryview(data)
+                bigger = pool.acquire(len(buffer) * 2)
+                bigger[:filled] = buffer
+                pool.release(buffer)
+                buffer = bigger
+        except BaseException:
+            pool.release(buffer)
+            raise
+        return PooledBody(pool, buffer, filled)
+
+    def collect(self, collector):
+        return collect(self, collector)
+
+    @asyncio.coroutine
     def content(self):
-        return (yield from self.original.read())
+        return (yield from self._read(self.original.read()))
 
+    @asyncio.coroutine
     def json(self, *args, **kwargs):
         if 'encoding' not in kwargs:
             kwargs['encoding'] = self.encoding
-        return (yield from self.original.json(*args, **kwargs))
+        return (yield from self._read(self.original.json(*args, **kwargs)))
 
+    @asyncio.coroutine
     def text(self, *args, **kwargs):
         if 'encoding' not in kwargs:
             kwargs['encoding'] = self.encoding
-        return (yield from self.original.text(*args, **kwargs))
+        return (yield from self._read(self.original.text(*args, **kwargs)))
 
     def history(self):
         response = self
@@ -52,10 +275,10 @@ class _Response(object):
         return history
 
     def cookies(self):
-        jar = cookiejar_from_dict({})
-
-        if self._cookiejar is not None:
-            for cookie in self._cookiejar:
-                jar.set_cookie(cookie)
-
+        if self._cookiejar is None:
+            jar = CookieStore()
+        else:
+            jar = self._cookiejar.snapshot()
+        if self._request_cookies:
+            jar.update(self._request_cookies)
         return jar
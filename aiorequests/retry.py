@@ -0,0 +1,235 @@
+"""
+Retrying failed requests with backoff, bounded by a retry budget.
+"""
+
+import asyncio
+import io
+import os
+import random
+import time
+
+from email.utils import mktime_tz, parsedate_tz
+
+import aiohttp
+
+from aiohttp.payload import IOBasePayload
+
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT',
+                                'DELETE'])
+
+RETRYABLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+_CHUNK_SIZE = 2 ** 16
+
+
+class RetryBudget(object):
+    """
+    Limit retries to a fraction of the requests, so that retrying cannot
+    multiply the load on a service that is already failing.
+
+    Every request deposits ``ratio`` of a retry and every retry withdraws a
+    whole one; the balance starts at, and never exceeds, ``reserve``, which
+    allows a few retries when there is little traffic.
+
+    :param float ratio: Retries allowed per request.
+    :param int reserve: Retries that may be made regardless of ``ratio``.
+    """
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = max(1, reserve)
+        self.balance = float(self.reserve)
+
+    def deposit(self):
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self):
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+def _retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0, mktime_tz(parsed) - time.time())
+
+
+class RetryPolicy(object):
+    """
+    Which requests to retry and how long to wait between attempts.
+
+    Share one policy between requests (e.g. by passing it to
+    :class:`aiorequests.client.HTTPClient`) to share its budget and
+    counters.
+
+    :param int max_attempts: Attempts per request, including the first one.
+    :param methods: Methods that may be retried.  Default: the idempotent
+        ones.
+    :param statuses: Response statuses that are retried.
+    :param float backoff: Base of the exponential backoff in seconds; the
+        wait before attempt ``n + 1`` is drawn uniformly from
+        ``[0, min(max_backoff, backoff * 2 ** (n - 1))]``.
+    :param float max_backoff: Longest wait between two attempts.
+    :param bool retry_after: Wait as long as the ``Retry-After`` header of a
+        retried response asks to.
+    :param float max_retry_after: Give up instead of waiting longer than
+        this for ``Retry-After``.
+    :param RetryBudget budget: Default: ``RetryBudget()``.
+    :param exceptions: Exceptions that are retried.
+
+    The counters ``attempts``, ``retries`` and ``budget_exhausted`` (retries
+    that were refused by the budget) cover every request of the policy.
+    """
+    def __init__(self, max_attempts=3, methods=IDEMPOTENT_METHODS,
+                 statuses=RETRYABLE_STATUSES, backoff=0.1, max_backoff=10,
+                 retry_after=True, max_retry_after=60, budget=None,
+                 exceptions=(aiohttp.ClientConnectionError,
+                             asyncio.TimeoutError),
+                 random=random.random):
+        self.max_attempts = max_attempts
+        self.methods = frozenset(m.upper() for m in methods)
+        self.statuses = frozenset(statuses)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.budget = budget or RetryBudget()
+        self.exceptions = tuple(exceptions)
+        self._random = random
+
+        self.attempts = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def retries_method(self, method):
+        return method.upper() in self.methods
+
+    def delay(self, attempt, resp=None):
+        """
+        Seconds to wait after the failed ``attempt`` (counting from 1), or
+        ``None`` if the response asks for a longer wait than allowed.
+        """
+        if resp is not None and self.retry_after:
+            wait = _retry_after(resp.headers.get('Retry-After'))
+            if wait is not None:
+                return wait if wait <= self.max_retry_after else None
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return self._random() * cap
+
+    def _withdraw(self):
+        if self.budget.withdraw():
+            self.retries += 1
+            return True
+        self.budget_exhausted += 1
+        return False
+
+    @asyncio.coroutine
+    def call(self, send, loop=None):
+        """
+        Call the coroutine function ``send`` until it returns a response
+        that is not retried, or attempts, patience or budget run out.
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.attempts += 1
+            try:
+                resp = yield from send()
+            except self.exceptions:
+                if attempt >= self.max_attempts or not self._withdraw():
+                    raise
+                delay = self.delay(attempt)
+            else:
+                if (resp.status not in self.statuses or
+                        attempt >= self.max_attempts):
+                    return resp
+                delay = self.delay(attempt, resp)
+                if delay is None or not self._withdraw():
+                    return resp
+                resp.release()
+
+            yield from asyncio.sleep(delay, loop=loop)
+
+
+class _RewindingPayload(IOBasePayload):
+    """
+    Sends a file object from the position it had when the payload was made,
+    every time it is written, and leaves it open in between.
+    """
+    def __init__(self, value, *args, **kwargs):
+        super(_RewindingPayload, self).__init__(value, *args, **kwargs)
+        self._start = value.tell()
+
+    @property
+    def size(self):
+        try:
+            return os.fstat(self._value.fileno()).st_size - self._start
+        except (AttributeError, OSError):
+            if isinstance(self._value, io.BytesIO):
+                return len(self._value.getbuffer()) - self._start
+            return None
+
+    @asyncio.coroutine
+    def write(self, writer):
+        loop = asyncio.get_event_loop()
+        self._value.seek(self._start)
+        while True:
+            chunk = yield from loop.run_in_executor(None, self._value.read,
+                                                    _CHUNK_SIZE)
+            if not chunk:
+                break
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self._encoding or 'utf-8')
+            yield from writer.write(chunk)
+
+    def close(self):
+        self._value.close()
+
+
+def replayable_body(data):
+    """
+    Prepare request ``data`` to be sent more than once.
+
+    File objects, also inside the lists and tuples built for ``files``, are
+    wrapped so every attempt sends them from the start.
+
+    :return: The body to send and the wrapped files, to be closed once the
+        request is done, or ``None`` instead of the files if the body can
+        only be sent once.
+    """
+    payloads = []
+
+    def convert(value):
+        if value is None or isinstance(value, (bytes, bytearray, str, dict,
+                                               int, float)):
+            return value
+        if hasattr(value, 'read'):
+            try:
+                payload = _RewindingPayload(value)
+            except (AttributeError, OSError, ValueError):
+                raise _NotReplayable()
+            payloads.append(payload)
+            return payload
+        if isinstance(value, (list, tuple)):
+            return type(value)(convert(item) for item in value)
+        # Iterators, generators, FormData and other payloads are consumed
+        # by the first attempt.
+        raise _NotReplayable()
+
+    try:
+        return convert(data), payloads
+    except _NotReplayable:
+        return data, None
+
+
+class _NotReplayable(Exception):
+    pass
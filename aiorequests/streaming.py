@@ -0,0 +1,122 @@
+"""
+Sending request bodies as they are produced instead of building them in
+memory first.
+"""
+
+import asyncio
+
+from collections.abc import Iterator
+
+from aiohttp.payload import Payload
+
+
+_CHUNK_SIZE = 2 ** 16
+
+
+class StreamingBody(Payload):
+    """
+    A request body read from ``source`` while it is sent.
+
+    ``source`` may be an async iterator or iterable, an async file-like
+    object (whose ``read`` is a coroutine), or a generator or other
+    iterator.  Chunks are ``bytes``, ``bytearray``, ``memoryview`` or
+    ``str``, which is encoded with ``encoding``.  The next chunk is only
+    asked for once the previous one has been handed to the connection, so
+    a slow peer slows down the source rather than filling up memory.  A
+    generator runs on the event loop and should not block.
+
+    The body is sent with ``Transfer-Encoding: chunked`` unless its size is
+    known, in which case it is sent with a ``Content-Length`` and must be
+    exactly that long.
+
+    Passing such a ``source`` as ``data`` wraps it in a
+    :class:`StreamingBody`, with the size of a ``Content-Length`` header if
+    there is one; make one directly to give the size or content type.
+
+    :param int size: Length of the body in bytes, if known.
+    :param int chunk_size: Bytes read at a time from a file-like ``source``.
+    """
+    def __init__(self, source, size=None, content_type=None,
+                 encoding='utf-8', chunk_size=_CHUNK_SIZE):
+        if stream_kind(source) is None:
+            raise TypeError("cannot stream a body from {0!r}".format(
+                type(source).__name__))
+        super(StreamingBody, self).__init__(
+            source, content_type=content_type or 'application/octet-stream',
+            encoding=encoding)
+        self._size = size
+        self.chunk_size = chunk_size
+        self._started = False
+
+    def _reader(self):
+        """
+        Return a coroutine function returning the next chunk of the body,
+        ``None`` at its end.
+        """
+        source = self._value
+        kind = stream_kind(source)
+        if kind == 'file':
+            @asyncio.coroutine
+            def next_chunk():
+                return (yield from source.read(self.chunk_size)) or None
+        elif kind == 'async':
+            iterator = source.__aiter__()
+
+            @asyncio.coroutine
+            def next_chunk():
+                try:
+                    return (yield from iterator.__anext__())
+                except StopAsyncIteration:
+                    return None
+        else:
+            @asyncio.coroutine
+            def next_chunk():
+                return next(source, None)
+        return next_chunk
+
+    def decode(self, encoding='utf-8', errors='strict'):
+        # Reading the source for this would leave nothing to send.
+        raise TypeError("a streaming body cannot be decoded")
+
+    @asyncio.coroutine
+    def write(self, writer):
+        if self._started:
+            raise RuntimeError("a streaming body can only be sent once")
+        self._started = True
+        next_chunk = self._reader()
+        sent = 0
+        while True:
+            chunk = yield from next_chunk()
+            if chunk is None:
+                break
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self.encoding or 'utf-8')
+            if not chunk:
+                # An empty chunk would end a chunked body.
+                continue
+            sent += len(chunk)
+            if self.size is not None and sent > self.size:
+                raise ValueError("body is longer than its size, {0}".format(
+                    self.size))
+            # Waits while the transport's buffer is full.
+            yield from writer.write(chunk)
+        if self.size is not None and sent != self.size:
+            raise ValueError("body ended after {0} of its {1} bytes".format(
+                sent, self.size))
+
+
+def stream_kind(source):
+    """
+    How to read ``source`` as a :class:`StreamingBody`: ``'file'`` for an
+    async file-like object, ``'async'`` for an async iterable, ``'sync'``
+    for a generator or other iterator, and ``None`` if it is not a stream;
+    plain file objects are left to be sent as files.
+    """
+    read = getattr(source, 'read', None)
+    if read is not None:
+        return 'file' if asyncio.iscoroutinefunction(read) else None
+    if hasattr(source, '__aiter__'):
+        return 'async'
+    if isinstance(source, Iterator):
+        return 'sync'
+    return None
@@ -0,0 +1,165 @@
+import asyncio
+import unittest
+
+import mock
+
+from aiohttp import web
+
+from aiorequests import api
+from aiorequests._utils import (
+    default_pool, get_global_pool, set_global_pool
+)
+from aiorequests.client import HTTPClient
+
+
+class LocalServerTests(unittest.TestCase):
+    """
+    Requests to a server that sets a cookie on ``/set`` and echoes the
+    ``Cookie`` header on ``/echo``.
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+        @asyncio.coroutine
+        def set_cookie(request):
+            response = web.Response(body=b'set')
+            response.set_cookie('sid', 'secret-of-A')
+            return response
+
+        @asyncio.coroutine
+        def echo(request):
+            return web.Response(
+                body=request.headers.get('Cookie', '').encode('ascii'))
+
+        app = web.Application()
+        app.router.add_get('/set', set_cookie)
+        app.router.add_get('/echo', echo)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.addCleanup(self.loop.run_until_complete, runner.cleanup())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = 'http://127.0.0.1:{0}/'.format(self.port)
+
+    def fetch(self, sending):
+        @asyncio.coroutine
+        def fetch():
+            resp = yield from sending
+            return (yield from resp.content())
+        return self.loop.run_until_complete(fetch())
+
+    def test_clients_sharing_a_pool_keep_their_cookies(self):
+        pool = default_pool(self.loop, None, None, limit=10)
+        self.addCleanup(self.loop.run_until_complete, pool.close())
+        a = HTTPClient(pool=pool, loop=self.loop)
+        b = HTTPClient(pool=pool, loop=self.loop)
+        # aiohttp's own jar ignores cookies of IP addresses.
+        url = 'http://localhost:{0}/'.format(self.port)
+
+        self.fetch(a.get(url + 'set'))
+
+        self.assertEqual(self.fetch(b.get(url + 'echo')), b'')
+        self.assertEqual(self.fetch(a.get(url + 'echo')), b'sid=secret-of-A')
+
+    def test_one_shot_pool_is_closed_once_the_body_is_read(self):
+        clients = []
+
+        def client(**kwargs):
+            clients.append(HTTPClient(**kwargs))
+            return clients[-1]
+
+        with mock.patch('aiorequests.api.HTTPClient', client):
+            body = self.fetch(api.get(self.url + 'echo', persistent=False,
+                                      loop=self.loop))
+            self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+        self.assertEqual(body, b'')
+        self.assertTrue(clients[0]._pool.closed)
+
+    def test_one_shot_pool_of_a_batch_is_closed_once_done(self):
+        @asyncio.coroutine
+        def drain(iterator):
+            bodies = []
+            while True:
+                try:
+                    response = yield from iterator.__anext__()
+                except StopAsyncIteration:
+                    return bodies
+                bodies.append((yield from response.content()))
+
+        for batch in (api.map, api.as_completed):
+            clients = []
+
+            def client(**kwargs):
+                clients.append(HTTPClient(**kwargs))
+                return clients[-1]
+
+            with mock.patch('aiorequests.api.HTTPClient', client):
+                bodies = self.loop.run_until_complete(drain(batch(
+                    [('GET', self.url + 'echo')] * 3, persistent=False,
+                    loop=self.loop)))
+                self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+            self.assertEqual(bodies, [b''] * 3)
+            self.assertTrue(clients[0]._pool.closed)
+
+    def test_one_shot_pool_is_closed_on_errors(self):
+        clients = []
+
+        def client(**kwargs):
+            clients.append(HTTPClient(**kwargs))
+            return clients[-1]
+
+        with mock.patch('aiorequests.api.HTTPClient', client):
+            with self.assertRaises(OSError):
+                self.loop.run_until_complete(api.get(
+                    'http://127.0.0.1:1/', persistent=False, loop=self.loop))
+
+        self.assertTrue(clients[0]._pool.closed)
+
+
+
+class GlobalPoolTests(unittest.TestCase):
+    def setUp(self):
+        set_global_pool(None)
+        self.addCleanup(set_global_pool, None)
+
+    @asyncio.coroutine
+    def serve_and_get(self):
+        @asyncio.coroutine
+        def hello(request):
+            return web.Response(body=b'hello')
+
+        app = web.Application()
+        app.router.add_get('/', hello)
+        runner = web.AppRunner(app)
+        yield from runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        yield from site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            response = yield from api.get(
+                'http://127.0.0.1:{0}/'.format(port))
+            return (yield from response.content())
+        finally:
+            yield from runner.cleanup()
+
+    def test_each_loop_gets_a_pool(self):
+        # As with consecutive asyncio.run() calls, which leave the pool open.
+        pools = []
+        for _ in range(2):
+            loop = asyncio.new_event_loop()
+            try:
+                self.assertEqual(loop.run_until_complete(self.serve_and_get()),
+                                 b'hello')
+                pools.append(get_global_pool())
+            finally:
+                loop.close()
+
+        self.assertIsNot(pools[0], pools[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
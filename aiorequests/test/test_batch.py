@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+
+from aiorequests.batch import BatchIterator
+
+
+class FakeClient(object):
+    def __init__(self, loop):
+        self.loop = loop
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.per_host = {}
+        self.max_per_host = {}
+        self.sent = []
+
+    @asyncio.coroutine
+    def request(self, method, url, delay=0, error=None):
+        host = url.split('/')[2]
+        self.sent.append(url)
+        self.in_flight += 1
+        self.per_host[host] = self.per_host.get(host, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_per_host[host] = max(self.max_per_host.get(host, 0),
+                                      self.per_host[host])
+        try:
+            yield from asyncio.sleep(delay, loop=self.loop)
+            if error is not None:
+                raise error
+            return url
+        finally:
+            self.in_flight -= 1
+            self.per_host[host] -= 1
+
+
+@asyncio.coroutine
+def drain(iterator, limit=None):
+    results = []
+    while limit is None or len(results) < limit:
+        try:
+            results.append((yield from iterator.__anext__()))
+        except StopAsyncIteration:
+            break
+    return results
+
+
+class BatchIteratorTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.client = FakeClient(self.loop)
+
+    def run_batch(self, specs, limit=None, **kwargs):
+        batch = BatchIterator(self.client, specs, loop=self.loop, **kwargs)
+        return self.loop.run_until_complete(drain(batch, limit))
+
+    def test_ordered(self):
+        specs = [('GET', 'http://a.example/1', {'delay': 0.03}),
+                 ('GET', 'http://a.example/2', {'delay': 0.01}),
+                 ('GET', 'http://a.example/3')]
+
+        self.assertEqual(self.run_batch(specs, ordered=True),
+                         ['http://a.example/1', 'http://a.example/2',
+                          'http://a.example/3'])
+
+    def test_as_completed(self):
+        specs = [('GET', 'http://a.example/1', {'delay': 0.03}),
+                 ('GET', 'http://a.example/2', {'delay': 0.01}),
+                 ('GET', 'http://a.example/3')]
+
+        self.assertEqual(self.run_batch(specs),
+                         ['http://a.example/3', 'http://a.example/2',
+                          'http://a.example/1'])
+
+    def test_concurrency(self):
+        specs = [('GET', 'http://a.example/%d' % i, {'delay': 0.001})
+                 for i in range(20)]
+
+        results = self.run_batch(specs, concurrency=3)
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(self.client.max_in_flight, 3)
+
+    def test_per_host(self):
+        specs = []
+        for i in range(10):
+            specs.append(('GET', 'http://hot.example/%d' % i,
+                          {'delay': 0.01}))
+        specs.append(('GET', 'http://cold.example/', {'delay': 0.01}))
+
+        results = self.run_batch(specs, concurrency=5, per_host=2)
+
+        self.assertEqual(len(results), 11)
+        self.assertEqual(self.client.max_per_host['hot.example'], 2)
+        # The cold origin does not wait behind the hot one.
+        self.assertLess(self.client.sent.index('http://cold.example/'), 10)
+
+    def test_per_host_ordered(self):
+        specs = [('GET', 'http://a.example/%d' % i, {'delay': 0.001})
+                 for i in range(6)]
+
+        results = self.run_batch(specs, concurrency=4, per_host=1,
+                                 ordered=True)
+
+        self.assertEqual(results, [s[1] for s in specs])
+
+    def test_lazy_consumption(self):
+        pulled = []
+
+        def specs():
+            i = 0
+            while True:
+                pulled.append(i)
+                yield ('GET', 'http://a.example/%d' % i)
+                i += 1
+
+        results = self.run_batch(specs(), limit=5, concurrency=2)
+
+        self.assertEqual(len(results), 5)
+        self.assertLessEqual(len(pulled), 5 + 2 * 2)
+
+    def test_async_specs(self):
+        class Specs(object):
+            def __init__(self):
+                self.urls = ['http://a.example/1', 'http://a.example/2']
+
+            def __aiter__(self):
+                return self
+
+            @asyncio.coroutine
+            def __anext__(self):
+                if not self.urls:
+                    raise StopAsyncIteration
+                return ('GET', self.urls.pop(0))
+
+        self.assertEqual(self.run_batch(Specs(), ordered=True),
+                         ['http://a.example/1', 'http://a.example/2'])
+
+    def test_raises_errors(self):
+        specs = [('GET', 'http://a.example/', {'error': ValueError('boom')})]
+
+        self.assertRaises(ValueError, self.run_batch, specs)
+
+    def test_return_exceptions(self):
+        error = ValueError('boom')
+        specs = [('GET', 'http://a.example/1', {'error': error}),
+                 ('GET', 'http://a.example/2')]
+
+        self.assertEqual(
+            self.run_batch(specs, ordered=True, return_exceptions=True),
+            [error, 'http://a.example/2'])
+
+    def test_cancel(self):
+        specs = [('GET', 'http://a.example/%d' % i, {'delay': 10})
+                 for i in range(4)]
+        batch = BatchIterator(self.client, specs, concurrency=2,
+                              loop=self.loop)
+
+        @asyncio.coroutine
+        def go():
+            first = asyncio.ensure_future(batch.__anext__(), loop=self.loop)
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            batch.cancel()
+            yield from asyncio.sleep(0, loop=self.loop)
+            first.cancel()
+            return (yield from drain(batch))
+
+        self.assertRaises(asyncio.CancelledError,
+                          self.loop.run_until_complete, go())
+        self.assertEqual(len(self.client.sent), 2)
+
+    def test_invalid_concurrency(self):
+        self.assertRaises(ValueError, BatchIterator, self.client, [],
+                          concurrency=0, loop=self.loop)
@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+
+import aiohttp
+import mock
+
+from aiorequests.breaker import (
+    CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+)
+from aiorequests.client import HTTPClient
+from aiorequests.test.util import FakeClock, FakeResponse
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    url = 'http://example.com/path'
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.clock = FakeClock()
+        self.transitions = []
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=10, clock=self.clock,
+            hooks=[lambda *args: self.transitions.append(args)])
+
+    def call(self, outcome, url=None):
+        @asyncio.coroutine
+        def send():
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        return self.loop.run_until_complete(
+            self.breaker.call(send, url or self.url))
+
+    def fail(self):
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self.call(aiohttp.ClientConnectionError())
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail()
+        self.call(FakeResponse(200))
+        self.fail()
+        self.assertEqual(self.breaker.state(self.url), CLOSED)
+
+        self.call(FakeResponse(503))
+
+        self.assertEqual(self.breaker.state(self.url), OPEN)
+        self.assertEqual(self.transitions,
+                         [('http://example.com', CLOSED, OPEN)])
+
+    def test_open_circuit_fails_fast(self):
+        self.fail()
+        self.fail()
+        send = mock.Mock()
+
+        with self.assertRaises(CircuitOpenError) as cm:
+            self.loop.run_until_complete(self.breaker.call(send, self.url))
+
+        self.assertEqual(cm.exception.origin, 'http://example.com')
+        self.assertFalse(send.called)
+
+    def test_origins_are_independent(self):
+        self.fail()
+        self.fail()
+
+        self.assertEqual(self.call(FakeResponse(), 'https://example.com/')
+                         .status, 200)
+        self.assertEqual(self.breaker.states(),
+                         {'http://example.com': OPEN,
+                          'https://example.com': CLOSED})
+
+    def test_half_open_probe_closes(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state(self.url), HALF_OPEN)
+
+        self.call(FakeResponse())
+
+        self.assertEqual(self.breaker.state(self.url), CLOSED)
+        self.assertEqual([t[1:] for t in self.transitions],
+                         [(CLOSED, OPEN), (OPEN, HALF_OPEN),
+                          (HALF_OPEN, CLOSED)])
+
+    def test_half_open_probe_failure_reopens(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+
+        self.fail()
+
+        self.assertEqual(self.breaker.state(self.url), OPEN)
+        self.clock.now = 19
+        self.assertEqual(self.breaker.state(self.url), OPEN)
+
+    def test_half_open_limits_probes(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+
+        self.breaker.acquire(self.url)
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.acquire(self.url)
+
+    def test_cancelled_probe_frees_its_slot(self):
+        self.fail()
+        self.fail()
+        self.clock.now = 10
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.call(asyncio.CancelledError())
+
+        self.assertEqual(self.breaker.state(self.url), HALF_OPEN)
+        self.call(FakeResponse())
+        self.assertEqual(self.breaker.state(self.url), CLOSED)
+
+    def test_other_errors_are_not_failures(self):
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.call(ValueError())
+
+        self.assertEqual(self.breaker.state(self.url), CLOSED)
+
+
+class BreakingClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            yield from asyncio.sleep(1, loop=self.loop)
+
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(
+            pool=self.pool, loop=self.loop,
+            breaker=CircuitBreaker(failure_threshold=1))
+
+    def test_timeouts_open_the_circuit(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(
+                self.client.get('http://example.com/', timeout=0.01))
+        with self.assertRaises(CircuitOpenError):
+            self.loop.run_until_complete(
+                self.client.get('http://example.com/', timeout=0.01))
+
+        self.assertEqual(self.pool.request.call_count, 1)
+        self.assertEqual(self.client.circuit_states(),
+                         {'http://example.com': OPEN})
+
+    def test_no_breaker(self):
+        self.assertEqual(HTTPClient(pool=self.pool).circuit_states(), {})
@@ -0,0 +1,56 @@
+import unittest
+
+from aiorequests.buffers import BufferPool, PooledBody
+
+
+class BufferPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = BufferPool(min_size=16, max_size=64, max_bytes=96)
+
+    def test_sizes_are_powers_of_two(self):
+        self.assertEqual(len(self.pool.acquire(0)), 16)
+        self.assertEqual(len(self.pool.acquire(16)), 16)
+        self.assertEqual(len(self.pool.acquire(17)), 32)
+        self.assertEqual(len(self.pool.acquire(100)), 128)
+
+    def test_reuses_released_buffers(self):
+        buffer = self.pool.acquire(20)
+        self.pool.release(buffer)
+
+        self.assertIs(self.pool.acquire(30), buffer)
+        self.assertEqual((self.pool.allocated, self.pool.reused), (1, 1))
+        self.assertEqual(self.pool.idle_bytes, 0)
+
+    def test_keeps_at_most_max_bytes(self):
+        buffers = [self.pool.acquire(64) for _ in range(2)]
+        buffers.append(self.pool.acquire(32))
+        for buffer in buffers:
+            self.pool.release(buffer)
+
+        self.assertEqual(self.pool.idle_bytes, 96)
+
+    def test_does_not_keep_large_or_foreign_buffers(self):
+        self.pool.release(self.pool.acquire(100))
+        self.pool.release(bytearray(20))
+
+        self.assertEqual(self.pool.idle_bytes, 0)
+
+
+class PooledBodyTests(unittest.TestCase):
+    def test_view_and_release(self):
+        pool = BufferPool(min_size=16)
+        buffer = pool.acquire(5)
+        buffer[:5] = b'hello'
+
+        with PooledBody(pool, buffer, 5) as body:
+            self.assertEqual(len(body), 5)
+            self.assertEqual(bytes(body), b'hello')
+            self.assertEqual(body.view[1:3].tobytes(), b'el')
+
+        self.assertIs(pool.acquire(5), buffer)
+        body.release()
+        self.assertEqual(pool.idle_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
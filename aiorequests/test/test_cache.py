@@ -0,0 +1,580 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from email.utils import formatdate
+from http.cookies import SimpleCookie
+
+from multidict import CIMultiDict
+
+from aiorequests.cache import (
+    CacheEntry, DiskCache, MemoryCache, TieredCache, parse_cache_control,
+    HIT, MISS, REVALIDATED
+)
+from aiorequests.client import HTTPClient
+from aiorequests.test.util import FakeClock, FakeResponse
+
+
+NOW = 1000000000.0
+
+
+class ParseCacheControlTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_cache_control('public, Max-Age=60, no-cache="Set-Cookie"'),
+            {'public': None, 'max-age': '60', 'no-cache': 'Set-Cookie'})
+
+    def test_empty(self):
+        self.assertEqual(parse_cache_control(None), {})
+
+
+class CacheEntryTests(unittest.TestCase):
+    def entry(self, headers, status=200):
+        return CacheEntry('http://example.com/',
+                          FakeResponse(status, headers), b'', (), NOW)
+
+    def test_max_age(self):
+        entry = self.entry({'Cache-Control': 'max-age=60',
+                            'Expires': formatdate(NOW + 3600)})
+        self.assertEqual(entry.freshness_lifetime(), 60)
+        self.assertTrue(entry.is_fresh(NOW + 59))
+        self.assertFalse(entry.is_fresh(NOW + 60))
+
+    def test_expires(self):
+        entry = self.entry({'Date': formatdate(NOW),
+                            'Expires': formatdate(NOW + 30)})
+        self.assertEqual(entry.freshness_lifetime(), 30)
+
+    def test_invalid_expires(self):
+        entry = self.entry({'Expires': '0'})
+        self.assertEqual(entry.freshness_lifetime(), 0)
+
+    def test_heuristic(self):
+        entry = self.entry({'Date': formatdate(NOW),
+                            'Last-Modified': formatdate(NOW - 1000)})
+        self.assertEqual(entry.freshness_lifetime(), 100)
+
+    def test_age_header(self):
+        entry = self.entry({'Cache-Control': 'max-age=60', 'Age': '50'})
+        self.assertFalse(entry.is_fresh(NOW + 11))
+
+    def test_no_cache(self):
+        entry = self.entry({'Cache-Control': 'max-age=60, no-cache'})
+        self.assertFalse(entry.is_fresh(NOW))
+
+    def test_request_directives(self):
+        entry = self.entry({'Cache-Control': 'max-age=60'})
+        self.assertFalse(entry.is_fresh(NOW + 10, {'max-age': '5'}))
+        self.assertFalse(entry.is_fresh(NOW, {'no-cache': None}))
+
+    def test_conditional_headers(self):
+        entry = self.entry({'ETag': '"v1"', 'Last-Modified': 'yesterday'})
+        self.assertEqual(entry.conditional_headers(),
+                         [('If-None-Match', '"v1"'),
+                          ('If-Modified-Since', 'yesterday')])
+
+    def test_freshen(self):
+        entry = self.entry({'Cache-Control': 'max-age=10', 'ETag': '"v1"',
+                            'Content-Length': '4'})
+        entry.freshen(CIMultiDict({'Cache-Control': 'max-age=60',
+                                   'Content-Length': '0'}), NOW + 100)
+
+        self.assertEqual(entry.headers['Cache-Control'], 'max-age=60')
+        self.assertEqual(entry.headers['Content-Length'], '4')
+        self.assertEqual(entry.headers['ETag'], '"v1"')
+        self.assertTrue(entry.is_fresh(NOW + 150))
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(NOW)
+
+    def test_storable(self):
+        cache = MemoryCache(clock=self.clock)
+        self.assertTrue(cache.storable(
+            'GET', {}, FakeResponse(headers={'Cache-Control': 'max-age=1'})))
+        self.assertFalse(cache.storable(
+            'POST', {}, FakeResponse(headers={'Cache-Control': 'max-age=1'})))
+        self.assertFalse(cache.storable(
+            'GET', {}, FakeResponse(headers={'Cache-Control': 'no-store'})))
+        self.assertFalse(cache.storable(
+            'GET', {'Cache-Control': 'no-store'},
+            FakeResponse(headers={'Cache-Control': 'max-age=1'})))
+        self.assertFalse(cache.storable(
+            'GET', {}, FakeResponse(headers={'Cache-Control': 'max-age=1',
+                                             'Vary': '*'})))
+        self.assertFalse(cache.storable('GET', {}, FakeResponse()))
+        self.assertTrue(cache.storable(
+            'GET', {}, FakeResponse(headers={'Cache-Control': 'no-cache',
+                                             'ETag': '"a"'})))
+
+    def test_vary(self):
+        cache = MemoryCache(clock=self.clock)
+        headers = {'Cache-Control': 'max-age=60', 'Vary': 'Accept'}
+        cache.store('http://example.com/', {'Accept': 'text/plain'},
+                    FakeResponse(headers=headers, body=b'text'), b'text')
+        cache.store('http://example.com/', [('accept', 'application/json')],
+                    FakeResponse(headers=headers, body=b'{}'), b'{}')
+
+        self.assertEqual(
+            cache.lookup('http://example.com/',
+                         {'Accept': 'text/plain'}).body, b'text')
+        self.assertEqual(
+            cache.lookup('http://example.com/',
+                         {'Accept': 'application/json'}).body, b'{}')
+        self.assertIsNone(cache.lookup('http://example.com/', {}))
+
+    def test_lru_by_bytes(self):
+        cache = MemoryCache(max_bytes=300, clock=self.clock)
+        response = FakeResponse(headers={'Cache-Control': 'max-age=60'})
+
+        for path in ('a', 'b', 'c'):
+            cache.store('http://example.com/' + path, {}, response,
+                        b'x' * 100)
+        self.assertIsNone(cache.lookup('http://example.com/a', {}))
+        self.assertLessEqual(cache.size, 300)
+
+        cache.lookup('http://example.com/b', {})
+        cache.store('http://example.com/d', {}, response, b'x' * 100)
+
+        self.assertIsNotNone(cache.lookup('http://example.com/b', {}))
+        self.assertIsNone(cache.lookup('http://example.com/c', {}))
+
+    def test_max_entry_bytes(self):
+        cache = MemoryCache(max_entry_bytes=10, clock=self.clock)
+        response = FakeResponse(headers={'Cache-Control': 'max-age=60'})
+
+        self.assertIsNone(cache.store('http://example.com/', {}, response,
+                                      b'x' * 100))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = MemoryCache(clock=self.clock)
+        response = FakeResponse(headers={'Cache-Control': 'max-age=60'})
+        cache.store('http://example.com/', {}, response, b'x')
+
+        cache.invalidate('http://example.com/')
+
+        self.assertIsNone(cache.lookup('http://example.com/', {}))
+        self.assertEqual(cache.size, 0)
+
+
+class CachingClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.clock = FakeClock(NOW)
+        self.cache = MemoryCache(clock=self.clock)
+        self.responses = []
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return self.responses.pop(0)
+
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(pool=self.pool, cache=self.cache,
+                                 loop=self.loop)
+
+    def get(self, url='http://example.com/', **kwargs):
+        @asyncio.coroutine
+        def go():
+            response = yield from self.client.get(url, **kwargs)
+            body = yield from response.original.read()
+            return response, body
+        return self.loop.run_until_complete(go())
+
+    def test_hit(self):
+        self.responses.append(
+            FakeResponse(headers={'Cache-Control': 'max-age=60'}))
+
+        first, body1 = self.get()
+        second, body2 = self.get()
+
+        self.assertEqual(first.cache_status, MISS)
+        self.assertEqual(second.cache_status, HIT)
+        self.assertEqual(body1, body2)
+        self.assertEqual(self.pool.request.call_count, 1)
+
+    def test_hit_text_and_json(self):
+        self.responses.append(FakeResponse(
+            headers={'Cache-Control': 'max-age=60',
+                     'Content-Type': 'application/json; charset=latin-1'},
+            body='{"name": "\xe9"}'.encode('latin-1')))
+        self.get()
+
+        response, _ = self.get()
+
+        self.assertEqual(response.cache_status, HIT)
+        self.assertEqual(response.encoding, 'latin-1')
+        self.assertEqual(self.loop.run_until_complete(response.text()),
+                         '{"name": "\xe9"}')
+        self.assertEqual(self.loop.run_until_complete(response.json()),
+                         {'name': '\xe9'})
+
+    def test_vary_authorization(self):
+        for body in (b'alice', b'bob'):
+            self.responses.append(FakeResponse(
+                headers={'Cache-Control': 'max-age=60',
+                         'Vary': 'Authorization'}, body=body))
+        self.get(auth=('alice', 'a'))
+
+        response, body = self.get(auth=('bob', 'b'))
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(body, b'bob')
+        self.assertEqual(self.get(auth=('alice', 'a'))[1], b'alice')
+
+    def test_vary_cookie(self):
+        for body in (b'alice', b'bob'):
+            self.responses.append(FakeResponse(
+                headers={'Cache-Control': 'max-age=60', 'Vary': 'Cookie'},
+                body=body))
+        self.get(cookies={'sid': 'alice'})
+
+        response, body = self.get(cookies={'sid': 'bob'})
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(body, b'bob')
+        self.assertEqual(self.get(cookies={'sid': 'alice'})[1], b'alice')
+
+    def test_uncacheable(self):
+        self.responses.append(FakeResponse())
+        self.responses.append(FakeResponse())
+
+        self.get()
+        response, _ = self.get()
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(self.pool.request.call_count, 2)
+
+    def test_revalidate(self):
+        self.responses.append(FakeResponse(
+            headers={'Cache-Control': 'max-age=10', 'ETag': '"v1"'}))
+        self.responses.append(FakeResponse(
+            304, headers={'Cache-Control': 'max-age=60'}, body=b''))
+        self.get()
+
+        self.clock.now += 20
+        response, body = self.get()
+
+        self.assertEqual(response.cache_status, REVALIDATED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'body')
+        headers = self.pool.request.call_args[1]['headers']
+        self.assertIn(('If-None-Match', '"v1"'), headers)
+
+        self.clock.now += 30
+        self.assertEqual(self.get()[0].cache_status, HIT)
+
+    def test_stale_replaced(self):
+        self.responses.append(FakeResponse(
+            headers={'Cache-Control': 'max-age=10', 'ETag': '"v1"'}))
+        self.responses.append(FakeResponse(
+            headers={'Cache-Control': 'max-age=10', 'ETag': '"v2"'},
+            body=b'new'))
+        self.get()
+
+        self.clock.now += 20
+        response, body = self.get()
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(body, b'new')
+        self.assertEqual(self.get()[1], b'new')
+
+    def test_unsafe_method_invalidates(self):
+        self.responses.append(
+            FakeResponse(headers={'Cache-Control': 'max-age=60'}))
+        self.responses.append(FakeResponse())
+        self.get()
+
+        self.loop.run_until_complete(
+            self.client.post('http://example.com/', data=b'x'))
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_cache_disabled_per_request(self):
+        self.responses.append(
+            FakeResponse(headers={'Cache-Control': 'max-age=60'}))
+        self.responses.append(FakeResponse())
+        self.get()
+
+        response, _ = self.get(cache=False)
+
+        self.assertIsNone(response.cache_status)
+        self.assertEqual(self.pool.request.call_count, 2)
+
+
+class ChunkedStream(object):
+    def __init__(self, body):
+        self.body = body
+        self.offset = 0
+
+    @asyncio.coroutine
+    def readany(self):
+        yield from asyncio.sleep(0)
+        chunk = self.body[self.offset:self.offset + 1000]
+        self.offset += len(chunk)
+        return chunk
+
+
+@asyncio.coroutine
+def drain(iterator):
+    items = []
+    while True:
+        try:
+            items.append((yield from iterator.__anext__()))
+        except StopAsyncIteration:
+            return items
+
+
+class SpoolingClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.clock = FakeClock(NOW)
+        self.responses = []
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return self.responses.pop(0)
+
+        self.pool.request.side_effect = request
+
+    def client(self, cache):
+        return HTTPClient(pool=self.pool, cache=cache, loop=self.loop)
+
+    def respond(self, body):
+        response = FakeResponse(headers={'Cache-Control': 'max-age=60'},
+                                content=ChunkedStream(body),
+                                cookies=SimpleCookie('sid=x'))
+        self.responses.append(response)
+        return response
+
+    def get(self, client):
+        return self.loop.run_until_complete(
+            client.get('http://example.com/'))
+
+    def test_miss_is_spooled_to_disk(self):
+        upstream = self.respond(b'x' * 5000)
+        cache = DiskCache(self.path, clock=self.clock)
+
+        client = self.client(cache)
+
+        response = self.get(client)
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(upstream.read_count, 0)
+        self.assertTrue(upstream.released)
+        self.assertEqual(response.cookies().get('sid'), 'x')
+        self.assertEqual(self.loop.run_until_complete(response.content()),
+                         b'x' * 5000)
+        self.assertEqual(sorted(os.path.splitext(name)[1]
+                                for name in os.listdir(self.path)),
+                         ['.body', '.meta'])
+
+    def test_hit_is_streamed_from_disk(self):
+        self.respond(b'0123456789' * 500)
+        client = self.client(DiskCache(self.path, clock=self.clock))
+        self.get(client)
+
+        response = self.get(client)
+        with mock.patch('aiorequests.cache._DiskBody.read') as read:
+            chunks = self.loop.run_until_complete(
+                drain(response.iter_content(2000)))
+
+        self.assertEqual(response.cache_status, HIT)
+        self.assertEqual([len(chunk) for chunk in chunks], [2000, 2000, 1000])
+        self.assertEqual(b''.join(chunks), b'0123456789' * 500)
+        self.assertFalse(read.called)
+
+    def test_too_large_is_served_but_not_kept(self):
+        self.respond(b'x' * 5000)
+        cache = DiskCache(self.path, max_entry_bytes=1000, clock=self.clock)
+
+        response = self.get(self.client(cache))
+
+        self.assertEqual(response.cache_status, MISS)
+        self.assertEqual(self.loop.run_until_complete(response.content()),
+                         b'x' * 5000)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_tiered(self):
+        self.respond(b'small')
+        cache = TieredCache(MemoryCache(clock=self.clock),
+                            DiskCache(self.path, clock=self.clock))
+
+        self.get(self.client(cache))
+
+        self.assertEqual(
+            cache.memory.lookup('http://example.com/', {}).body, b'small')
+        self.assertEqual(len(cache.disk), 1)
+
+
+class DiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.clock = FakeClock(NOW)
+
+    def cache(self, **kwargs):
+        return DiskCache(self.path, clock=self.clock, **kwargs)
+
+    def store(self, cache, path='', body=b'body', headers=None):
+        headers = headers or {'Cache-Control': 'max-age=60'}
+        return cache.store('http://example.com/' + path, {},
+                           FakeResponse(headers=headers, body=body), body)
+
+    def test_body_is_read_when_served(self):
+        cache = self.cache()
+        self.store(cache, body=b'x' * 4096)
+
+        entry = cache.lookup('http://example.com/', {})
+
+        self.assertNotIsInstance(entry.body, bytes)
+        self.assertEqual(len(entry.body), 4096)
+        response = entry.response()
+        self.assertEqual(
+            asyncio.get_event_loop().run_until_complete(response.read()),
+            b'x' * 4096)
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'needs /proc')
+    def test_entries_hold_no_files_open(self):
+        opened = len(os.listdir('/proc/self/fd'))
+        cache = self.cache()
+        for n in range(50):
+            self.store(cache, str(n))
+        cache = self.cache()
+
+        self.assertEqual(len(cache), 50)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), opened)
+
+    def test_survives_restart(self):
+        self.store(self.cache(), body=b'persisted',
+                   headers={'Cache-Control': 'max-age=60', 'Vary': 'Accept',
+                            'ETag': '"v1"'})
+
+        cache = self.cache()
+        entry = cache.lookup('http://example.com/', {})
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(bytes(entry.body), b'persisted')
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual(entry.vary, ('accept',))
+        self.assertTrue(entry.is_fresh(NOW + 59))
+        self.assertFalse(entry.is_fresh(NOW + 60))
+
+    def test_freshen_is_persisted(self):
+        cache = self.cache()
+        entry = self.store(cache, headers={'Cache-Control': 'max-age=10'})
+        self.clock.now += 100
+        cache.freshen(entry, CIMultiDict({'Cache-Control': 'max-age=60'}))
+
+        entry = self.cache().lookup('http://example.com/', {})
+
+        self.assertTrue(entry.is_fresh(NOW + 150))
+
+    def test_empty_body(self):
+        self.store(self.cache(), body=b'')
+
+        entry = self.cache().lookup('http://example.com/', {})
+
+        self.assertEqual(bytes(entry.body), b'')
+
+    def test_evicts_by_disk_budget(self):
+        cache = self.cache(max_bytes=300)
+        for path in ('a', 'b', 'c'):
+            self.store(cache, path, body=b'x' * 100)
+
+        self.assertIsNone(cache.lookup('http://example.com/a', {}))
+        self.assertEqual(len(os.listdir(self.path)), 4)
+
+    def test_eviction_order_survives_restart(self):
+        cache = self.cache(max_bytes=300)
+        self.store(cache, 'a', body=b'x' * 100)
+        self.store(cache, 'b', body=b'x' * 100)
+        cache.lookup('http://example.com/a', {})
+        os.utime(cache._file(cache.lookup('http://example.com/b', {}).key,
+                             '.meta'), (0, 0))
+
+        cache = self.cache(max_bytes=300)
+        self.store(cache, 'c', body=b'x' * 100)
+
+        self.assertIsNone(cache.lookup('http://example.com/b', {}))
+        self.assertIsNotNone(cache.lookup('http://example.com/a', {}))
+
+    def test_invalidate_deletes_files(self):
+        cache = self.cache()
+        self.store(cache)
+
+        cache.invalidate('http://example.com/')
+
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_drops_incomplete_entries(self):
+        self.store(self.cache())
+        for name in os.listdir(self.path):
+            if name.endswith('.meta'):
+                os.unlink(os.path.join(self.path, name))
+        with open(os.path.join(self.path, 'partial.tmp'), 'wb') as f:
+            f.write(b'x')
+        with open(os.path.join(self.path, 'broken.meta'), 'w') as f:
+            f.write('{')
+
+        cache = self.cache()
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(os.listdir(self.path), [])
+
+
+class TieredCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.clock = FakeClock(NOW)
+
+    def cache(self):
+        return TieredCache(MemoryCache(max_entry_bytes=1000, clock=self.clock),
+                           DiskCache(self.path, clock=self.clock))
+
+    def test_small_responses_in_both_tiers(self):
+        cache = self.cache()
+        cache.store('http://example.com/', {},
+                    FakeResponse(headers={'Cache-Control': 'max-age=60'}),
+                    b'small')
+
+        self.assertEqual(len(cache.memory), 1)
+        self.assertEqual(len(cache.disk), 1)
+
+    def test_large_responses_on_disk_only(self):
+        cache = self.cache()
+        cache.store('http://example.com/', {},
+                    FakeResponse(headers={'Cache-Control': 'max-age=60'}),
+                    b'x' * 2000)
+
+        self.assertEqual(len(cache.memory), 0)
+        self.assertEqual(
+            bytes(cache.lookup('http://example.com/', {}).body), b'x' * 2000)
+
+    def test_promotes_disk_hits(self):
+        self.cache().store(
+            'http://example.com/', {},
+            FakeResponse(headers={'Cache-Control': 'max-age=60'}), b'small')
+        self.clock.now += 30
+
+        cache = self.cache()
+        response = cache.lookup('http://example.com/', {}).response()
+        self.assertEqual(len(cache.memory), 0)
+        asyncio.get_event_loop().run_until_complete(response.read())
+
+        entry = cache.memory.lookup('http://example.com/', {})
+        self.assertEqual(entry.body, b'small')
+        self.assertEqual(entry.response_time, NOW)
@@ -9,11 +9,12 @@ import mock
 
 import aiohttp
 
-from aiorequests.test.util import with_clock
+from aiorequests.test.util import FakeResponse, with_clock
 
-from aiorequests.client import (
-    HTTPClient, _BodyBufferingProtocol, _BufferedResponse
-)
+from aiorequests._utils import set_global_pool
+
+from aiorequests.client import HTTPClient, PreparedRequest, _BufferedResponse
+from aiorequests.response import _Response
 
 
 def async_test(f):
@@ -28,12 +29,10 @@ class HTTPClientTests(unittest.TestCase):
     def setUp(self):
         f = asyncio.Future()
         f.set_result(mock.MagicMock())
-        aiohttp.request = mock.MagicMock()
-        aiohttp.request.return_value = f
-        asyncio.coroutines.iscoroutine = mock.MagicMock()
-        asyncio.coroutines.iscoroutine.return_value = True
+        self.pool = mock.Mock()
+        self.pool.request.return_value = f
 
-        self.client = HTTPClient()
+        self.client = HTTPClient(pool=self.pool)
 
     def mktemp(self):
         """Returns a unique name that may be used as either a temporary
@@ -59,7 +58,7 @@ class HTTPClientTests(unittest.TestCase):
     def test_request_with_auth(self):
         yield from self.client.request('GET', 'http://example.com/',
                                               auth=('a', 'b'))
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/',
             headers={'accept-encoding': 'gzip'},
             auth=aiohttp.helpers.BasicAuth('a', 'b')
@@ -68,7 +67,7 @@ class HTTPClientTests(unittest.TestCase):
     @async_test
     def test_request_case_insensitive_methods(self):
         yield from self.client.request('gEt', 'http://example.com/')
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/',
             headers={'accept-encoding': 'gzip'})
 
@@ -77,7 +76,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('GET', 'http://example.com/',
                             params={'foo': 'bar'})
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/?foo=bar',
             headers={'accept-encoding': 'gzip'})
 
@@ -86,7 +85,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('GET', 'http://example.com/?baz=bax',
                                        params={'foo': ['bar', 'baz']})
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/?baz=bax&foo%5B%5D=bar&foo%5B%5D=baz',
             headers={'accept-encoding': 'gzip'})
 
@@ -96,7 +95,7 @@ class HTTPClientTests(unittest.TestCase):
                                        'http://example.com/?baz=bax',
                                        params=[('foo', 'bar')])
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/?baz=bax&foo=bar',
             headers={'accept-encoding': 'gzip'})
 
@@ -105,7 +104,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('GET', 'http://example.com/',
                                        params={'foo': 'bar'})
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/?foo=bar',
             headers={'accept-encoding': 'gzip'})
 
@@ -114,7 +113,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('POST', 'http://example.com/',
                             data={'foo': ['bar', 'baz']})
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={'Content-Type': ['application/x-www-form-urlencoded'],
                      'accept-encoding': 'gzip'}, data='foo=bar&foo=baz')
@@ -124,7 +123,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('POST', 'http://example.com/',
                             data={'foo': 'bar'})
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={'Content-Type': 'application/x-www-form-urlencoded',
                      'accept-encoding': 'gzip'},
@@ -135,7 +134,7 @@ class HTTPClientTests(unittest.TestCase):
         yield from self.client.request('POST', 'http://example.com/',
                                        data=[('foo', 'bar')])
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={'Content-Type': 'application/x-www-form-urlencoded',
                      'accept-encoding': 'gzip'},
@@ -150,7 +149,7 @@ class HTTPClientTests(unittest.TestCase):
         file = open(temp_fn)
         yield from self.client.request('POST', 'http://example.com/', data=file)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={'accept-encoding': 'gzip'},
             data=file)
@@ -163,7 +162,7 @@ class HTTPClientTests(unittest.TestCase):
         self.client.request(
             'POST', 'http://example.com/', files=file)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={
                 'accept-encoding': ['gzip'],
@@ -178,7 +177,7 @@ class HTTPClientTests(unittest.TestCase):
         self.client.request(
             'POST', 'http://example.com/', files=data)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={
                 'accept-encoding': ['gzip'],
@@ -193,7 +192,7 @@ class HTTPClientTests(unittest.TestCase):
         self.client.request(
             'POST', 'http://example.com/', files=data)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={
                 'accept-encoding': ['gzip'],
@@ -220,7 +219,7 @@ class HTTPClientTests(unittest.TestCase):
             data=[("a", "b"), ("key", "val")],
             files=files)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={
                 'accept-encoding': ['gzip'],
@@ -239,7 +238,7 @@ class HTTPClientTests(unittest.TestCase):
             data=parameters,
             files=files)
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'POST', 'http://example.com/',
             headers={
                 'accept-encoding': ['gzip'],
@@ -261,7 +260,7 @@ class HTTPClientTests(unittest.TestCase):
             'Accept': ['application/json', 'text/plain']
         })
 
-        aiohttp.request.assert_called_once_with(
+        self.pool.request.assert_called_once_with(
             'GET', 'http://example.com/',
             headers={'User-Agent': ['treq/0.1dev'],
                      'accept-encoding': ['gzip'],
@@ -274,7 +273,7 @@ class HTTPClientTests(unittest.TestCase):
         Verify the request is cancelled if a response is not received
         within specified timeout period.
         """
-        aiohttp.request.return_value = f = mock.MagicMock()
+        self.pool.request.return_value = f = mock.MagicMock()
         self.client.request('GET', 'http://example.com', timeout=2)
 
         # simulate we haven't gotten a response within timeout seconds
@@ -290,7 +289,7 @@ class HTTPClientTests(unittest.TestCase):
         Verify timeout is cancelled if a response is received before
         timeout period elapses.
         """
-        aiohttp.request.return_value = f = mock.MagicMock()
+        self.pool.request.return_value = f = mock.MagicMock()
         self.client.request('GET', 'http://example.com', timeout=2)
 
         # simulate a response
@@ -301,12 +300,62 @@ class HTTPClientTests(unittest.TestCase):
 
         self.assertFalse(f.called)
 
+    def test_default_pool_is_shared(self):
+        self.pool.closed = False
+        self.pool._loop = asyncio.get_event_loop()
+        set_global_pool(self.pool)
+        self.addCleanup(set_global_pool, None)
+
+        self.assertIs(HTTPClient()._pool, self.pool)
+        self.assertIs(HTTPClient()._pool, self.pool)
+
+    @async_test
+    def test_close_leaves_given_pool_open(self):
+        yield from self.client.close()
+        self.assertFalse(self.pool.close.called)
+
+    def test_pool_options_create_a_private_pool(self):
+        with mock.patch('aiorequests.client.default_pool') as default_pool:
+            client = HTTPClient(limit=10, limit_per_host=2, max_lifetime=300)
+
+        default_pool.assert_called_once_with(
+            client._loop, None, None, limit=10, limit_per_host=2,
+            max_lifetime=300)
+        self.assertTrue(client._owns_pool)
+
+    def test_pool_stats(self):
+        self.pool.connector.stats.return_value = {'example.com:80': 'stats'}
+        self.assertEqual(self.client.pool_stats(),
+                         {'example.com:80': 'stats'})
+
+    @async_test
+    def test_warm(self):
+        calls = []
+        results = {'http://a.example': (2, 0), 'https://b.example': (1, 1)}
+
+        @asyncio.coroutine
+        def open_connections(connector, origin, count, **kwargs):
+            calls.append((connector, origin, count, kwargs))
+            return results[origin]
+
+        with mock.patch('aiorequests.client.open_connections',
+                        open_connections):
+            result = yield from self.client.warm(
+                ['http://a.example', 'https://b.example'], per_host=2)
+
+        self.assertEqual(result.opened, 3)
+        self.assertEqual(result.failed, 1)
+        self.assertGreaterEqual(result.elapsed, 0)
+        self.assertIn((self.pool.connector, 'https://b.example', 2,
+                       {'verify': True, 'timeout': None,
+                        'loop': self.client._loop}), calls)
+
     @unittest.skip('Buffering not yet understood')
     def test_response_is_buffered(self):
         response = mock.Mock(deliverBody=mock.Mock(),
                              headers={})
 
-        aiohttp.request.return_value = response
+        self.pool.request.return_value = response
 
         d = self.client.get('http://www.example.com')
 
@@ -323,7 +372,7 @@ class HTTPClientTests(unittest.TestCase):
     def test_response_buffering_is_disabled_with_unbufferred_arg(self):
         response = mock.Mock(headers={})
 
-        aiohttp.request.return_value = response
+        self.pool.request.return_value = response
 
         d = self.client.get('http://www.example.com', unbuffered=True)
 
@@ -331,126 +380,178 @@ class HTTPClientTests(unittest.TestCase):
         self.assertEqual(self.successResultOf(d).original, response)
 
 
-class BodyBufferingProtocolTests(unittest.TestCase):
-    def test_buffers_data(self):
-        buffer = []
-        protocol = _BodyBufferingProtocol(
-            mock.Mock(Protocol),
-            buffer,
-            None
-        )
+class BufferedResponseTests(unittest.TestCase):
+    @async_test
+    def test_reads_once(self):
+        original = FakeResponse(body=b'{"a": 1}')
+        br = _BufferedResponse(original)
 
-        protocol.dataReceived("foo")
-        self.assertEqual(buffer, ["foo"])
+        bodies = yield from asyncio.gather(br.read(), br.read())
 
-        protocol.dataReceived("bar")
-        self.assertEqual(buffer, ["foo", "bar"])
+        self.assertEqual(bodies, [b'{"a": 1}', b'{"a": 1}'])
+        self.assertEqual(original.read_count, 1)
+        self.assertTrue(original.released)
 
-    def test_propagates_data_to_destination(self):
-        destination = mock.Mock(Protocol)
-        protocol = _BodyBufferingProtocol(
-            destination,
-            [],
-            None
-        )
+    @async_test
+    def test_views_read_independently(self):
+        original = FakeResponse(body=b'{"a": 1}')
+        br = _BufferedResponse(original)
+        first, second = br.view(), br.view()
+
+        self.assertEqual((yield from first.read()), b'{"a": 1}')
+        self.assertEqual((yield from second.text()), '{"a": 1}')
+        self.assertEqual((yield from second.json()), {'a': 1})
+        self.assertEqual((yield from first.read()), b'{"a": 1}')
+        self.assertEqual(original.read_count, 1)
 
-        protocol.dataReceived("foo")
-        destination.dataReceived.assert_called_once_with("foo")
+    @async_test
+    def test_view_streams_from_the_buffer(self):
+        original = FakeResponse(body=b'{"a": 1}')
+        original.content = mock.Mock()
+        response = _Response(_BufferedResponse(original).view(), None)
 
-        protocol.dataReceived("bar")
-        destination.dataReceived.assert_called_with("bar")
+        chunk = yield from response.iter_content(3).__anext__()
 
-    def test_fires_finished_deferred(self):
-        finished = Deferred()
-        protocol = _BodyBufferingProtocol(
-            mock.Mock(Protocol),
-            [],
-            finished
-        )
+        self.assertEqual(chunk, b'{"a')
+        self.assertEqual(original.read_count, 1)
 
-        class TestResponseDone(object):
-            pass
+    def test_view_delegates_attributes(self):
+        original = FakeResponse(body=b'{"a": 1}')
+        view = _BufferedResponse(original).view()
 
-        protocol.connectionLost(TestResponseDone())
+        self.assertEqual(view.status, 200)
 
-        self.failureResultOf(finished, TestResponseDone)
+        view.release()
+        self.assertFalse(original.released)
 
-    def test_propogates_connectionLost_reason(self):
-        destination = mock.Mock(Protocol)
-        protocol = _BodyBufferingProtocol(
-            destination,
-            [],
-            Deferred().addErrback(lambda ign: None)
-        )
 
-        class TestResponseDone(object):
-            pass
+class CoalescingTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = mock.Mock()
+        self.originals = []
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            original = FakeResponse(body=url.encode('ascii'))
+            self.originals.append(original)
+            yield from asyncio.sleep(0)
+            return original
+
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(pool=self.pool, coalesce=True)
 
-        reason = TestResponseDone()
-        protocol.connectionLost(reason)
-        destination.connectionLost.assert_called_once_with(reason)
+    @async_test
+    def test_identical_gets_share_a_request(self):
+        responses = yield from asyncio.gather(
+            self.client.get('http://example.com/'),
+            self.client.get('http://example.com/'),
+            self.client.get('http://example.com/'))
 
+        self.assertEqual(self.pool.request.call_count, 1)
+        for response in responses:
+            self.assertEqual((yield from response.content()),
+                             b'http://example.com/')
 
-class BufferedResponseTests(unittest.TestCase):
-    def test_wraps_protocol(self):
-        wrappers = []
-        wrapped = mock.Mock(Protocol)
-        response = mock.Mock(deliverBody=mock.Mock(wraps=wrappers.append))
+    @async_test
+    def test_different_requests_are_not_shared(self):
+        yield from asyncio.gather(
+            self.client.get('http://example.com/'),
+            self.client.get('http://example.com/', params={'a': 1}),
+            self.client.get('http://example.com/',
+                            headers={'Accept': 'text/plain'}),
+            self.client.get('http://example.com/', auth=('a', 'b')),
+            self.client.head('http://example.com/'))
 
-        br = _BufferedResponse(response)
+        self.assertEqual(self.pool.request.call_count, 5)
 
-        br.deliverBody(wrapped)
-        response.deliverBody.assert_called_once_with(wrappers[0])
-        self.assertNotEqual(wrapped, wrappers[0])
+    @async_test
+    def test_only_get_and_head(self):
+        yield from asyncio.gather(
+            self.client.post('http://example.com/'),
+            self.client.post('http://example.com/'))
 
-    def test_concurrent_receivers(self):
-        wrappers = []
-        wrapped = mock.Mock(Protocol)
-        unwrapped = mock.Mock(Protocol)
-        response = mock.Mock(deliverBody=mock.Mock(wraps=wrappers.append))
+        self.assertEqual(self.pool.request.call_count, 2)
 
-        br = _BufferedResponse(response)
+    @async_test
+    def test_sequential_requests_are_not_shared(self):
+        yield from self.client.get('http://example.com/')
+        yield from self.client.get('http://example.com/')
 
-        br.deliverBody(wrapped)
-        br.deliverBody(unwrapped)
-        response.deliverBody.assert_called_once_with(wrappers[0])
+        self.assertEqual(self.pool.request.call_count, 2)
+        self.assertEqual(self.client._in_flight, {})
 
-        wrappers[0].dataReceived("foo")
-        wrapped.dataReceived.assert_called_once_with("foo")
+    @async_test
+    def test_opt_out_per_request(self):
+        yield from asyncio.gather(
+            self.client.get('http://example.com/'),
+            self.client.get('http://example.com/', coalesce=False))
 
-        self.assertEqual(unwrapped.dataReceived.call_count, 0)
+        self.assertEqual(self.pool.request.call_count, 2)
 
-        class TestResponseDone(Exception):
-            pass
 
-        done = Failure(TestResponseDone())
+class PreparedRequestTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = mock.Mock()
 
-        wrappers[0].connectionLost(done)
-        wrapped.connectionLost.assert_called_once_with(done)
-        unwrapped.dataReceived.assert_called_once_with("foo")
-        unwrapped.connectionLost.assert_called_once_with(done)
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return FakeResponse()
 
-    def test_receiver_after_finished(self):
-        wrappers = []
-        finished = mock.Mock(Protocol)
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(pool=self.pool)
 
-        response = mock.Mock(deliverBody=mock.Mock(wraps=wrappers.append))
+    def test_encodes_once(self):
+        prepared = self.client.prepare(
+            'post', 'http://example.com/', params={'a': 1},
+            headers={'X-Foo': ['1', '2']}, auth=('u', 'p'))
 
-        br = _BufferedResponse(response)
-        br.deliverBody(mock.Mock(Protocol))
-        wrappers[0].dataReceived("foo")
+        self.assertIsInstance(prepared, PreparedRequest)
+        self.assertEqual(prepared.method, 'POST')
+        self.assertEqual(prepared.url, 'http://example.com/?a=1')
+        self.assertEqual(prepared.headers, (
+            ('X-Foo', '1'), ('X-Foo', '2'),
+            ('accept-encoding', 'gzip')))
 
-        class TestResponseDone(Exception):
-            pass
+    def test_is_immutable(self):
+        prepared = self.client.prepare('GET', 'http://example.com/')
 
-        done = Failure(TestResponseDone())
+        with self.assertRaises(AttributeError):
+            prepared.url = 'http://example.org/'
+        with self.assertRaises(AttributeError):
+            del prepared.method
 
-        wrappers[0].connectionLost(done)
+    @async_test
+    def test_sends_many_times(self):
+        prepared = self.client.prepare('PUT', 'http://example.com/',
+                                       headers={'X-Foo': 'bar'},
+                                       data=b'body', auth=('u', 'p'))
+
+        for _ in range(3):
+            resp = yield from prepared.send()
+            self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(self.pool.request.call_count, 3)
+        for call in self.pool.request.call_args_list:
+            self.assertEqual(call, mock.call(
+                'PUT', 'http://example.com/',
+                headers=(('X-Foo', 'bar'), ('accept-encoding', 'gzip')),
+                data=b'body', auth=aiohttp.helpers.BasicAuth('u', 'p')))
 
-        br.deliverBody(finished)
+    @async_test
+    def test_sends_like_request(self):
+        kwargs = dict(params={'q': 'x'}, headers={'Accept': 'text/plain'},
+                      cookies={'c': 'd'})
 
-        finished.dataReceived.assert_called_once_with("foo")
-        finished.connectionLost.assert_called_once_with(done)
+        yield from self.client.request('GET', 'http://example.com/',
+                                       **kwargs)
+        yield from self.client.prepare('GET', 'http://example.com/',
+                                       **kwargs).send()
+
+        (_, direct), (_, prepared) = [
+            (args, dict(kw, headers=tuple(kw['headers']),
+                        cookies=dict(kw['cookies'])))
+            for args, kw in self.pool.request.call_args_list]
+        self.assertEqual(direct, prepared)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,210 @@
+import asyncio
+import unittest
+
+import aiohttp
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.concurrency import (
+    AIMD, ConcurrencyLimiter, ConcurrencyLimitExceeded, Gradient, LimiterStats
+)
+from aiorequests.test.util import FakeResponse
+
+
+class AIMDTests(unittest.TestCase):
+    def test_increase_when_used(self):
+        aimd = AIMD()
+
+        self.assertEqual(aimd.update(10, 5, 0.1, False), 11)
+        self.assertEqual(aimd.update(10, 4, 0.1, False), 10)
+
+    def test_backoff(self):
+        aimd = AIMD(backoff=0.5, timeout=1)
+
+        self.assertEqual(aimd.update(10, 10, 0.1, True), 5)
+        self.assertEqual(aimd.update(10, 10, 2, False), 5)
+
+
+class GradientTests(unittest.TestCase):
+    def test_grows_while_latency_is_steady(self):
+        gradient = Gradient()
+        limit = 10
+        for _ in range(20):
+            limit = gradient.update(limit, limit, 0.1, False)
+
+        self.assertGreater(limit, 20)
+
+    def test_shrinks_when_latency_rises(self):
+        gradient = Gradient()
+        limit = 100
+        for _ in range(50):
+            limit = gradient.update(limit, limit, 0.1, False)
+        grown = limit
+        for _ in range(20):
+            limit = gradient.update(limit, limit, 1.0, False)
+
+        self.assertLess(limit, grown / 2)
+
+    def test_ignores_idle_origin(self):
+        self.assertEqual(Gradient().update(10, 1, 5.0, False), 10)
+
+    def test_drop(self):
+        self.assertLess(Gradient().update(10, 1, 0.1, True), 10)
+
+
+class ConcurrencyLimiterTests(unittest.TestCase):
+    url = 'http://example.com/x'
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def limiter(self, **kwargs):
+        kwargs.setdefault('algorithm', lambda: mock.Mock(
+            update=lambda limit, *args: limit))
+        return ConcurrencyLimiter(loop=self.loop, **kwargs)
+
+    def acquire(self, limiter):
+        return asyncio.ensure_future(limiter.acquire(self.url),
+                                     loop=self.loop)
+
+    def settle(self):
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+    def test_queues_over_the_limit(self):
+        limiter = self.limiter(initial_limit=2)
+        acquired = [self.acquire(limiter) for _ in range(3)]
+        self.settle()
+
+        self.assertEqual([a.done() for a in acquired], [True, True, False])
+        self.assertEqual(limiter.stats(),
+                         {'http://example.com': LimiterStats(2, 2, 1)})
+
+        limiter.release('http://example.com', 0.1)
+        self.settle()
+
+        self.assertTrue(acquired[2].done())
+        self.assertEqual(limiter.stats()['http://example.com'],
+                         LimiterStats(2, 2, 0))
+
+    def test_sheds_when_queue_is_full(self):
+        limiter = self.limiter(initial_limit=1, max_queue=1)
+        self.acquire(limiter)
+        self.acquire(limiter)
+        self.settle()
+
+        with self.assertRaises(ConcurrencyLimitExceeded):
+            self.loop.run_until_complete(limiter.acquire(self.url))
+
+    def test_sheds_after_queue_timeout(self):
+        limiter = self.limiter(initial_limit=1, queue_timeout=0.01)
+        self.acquire(limiter)
+        self.settle()
+
+        with self.assertRaises(ConcurrencyLimitExceeded) as cm:
+            self.loop.run_until_complete(limiter.acquire(self.url))
+        self.assertEqual(cm.exception.origin, 'http://example.com')
+
+    def test_timed_out_waiters_leave_the_queue(self):
+        limiter = self.limiter(initial_limit=1, max_queue=2,
+                               queue_timeout=0.01)
+        self.acquire(limiter)
+        self.settle()
+        for _ in range(2):
+            with self.assertRaises(ConcurrencyLimitExceeded):
+                self.loop.run_until_complete(limiter.acquire(self.url))
+
+        waiting = self.acquire(limiter)
+        self.settle()
+
+        self.assertFalse(waiting.done())
+        self.assertEqual(limiter.stats()['http://example.com'],
+                         LimiterStats(1, 1, 1))
+
+    def test_cancelled_waiters_leave_the_queue(self):
+        limiter = self.limiter(initial_limit=1, max_queue=1)
+        self.acquire(limiter)
+        cancelled = self.acquire(limiter)
+        self.settle()
+        cancelled.cancel()
+        self.settle()
+
+        waiting = self.acquire(limiter)
+        self.settle()
+        limiter.release('http://example.com', 0.1)
+        self.settle()
+
+        self.assertTrue(waiting.done())
+        self.assertIsNone(waiting.exception())
+
+    def test_limit_adapts_and_is_clamped(self):
+        limiter = ConcurrencyLimiter(algorithm=lambda: AIMD(backoff=0.1),
+                                     initial_limit=4, min_limit=2,
+                                     loop=self.loop)
+        origin = self.loop.run_until_complete(limiter.acquire(self.url))
+
+        limiter.release(origin, 0.1, dropped=True)
+
+        self.assertEqual(limiter.stats()[origin].limit, 2)
+
+    def test_call_counts_errors_as_drops(self):
+        algorithm = mock.Mock()
+        algorithm.update.return_value = 5
+        limiter = ConcurrencyLimiter(algorithm=lambda: algorithm,
+                                     loop=self.loop)
+
+        @asyncio.coroutine
+        def fail():
+            raise aiohttp.ClientConnectionError()
+
+        @asyncio.coroutine
+        def unavailable():
+            return FakeResponse(503)
+
+        @asyncio.coroutine
+        def other():
+            raise ValueError()
+
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self.loop.run_until_complete(limiter.call(fail, self.url))
+        self.loop.run_until_complete(limiter.call(unavailable, self.url))
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(limiter.call(other, self.url))
+
+        self.assertEqual([c[0][3] for c in algorithm.update.call_args_list],
+                         [True, True])
+        self.assertEqual(limiter.stats()['http://example.com'],
+                         LimiterStats(5, 0, 0))
+
+
+class LimitedClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_limits_requests_in_flight(self):
+        pool = mock.Mock()
+        in_flight = []
+        peak = []
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            in_flight.append(url)
+            peak.append(len(in_flight))
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            in_flight.remove(url)
+            return FakeResponse()
+
+        pool.request.side_effect = request
+        limiter = ConcurrencyLimiter(algorithm=AIMD, initial_limit=2,
+                                     max_limit=2, loop=self.loop)
+        client = HTTPClient(pool=pool, loop=self.loop,
+                            concurrency_limiter=limiter)
+
+        self.loop.run_until_complete(asyncio.gather(
+            *[client.get('http://example.com/') for _ in range(6)],
+            loop=self.loop))
+
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(client.concurrency_stats(),
+                         {'http://example.com': LimiterStats(2, 0, 0)})
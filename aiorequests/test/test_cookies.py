@@ -0,0 +1,313 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from http.cookies import SimpleCookie
+
+import mock
+
+from requests.cookies import cookiejar_from_dict
+
+from aiorequests.client import HTTPClient
+from aiorequests.cookies import CookieStore, FileCookieStore
+from aiorequests.test.util import FakeClock, FakeResponse
+
+
+def set_cookies(*headers):
+    cookies = SimpleCookie()
+    for header in headers:
+        cookies.load(header)
+    return cookies
+
+
+class CookieStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+        self.store = CookieStore(clock=self.clock)
+
+    def test_from_dict_matches_every_host(self):
+        store = CookieStore({'a': '1'})
+
+        self.assertEqual(store.lookup('http://example.com/'), {'a': '1'})
+        self.assertEqual(store.lookup('https://other.org/x'), {'a': '1'})
+        self.assertEqual(store['a'], '1')
+
+    def test_from_cookie_jar(self):
+        store = CookieStore(cookiejar_from_dict({'a': '1', 'b': '2'}))
+
+        self.assertEqual(sorted(store.items()), [('a', '1'), ('b', '2')])
+
+    def test_host_only_cookies(self):
+        self.store.extract('http://example.com/', set_cookies('a=1'))
+
+        self.assertEqual(self.store.lookup('http://example.com/'),
+                         {'a': '1'})
+        self.assertEqual(self.store.lookup('http://www.example.com/'), {})
+        self.assertEqual(self.store.lookup('http://other.com/'), {})
+
+    def test_domain_cookies(self):
+        self.store.extract('http://www.example.com/',
+                           set_cookies('a=1; Domain=example.com'))
+
+        self.assertEqual(self.store.lookup('http://example.com/'),
+                         {'a': '1'})
+        self.assertEqual(self.store.lookup('http://a.b.example.com/'),
+                         {'a': '1'})
+        self.assertEqual(self.store.lookup('http://badexample.com/'), {})
+
+    def test_foreign_domain_is_rejected(self):
+        self.store.extract('http://example.com/',
+                           set_cookies('a=1; Domain=other.com'))
+
+        self.assertEqual(len(self.store), 0)
+
+    def test_public_suffix_domain_is_rejected(self):
+        self.store.extract('http://a.example.com/',
+                           set_cookies('a=1; Domain=com'))
+        self.store.extract('http://a.example.co.uk/',
+                           set_cookies('b=2; Domain=.co.uk'))
+
+        self.assertEqual(len(self.store), 0)
+
+    def test_domain_of_a_dotless_host(self):
+        self.store.extract('http://localhost/',
+                           set_cookies('a=1; Domain=localhost'))
+
+        self.assertEqual(self.store.lookup('http://localhost/'), {'a': '1'})
+
+    def test_paths(self):
+        self.store.extract('http://example.com/a/b',
+                           set_cookies('a=1', 'b=2; Path=/x'))
+
+        self.assertEqual(self.store.lookup('http://example.com/a'),
+                         {'a': '1'})
+        self.assertEqual(self.store.lookup('http://example.com/a/c'),
+                         {'a': '1'})
+        self.assertEqual(self.store.lookup('http://example.com/ab'), {})
+        self.assertEqual(self.store.lookup('http://example.com/x/y'),
+                         {'b': '2'})
+
+    def test_longest_path_wins(self):
+        self.store.set('a', 'root', domain='example.com', path='/')
+        self.store.set('a', 'deep', domain='example.com', path='/x')
+
+        self.assertEqual(self.store.lookup('http://example.com/x'),
+                         {'a': 'deep'})
+        self.assertEqual(
+            [c.value for c in self.store.cookies_for('http://example.com/x')],
+            ['deep', 'root'])
+
+    def test_secure_cookies_need_https(self):
+        self.store.extract('https://example.com/', set_cookies('a=1; Secure'))
+
+        self.assertEqual(self.store.lookup('http://example.com/'), {})
+        self.assertEqual(self.store.lookup('https://example.com/'),
+                         {'a': '1'})
+
+    def test_expiry_is_lazy(self):
+        self.store.extract('http://example.com/',
+                           set_cookies('a=1; Max-Age=10', 'b=2'))
+        self.clock.now += 10
+
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.lookup('http://example.com/'),
+                         {'b': '2'})
+        self.assertEqual(len(self.store), 1)
+
+    def test_max_age_zero_deletes(self):
+        self.store.extract('http://example.com/', set_cookies('a=1'))
+        self.store.extract('http://example.com/', set_cookies('a=; Max-Age=0'))
+
+        self.assertEqual(len(self.store), 0)
+        self.assertFalse(self.store)
+
+    def test_clear_expired(self):
+        self.store.set('a', '1', domain='example.com', expires=1005)
+        self.store.set('b', '2', domain='example.com')
+        self.clock.now = 1005
+
+        self.store.clear_expired()
+
+        self.assertEqual(self.store.keys(), ['b'])
+
+    def test_snapshot_is_copy_on_write(self):
+        self.store.set('a', '1', domain='example.com')
+        self.store.set('b', '2', domain='example.org')
+        snapshot = self.store.snapshot()
+        self.assertIs(snapshot._domains, self.store._domains)
+
+        self.store.set('a', 'changed', domain='example.com')
+        snapshot.set('c', '3', domain='example.net')
+
+        self.assertEqual(self.store.lookup('http://example.com/'),
+                         {'a': 'changed'})
+        self.assertEqual(snapshot.lookup('http://example.com/'), {'a': '1'})
+        self.assertEqual(self.store.lookup('http://example.net/'), {})
+        self.assertEqual(snapshot.lookup('http://example.net/'), {'c': '3'})
+        # Domains neither changed are still shared.
+        self.assertIs(snapshot._domains['example.org'],
+                      self.store._domains['example.org'])
+
+    def test_mapping_access(self):
+        self.store.set('a', '1')
+
+        self.assertIn('a', self.store)
+        self.assertEqual(self.store.get('a'), '1')
+        self.assertIsNone(self.store.get('b'))
+        with self.assertRaises(KeyError):
+            self.store['b']
+
+
+class ClientCookieTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.responses = []
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return self.responses.pop(0)
+
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(pool=self.pool, loop=self.loop)
+
+    def get(self, url, **kwargs):
+        return self.loop.run_until_complete(self.client.get(url, **kwargs))
+
+    def test_cookies_set_by_responses_are_sent(self):
+        self.responses = [
+            FakeResponse(cookies=set_cookies('session=abc')),
+            FakeResponse(), FakeResponse()]
+
+        self.get('http://example.com/login')
+        self.get('http://example.com/account')
+        self.get('http://example.org/')
+
+        calls = self.pool.request.call_args_list
+        self.assertNotIn('cookies', calls[0][1])
+        self.assertEqual(calls[1][1]['cookies'], {'session': 'abc'})
+        self.assertNotIn('cookies', calls[2][1])
+
+    def test_request_cookies_override_the_jar(self):
+        self.client._cookiejar.set('a', 'jar', domain='example.com')
+        self.responses = [FakeResponse()]
+
+        self.get('http://example.com/', cookies={'a': 'request', 'b': '2'})
+
+        self.assertEqual(self.pool.request.call_args[1]['cookies'],
+                         {'a': 'request', 'b': '2'})
+
+    def test_response_cookies_are_a_snapshot(self):
+        self.responses = [FakeResponse(cookies=set_cookies('a=1')),
+                          FakeResponse(cookies=set_cookies('a=2'))]
+
+        first = self.get('http://example.com/')
+        second = self.get('http://example.com/')
+
+        self.assertEqual(first.cookies()['a'], '1')
+        self.assertEqual(second.cookies()['a'], '2')
+
+    def test_client_takes_a_cookie_jar(self):
+        client = HTTPClient(cookiejar=cookiejar_from_dict({'a': '1'}),
+                            pool=self.pool, loop=self.loop)
+        self.responses = [FakeResponse()]
+
+        self.loop.run_until_complete(client.get('http://example.com/'))
+
+        self.assertEqual(self.pool.request.call_args[1]['cookies'],
+                         {'a': '1'})
+
+
+class FileCookieStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'cookies.jsonl')
+        self.clock = FakeClock(1000)
+
+    def open(self, **kwargs):
+        store = FileCookieStore(self.path, clock=self.clock, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def lines(self):
+        with open(self.path) as f:
+            return f.read().splitlines()
+
+    def test_survives_reopening(self):
+        store = self.open()
+        store.extract('https://example.com/a/',
+                      set_cookies('a=1; Max-Age=100; Secure; HttpOnly',
+                                  'b=2; Domain=example.com; Path=/'))
+        store.close()
+
+        store = self.open()
+        self.assertEqual(store.lookup('https://example.com/a/'),
+                         {'a': '1', 'b': '2'})
+        self.assertEqual(store.lookup('http://www.example.com/'),
+                         {'b': '2'})
+        cookie = store.cookies_for('https://example.com/a/')[0]
+        self.assertEqual(cookie.expires, 1100)
+        self.assertTrue(cookie.has_nonstandard_attr('HttpOnly'))
+
+    def test_changes_are_appended(self):
+        store = self.open()
+        store.set('a', '1', domain='example.com')
+        store.set('a', '2', domain='example.com')
+        store.remove('a', domain='example.com')
+
+        self.assertEqual(len(self.lines()), 3)
+        self.assertEqual(len(self.open()), 0)
+
+    def test_compacts_once_mostly_stale(self):
+        store = self.open(compact_after=4)
+        for value in range(3):
+            store.set('a', str(value), domain='example.com')
+        self.assertEqual(len(self.lines()), 3)
+
+        store.set('a', '3', domain='example.com')
+
+        self.assertEqual(len(self.lines()), 1)
+        self.assertEqual(self.open().get('a'), '3')
+
+    def test_expired_cookies_are_not_loaded(self):
+        store = self.open()
+        store.set('a', '1', domain='example.com', expires=1010)
+        store.set('b', '2', domain='example.com')
+        self.clock.now = 1010
+
+        self.assertEqual(self.open().keys(), ['b'])
+
+    def test_session_cookies_can_be_dropped(self):
+        store = self.open(keep_session_cookies=False)
+        store.set('a', '1', domain='example.com')
+        store.set('b', '2', domain='example.com', expires=2000)
+        store.close()
+
+        self.assertEqual(self.open().keys(), ['b'])
+
+    def test_ignores_a_torn_last_line(self):
+        store = self.open()
+        store.set('a', '1', domain='example.com')
+        store.close()
+        with open(self.path, 'a') as f:
+            f.write('["s", "b", "2", "exa')
+
+        self.assertEqual(self.open().keys(), ['a'])
+
+    def test_client_opens_a_path(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        client = HTTPClient(cookiejar=self.path, pool=mock.Mock(), loop=loop)
+        client._cookiejar.set('a', '1', domain='example.com')
+
+        loop.run_until_complete(client.close())
+
+        self.assertEqual(self.open().get('a'), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from multidict import CIMultiDict
+
+from aiorequests.client import HTTPClient
+from aiorequests.download import DownloadError, _content_range, _segments
+from aiorequests.retry import RetryPolicy
+from aiorequests.test.util import FakeResponse
+
+
+BODY = bytes(range(256)) * 40
+
+
+class FakeStream(object):
+    def __init__(self, body, fail_after=None):
+        self.body = body
+        self.offset = 0
+        self.fail_after = fail_after
+
+    @asyncio.coroutine
+    def readany(self):
+        yield from asyncio.sleep(0)
+        if self.fail_after is not None and self.offset >= self.fail_after:
+            raise ConnectionResetError()
+        chunk = self.body[self.offset:self.offset + 1000]
+        self.offset += len(chunk)
+        return chunk
+
+
+class Server(object):
+    """
+    Answers like a server with ranges and strong validators.
+    """
+    def __init__(self, body=BODY, etag='"v1"', fail_after=None):
+        self.body = body
+        self.etag = etag
+        self.fail_after = fail_after
+        self.failures = {}
+        self.requests = []
+        self.active = self.max_active = 0
+
+    def released(self):
+        self.active -= 1
+
+    @asyncio.coroutine
+    def request(self, method, url, headers=(), **kwargs):
+        headers = CIMultiDict(headers)
+        validators = [('ETag', self.etag)] if self.etag else []
+        size = len(self.body)
+        if method == 'HEAD':
+            return FakeResponse(200, headers=validators + [
+                ('Accept-Ranges', 'bytes'), ('Content-Length', str(size))])
+
+        self.requests.append(headers)
+        fail_after, self.fail_after = self.fail_after, None
+        self.active += 1
+        self.max_active = max(self.active, self.max_active)
+        if 'Range' in headers and headers.get('If-Range') == self.etag:
+            start, _, end = headers['Range'][len('bytes='):].partition('-')
+            start, end = int(start), int(end or size - 1) + 1
+            fail_after = self.failures.pop(start, fail_after)
+            if start >= size:
+                return FakeResponse(416, headers=[
+                    ('Content-Range', 'bytes */{0}'.format(size))],
+                    on_release=self.released)
+            return FakeResponse(206, validators + [
+                ('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                    start, end - 1, size)),
+                ('Content-Length', str(end - start))],
+                content=FakeStream(self.body[start:end], fail_after),
+                on_release=self.released)
+        return FakeResponse(200, validators + [
+            ('Content-Length', str(size))],
+            content=FakeStream(self.body, fail_after),
+            on_release=self.released)
+
+
+class DownloadTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'file')
+        self.server = Server()
+        pool = mock.Mock()
+        pool.request.side_effect = self.server.request
+        self.client = HTTPClient(pool=pool, loop=self.loop)
+
+    def download(self, **kwargs):
+        kwargs.setdefault('chunk_size', 4096)
+        return self.loop.run_until_complete(
+            self.client.download('http://example.com/file', self.path,
+                                 **kwargs))
+
+    def read(self, path=None):
+        with open(path or self.path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        progress = []
+
+        result = self.download(progress=lambda *args: progress.append(args))
+
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(os.listdir(self.dir), ['file'])
+        self.assertEqual((result.size, result.received, result.resumed_from),
+                         (len(BODY), len(BODY), 0))
+        self.assertGreater(result.throughput, 0)
+        self.assertEqual(progress[-1], (len(BODY), len(BODY)))
+        self.assertEqual([done for done, _ in progress],
+                         [4096, 8192, len(BODY)])
+
+    def test_resumes_with_range(self):
+        self.server.fail_after = 5000
+
+        self.assertRaises(ConnectionResetError, self.download)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.read(self.path + '.part')[:4096], BODY[:4096])
+
+        result = self.download()
+
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(result.resumed_from, 4096)
+        self.assertEqual(result.received, len(BODY) - 4096)
+        self.assertEqual(self.server.requests[-1]['Range'], 'bytes=4096-')
+        self.assertEqual(self.server.requests[-1]['If-Range'], '"v1"')
+        self.assertEqual(os.listdir(self.dir), ['file'])
+
+    def test_starts_over_when_the_object_changed(self):
+        self.server.fail_after = 5000
+        self.assertRaises(ConnectionResetError, self.download)
+        self.server.etag = '"v2"'
+        self.server.body = BODY[::-1]
+
+        result = self.download()
+
+        self.assertEqual(self.read(), BODY[::-1])
+        self.assertEqual(result.resumed_from, 0)
+
+    def test_no_resume_without_validators(self):
+        self.server.etag = None
+        self.server.fail_after = 5000
+        self.assertRaises(ConnectionResetError, self.download)
+
+        self.download()
+
+        self.assertNotIn('Range', self.server.requests[-1])
+        self.assertEqual(self.read(), BODY)
+
+    def test_resume_after_the_last_byte(self):
+        self.download(resume=False)
+        os.rename(self.path, self.path + '.part')
+        with open(self.path + '.part.json', 'w') as f:
+            f.write('{"url": "http://example.com/file", "validator": "\\"v1\\"",'
+                    ' "size": %d, "written": %d}' % (len(BODY), len(BODY)))
+
+        result = self.download()
+
+        self.assertEqual(result.received, 0)
+        self.assertEqual(self.read(), BODY)
+
+    def test_error_status(self):
+        self.client._pool.request.side_effect = asyncio.coroutine(
+            lambda *args, **kwargs: FakeResponse(404))
+
+        with self.assertRaises(DownloadError) as cm:
+            self.download()
+        self.assertEqual(cm.exception.reason, 'status 404')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_short_body(self):
+        self.client._pool.request.side_effect = asyncio.coroutine(
+            lambda *args, **kwargs: FakeResponse(
+                200, [('Content-Length', '10'), ('ETag', '"x"')],
+                content=FakeStream(b'abc')))
+
+        self.assertRaises(DownloadError, self.download)
+        self.assertEqual(self.read(self.path + '.part')[:3], b'abc')
+
+    def test_fsync_policy(self):
+        with mock.patch('os.fsync') as fsync:
+            self.download(fsync=None)
+            self.assertFalse(fsync.called)
+            self.download(fsync='end')
+            self.assertEqual(fsync.call_count, 1)
+        self.assertRaises(ValueError, self.download, fsync='sometimes')
+
+
+class SegmentedDownloadTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'file')
+        self.server = Server()
+        pool = mock.Mock()
+        pool.request.side_effect = self.server.request
+        self.client = HTTPClient(pool=pool, loop=self.loop)
+
+    def download(self, **kwargs):
+        kwargs.setdefault('chunk_size', 1024)
+        kwargs.setdefault('segments', 4)
+        kwargs.setdefault('min_segment_size', 1000)
+        kwargs.setdefault('segment_retry', RetryPolicy(backoff=0))
+        return self.loop.run_until_complete(
+            self.client.download('http://example.com/file', self.path,
+                                 **kwargs))
+
+    def read(self, path=None):
+        with open(path or self.path, 'rb') as f:
+            return f.read()
+
+    def ranges(self):
+        return [headers['Range'] for headers in self.server.requests]
+
+    def test_segments(self):
+        progress = []
+
+        result = self.download(progress=lambda *args: progress.append(args))
+
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(os.listdir(self.dir), ['file'])
+        self.assertEqual(sorted(self.ranges()), [
+            'bytes=0-2559', 'bytes=2560-5119', 'bytes=5120-7679',
+            'bytes=7680-10239'])
+        self.assertEqual(self.server.max_active, 4)
+        self.assertEqual(self.server.active, 0)
+        self.assertEqual((result.size, result.received, result.resumed_from),
+                         (len(BODY), len(BODY), 0))
+        self.assertEqual(progress[-1], (len(BODY), len(BODY)))
+
+    def test_fewer_segments_for_small_objects(self):
+        self.download(min_segment_size=4000)
+
+        self.assertEqual(sorted(self.ranges()),
+                         ['bytes=0-5119', 'bytes=5120-10239'])
+        self.assertEqual(self.read(), BODY)
+
+    def test_retries_a_failed_segment_alone(self):
+        self.server.failures[5120] = 1500
+
+        self.download()
+
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(self.ranges()[-1], 'bytes=6144-7679')
+        self.assertEqual(self.server.requests[-1]['If-Range'], '"v1"')
+
+    def test_resumes_segments(self):
+        self.server.failures[5120] = 1500
+
+        self.assertRaises(ConnectionResetError, self.download,
+                          segment_retry=RetryPolicy(max_attempts=1))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.server.active, 0)
+
+        del self.server.requests[:]
+        result = self.download()
+
+        # The other segments were stopped where they were.
+        self.assertEqual(self.read(), BODY)
+        self.assertIn('bytes=6144-7679', self.ranges())
+        self.assertEqual(len(self.ranges()), 4)
+        self.assertGreaterEqual(result.resumed_from, 1024)
+        self.assertEqual(result.resumed_from + result.received, len(BODY))
+
+    def segment_status(self, status, start=5120, times=None):
+        """
+        Answer ``times`` (default: every) request for the range at
+        ``start`` with ``status``.
+        """
+        answered = []
+
+        @asyncio.coroutine
+        def request(method, url, headers=(), **kwargs):
+            if (dict(headers).get('Range', '').startswith(
+                    'bytes={0}-'.format(start)) and
+                    (times is None or len(answered) < times)):
+                answered.append(status)
+                return FakeResponse(status)
+            return (yield from self.server.request(method, url, headers,
+                                                   **kwargs))
+        self.client._pool.request.side_effect = request
+        return answered
+
+    def test_retries_server_errors(self):
+        answered = self.segment_status(503, times=1)
+
+        self.download()
+
+        self.assertEqual(answered, [503])
+        self.assertEqual(self.read(), BODY)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_client_errors_are_not_retried(self):
+        answered = self.segment_status(403)
+
+        with self.assertRaises(DownloadError) as cm:
+            self.download()
+
+        self.assertEqual(cm.exception.reason, 'status 403')
+        self.assertEqual(answered, [403])
+
+    def test_object_changed(self):
+        def request(method, url, **kwargs):
+            resp = yield from self.server.request(method, url, **kwargs)
+            self.server.etag = '"v2"'
+            return resp
+        self.client._pool.request.side_effect = asyncio.coroutine(request)
+
+        self.assertRaises(DownloadError, self.download)
+        self.assertFalse(os.path.exists(self.path + '.part.json'))
+
+    def test_falls_back_to_one_request(self):
+        self.server.etag = None
+
+        self.download()
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertNotIn('Range', self.server.requests[0])
+        self.assertEqual(self.read(), BODY)
+
+    def test_split(self):
+        self.assertEqual(_segments(10, 3),
+                         [[0, 4, 0], [4, 7, 4], [7, 10, 7]])
+
+
+class ContentRangeTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(_content_range('bytes 10-19/20'), (10, 20))
+        self.assertEqual(_content_range('bytes */20'), (None, 20))
+        self.assertEqual(_content_range('bytes 0-9/*'), (0, None))
+        self.assertEqual(_content_range(None), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
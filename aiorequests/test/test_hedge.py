@@ -0,0 +1,202 @@
+import asyncio
+import unittest
+
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.hedge import HedgePolicy
+from aiorequests.test.util import FakeResponse
+from aiorequests.timeouts import Deadlines
+
+
+class HedgePolicyTests(unittest.TestCase):
+    def test_fixed_delay(self):
+        self.assertEqual(HedgePolicy(delay=0.5).hedge_delay('http://a/'), 0.5)
+
+    def test_percentile_of_origin(self):
+        policy = HedgePolicy(percentile=90, min_samples=10)
+        for ms in range(1, 11):
+            policy.record('http://a/path', ms / 1000.0)
+        policy.record('http://b/', 5)
+
+        self.assertEqual(policy.hedge_delay('http://a/other'), 0.009)
+        self.assertIsNone(policy.hedge_delay('http://b/'))
+
+        policy.record('http://a/', 1)
+        self.assertEqual(policy.hedge_delay('http://a/'), 0.01)
+
+    def test_window(self):
+        policy = HedgePolicy(percentile=100, min_samples=1, window=2)
+        for seconds in (9, 1, 2):
+            policy.record('http://a/', seconds)
+
+        self.assertEqual(policy.hedge_delay('http://a/'), 2)
+
+    def test_alternates(self):
+        policy = HedgePolicy(alternates={
+            'https://a.example.com/': ['https://b.example.com',
+                                       'http://c.example.com:8080']})
+
+        self.assertEqual(policy.hedge_url('https://a.example.com/x?y=1'),
+                         'https://b.example.com/x?y=1')
+        self.assertEqual(policy.hedge_url('https://a.example.com/x'),
+                         'http://c.example.com:8080/x')
+        self.assertEqual(policy.hedge_url('https://d.example.com/x'),
+                         'https://d.example.com/x')
+
+    def test_methods(self):
+        policy = HedgePolicy()
+
+        self.assertTrue(policy.hedges_method('get'))
+        self.assertFalse(policy.hedges_method('POST'))
+
+
+class HedgedCallTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.pending = {}
+        self.calls = []
+
+    def send(self, url):
+        future = self.loop.create_future()
+        self.calls.append((url, future))
+        return future
+
+    def hedged_call(self, policy, steps, url='http://a/'):
+        """
+        Start a hedged call and run ``steps`` (coroutine functions) next to
+        it.
+        """
+        call = asyncio.ensure_future(policy.call(self.send, url, self.loop),
+                                     loop=self.loop)
+
+        @asyncio.coroutine
+        def drive():
+            for step in steps:
+                yield from step()
+            return (yield from call)
+
+        return self.loop.run_until_complete(drive())
+
+    def answer(self, index, resp=None, exc=None, after=0):
+        @asyncio.coroutine
+        def step():
+            yield from asyncio.sleep(after, loop=self.loop)
+            url, future = self.calls[index]
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(resp or FakeResponse(url=url))
+        return step
+
+    def test_fast_response_is_not_hedged(self):
+        policy = HedgePolicy(delay=0.05)
+
+        resp = self.hedged_call(policy, [self.answer(0)])
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(resp.url, 'http://a/')
+        self.assertEqual(policy.hedged, 0)
+
+    def test_slow_response_is_hedged(self):
+        policy = HedgePolicy(delay=0.01,
+                             alternates={'http://a': ['http://b']})
+
+        resp = self.hedged_call(policy, [self.answer(1, after=0.05)])
+
+        self.assertEqual(resp.url, 'http://b/')
+        self.assertTrue(self.calls[0][1].cancelled())
+        self.assertEqual((policy.hedged, policy.hedges_won), (1, 1))
+
+    def test_original_can_still_win(self):
+        policy = HedgePolicy(delay=0.01)
+        loser = FakeResponse(url='http://a/')
+
+        @asyncio.coroutine
+        def both():
+            yield from asyncio.sleep(0.05, loop=self.loop)
+            self.calls[0][1].set_result(FakeResponse(url='http://a/'))
+            self.calls[1][1].set_result(loser)
+
+        resp = self.hedged_call(policy, [both])
+
+        self.assertFalse(resp.released)
+        self.assertTrue(loser.released)
+        self.assertEqual((policy.hedged, policy.hedges_won), (1, 0))
+
+    def test_failed_attempt_waits_for_the_other(self):
+        policy = HedgePolicy(delay=0.01)
+
+        resp = self.hedged_call(policy, [
+            self.answer(0, exc=OSError('reset'), after=0.05),
+            self.answer(1)])
+
+        self.assertIs(resp, self.calls[1][1].result())
+
+    def test_all_attempts_failed(self):
+        policy = HedgePolicy(delay=0.01)
+
+        with self.assertRaises(OSError):
+            self.hedged_call(policy, [
+                self.answer(1, exc=ValueError(), after=0.05),
+                self.answer(0, exc=OSError())])
+
+    def test_cancelled_call_cancels_attempts(self):
+        policy = HedgePolicy(delay=0.01)
+        call = asyncio.ensure_future(
+            policy.call(self.send, 'http://a/', self.loop), loop=self.loop)
+        self.loop.run_until_complete(asyncio.sleep(0.05, loop=self.loop))
+
+        call.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+        self.assertTrue(all(f.cancelled() for _, f in self.calls))
+
+
+class HedgingClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.pool = mock.Mock()
+        self.policy = HedgePolicy(delay=0.01,
+                                  alternates={'http://a': ['http://b']})
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            if url.startswith('http://a'):
+                yield from asyncio.sleep(1, loop=self.loop)
+            return FakeResponse(url=url)
+
+        self.pool.request.side_effect = request
+        self.client = HTTPClient(pool=self.pool, hedge=self.policy,
+                                 loop=self.loop)
+
+    def test_hedges_get(self):
+        resp = self.loop.run_until_complete(self.client.get('http://a/x'))
+
+        self.assertEqual(resp.url, 'http://b/x')
+
+    def test_copies_have_their_own_deadlines(self):
+        with mock.patch.object(Deadlines, 'close', autospec=True) as close:
+            resp = self.loop.run_until_complete(
+                self.client.get('http://a/x', timeout=5))
+            self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+        primary, copy = [kwargs['trace_request_ctx'] for _, kwargs
+                         in self.pool.request.call_args_list]
+        self.assertIsNot(primary, copy)
+        self.assertEqual(resp.url, 'http://b/x')
+        closed = [args[0] for args, _ in close.call_args_list]
+        self.assertIn(primary, closed)
+        self.assertNotIn(copy, closed)
+
+    def test_does_not_hedge_post(self):
+        self.pool.request.side_effect = None
+        self.pool.request.return_value = self.loop.create_future()
+        self.pool.request.return_value.set_result(FakeResponse(url='http://a/'))
+
+        self.loop.run_until_complete(self.client.post('http://a/x'))
+
+        self.assertEqual(self.policy.hedged, 0)
+        self.assertEqual(self.pool.request.call_count, 1)
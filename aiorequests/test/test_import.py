@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+def import_times(statement):
+    """
+    Run ``statement`` in a fresh interpreter with ``-X importtime`` and
+    return a ``dict`` of the modules it imported and their cumulative
+    import times in microseconds.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE, check=True).stderr.decode('utf-8')
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs 3.7")
+class ImportTimeTests(unittest.TestCase):
+    # Generous, so that only regressions and not slow machines fail it.
+    budget = 0.1
+
+    def test_import_is_cheap(self):
+        times = import_times('import aiorequests')
+
+        for heavy in ('pkg_resources', 'requests', 'aiohttp'):
+            self.assertNotIn(heavy, times)
+        self.assertLess(times['aiorequests'] / 1e6, self.budget)
+
+    def test_api_does_not_need_requests(self):
+        times = import_times('from aiorequests import get')
+
+        self.assertIn('aiohttp', times)
+        self.assertNotIn('pkg_resources', times)
+        self.assertNotIn('requests', times)
+        self.assertNotIn('aiorequests.batch', times)
+
+    def test_version(self):
+        import aiorequests
+
+        path = os.path.join(os.path.dirname(aiorequests.__file__),
+                            '_version')
+        with open(path, 'rb') as f:
+            self.assertEqual(aiorequests.__version__, f.read().strip())
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "module __getattr__ needs 3.7")
+class PackageAttributeTests(unittest.TestCase):
+    def test_submodules(self):
+        subprocess.run([sys.executable, '-c', '''if True:
+            import aiorequests
+            assert aiorequests.api.get is aiorequests.get
+            assert aiorequests.urls.BaseURL
+        '''], check=True)
+
+    def test_content_is_the_function(self):
+        # aiorequests.api imports the aiorequests.content module.
+        subprocess.run([sys.executable, '-c', '''if True:
+            import aiorequests
+            aiorequests.get
+            import aiorequests.content
+            assert aiorequests.content.__name__ == 'content'
+        '''], check=True)
+
+    def test_unknown_names(self):
+        import aiorequests
+
+        with self.assertRaises(AttributeError):
+            aiorequests.no_such_name
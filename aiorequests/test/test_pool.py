@@ -0,0 +1,291 @@
+import asyncio
+import unittest
+
+from collections import namedtuple
+
+import mock
+
+from aiohttp import TCPConnector, web
+
+from aiorequests.client import HTTPClient
+from aiorequests.pool import PooledConnector, PoolStats, open_connections
+from aiorequests.tls import SSLContextCache
+
+
+Request = namedtuple('Request', ['host', 'port'])
+
+
+class FakeTransport(object):
+    def __init__(self, ssl_object=None):
+        self.closed = False
+        self.ssl_object = ssl_object
+
+    def is_closing(self):
+        return self.closed
+
+    def get_extra_info(self, name):
+        return self.ssl_object if name == 'ssl_object' else None
+
+
+class FakeProtocol(object):
+    def __init__(self, ssl_object=None):
+        self.transport = FakeTransport(ssl_object)
+
+    def close(self):
+        self.transport.closed = True
+
+
+class FakeConnection(object):
+    """
+    What ``TCPConnector.connect`` hands out: releasing it puts its protocol
+    back in ``idle``.
+    """
+    def __init__(self, protocol, idle):
+        self.protocol = protocol
+        self._idle = idle
+        self._callbacks = []
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def _notify(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def release(self):
+        self._notify()
+        self._idle.append(self.protocol)
+
+    def close(self):
+        self._notify()
+        self.protocol.close()
+
+
+class PooledConnectorTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.req = Request('example.com', 80)
+        self.idle = []
+        self.opened = []
+        self.gate = None
+
+        @asyncio.coroutine
+        def connect(connector, req, traces, timeout):
+            if self.gate is not None:
+                yield from self.gate
+            if self.idle:
+                protocol = self.idle.pop()
+            else:
+                protocol = FakeProtocol(self.ssl_object())
+                self.opened.append(protocol)
+            return FakeConnection(protocol, self.idle)
+
+        patcher = mock.patch.object(TCPConnector, 'connect', connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ssl_object = lambda: None
+
+    def _connector(self, **kwargs):
+        connector = PooledConnector(loop=self.loop, **kwargs)
+        self.addCleanup(connector.close)
+        return connector
+
+    def connect(self, connector):
+        return self.loop.run_until_complete(
+            connector.connect(self.req, [], None))
+
+    def test_stats_counts_idle_and_in_use(self):
+        connector = self._connector()
+        busy = self.connect(connector)
+        idle = self.connect(connector)
+
+        idle.release()
+
+        self.assertEqual(connector.stats(),
+                         {'example.com:80': PoolStats(2, 1, 1, 0)})
+        self.assertIsNotNone(busy)
+
+    def test_stats_counts_waiting(self):
+        connector = self._connector()
+        self.gate = self.loop.create_future()
+        task = self.loop.create_task(connector.connect(self.req, [], None))
+        self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+        self.assertEqual(connector.stats(),
+                         {'example.com:80': PoolStats(0, 0, 0, 1)})
+
+        self.gate.set_result(None)
+        self.loop.run_until_complete(task)
+        self.assertEqual(connector.stats(),
+                         {'example.com:80': PoolStats(1, 0, 1, 0)})
+
+    def test_closed_connections_are_not_counted(self):
+        connector = self._connector()
+        self.connect(connector).close()
+
+        self.assertEqual(connector.stats(), {})
+
+    def test_reuses_young_connection(self):
+        connector = self._connector(max_lifetime=60)
+        first = self.connect(connector)
+        protocol = first.protocol
+        first.release()
+
+        second = self.connect(connector)
+
+        self.assertIs(second.protocol, protocol)
+        self.assertFalse(protocol.transport.closed)
+
+    def test_closes_connection_past_max_lifetime(self):
+        connector = self._connector(max_lifetime=60)
+        first = self.connect(connector)
+        stale = first.protocol
+        first.release()
+        connector._created[stale] -= 61
+
+        second = self.connect(connector)
+
+        self.assertTrue(stale.transport.closed)
+        self.assertIsNot(second.protocol, stale)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(connector.stats(),
+                         {'example.com:80': PoolStats(1, 0, 1, 0)})
+
+    def test_no_max_lifetime(self):
+        connector = self._connector()
+        first = self.connect(connector)
+        first.release()
+        connector._created[first.protocol] -= 10 ** 6
+
+        self.assertIs(self.connect(connector).protocol, first.protocol)
+
+    def test_records_tls_sessions(self):
+        sessions = mock.Mock()
+        ssl_object = mock.Mock(server_hostname='example.com')
+        ssl_object.context.sessions = sessions
+        self.ssl_object = lambda: ssl_object
+        connector = self._connector()
+
+        self.connect(connector).release()
+        sessions.record.assert_called_once_with(ssl_object)
+
+        self.connect(connector)
+        sessions.set.assert_called_once_with('example.com',
+                                             ssl_object.session)
+
+    def test_default_ssl_context_from_cache(self):
+        contexts = SSLContextCache()
+        with mock.patch.object(TCPConnector, '__init__',
+                               return_value=None) as init:
+            PooledConnector(loop=self.loop, ssl_contexts=contexts)
+            self.assertIs(init.call_args[1]['ssl'],
+                          contexts.context(verify=True))
+
+            PooledConnector(loop=self.loop, ssl=False)
+            self.assertIs(init.call_args[1]['ssl'], False)
+
+
+class PooledConnectorServerTests(unittest.TestCase):
+    """
+    Requests through a client's own pool to a local server.
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+        @asyncio.coroutine
+        def hello(request):
+            return web.Response(body=b'hello')
+
+        app = web.Application()
+        app.router.add_get('/', hello)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.addCleanup(self.loop.run_until_complete, runner.cleanup())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = 'http://127.0.0.1:{0}/'.format(self.port)
+
+    def test_requests_reuse_connection(self):
+        client = HTTPClient(limit=4, max_lifetime=60, loop=self.loop)
+        self.addCleanup(self.loop.run_until_complete, client.close())
+
+        @asyncio.coroutine
+        def get():
+            resp = yield from client.get(self.url)
+            return (yield from resp.content())
+
+        self.assertEqual(self.loop.run_until_complete(get()), b'hello')
+        self.assertEqual(self.loop.run_until_complete(get()), b'hello')
+
+        self.assertEqual(client.pool_stats(), {
+            '127.0.0.1:{0}'.format(self.port): PoolStats(1, 1, 0, 0)})
+
+
+class OpenConnectionsTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.connector = mock.Mock(limit=100, limit_per_host=0)
+        self.connections = []
+
+        def connect(req, traces, timeout):
+            f = self.loop.create_future()
+            connection = mock.Mock()
+            self.connections.append(connection)
+            f.set_result(connection)
+            return f
+
+        self.connector.connect.side_effect = connect
+
+    def open(self, count, **kwargs):
+        return self.loop.run_until_complete(open_connections(
+            self.connector, 'https://example.com/', count, loop=self.loop,
+            **kwargs))
+
+    def test_parks_connections(self):
+        self.assertEqual(self.open(3), (3, 0))
+
+        self.assertEqual(self.connector.connect.call_count, 3)
+        for connection in self.connections:
+            connection.release.assert_called_once_with()
+
+        req = self.connector.connect.call_args[0][0]
+        self.assertEqual(req.host, 'example.com')
+        self.assertEqual(req.port, 443)
+        self.assertIsNone(req.ssl)
+
+    def test_unverified(self):
+        self.open(1, verify=False)
+
+        req = self.connector.connect.call_args[0][0]
+        self.assertIs(req.ssl, False)
+
+    def test_capped_by_per_host_limit(self):
+        self.connector.limit_per_host = 2
+
+        self.assertEqual(self.open(5), (2, 0))
+
+    def test_capped_by_global_limit(self):
+        self.connector.limit = 1
+
+        self.assertEqual(self.open(5), (1, 0))
+
+    def test_counts_failures(self):
+        connect = self.connector.connect.side_effect
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                f = self.loop.create_future()
+                f.set_exception(OSError('refused'))
+                return f
+            return connect(*args)
+
+        self.connector.connect.side_effect = flaky
+
+        self.assertEqual(self.open(3), (2, 1))
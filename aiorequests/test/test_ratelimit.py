@@ -0,0 +1,172 @@
+import asyncio
+import unittest
+
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.ratelimit import RateLimiter, TokenBucket
+from aiorequests.test.util import FakeResponse
+
+
+class FakeLoop(object):
+    """
+    Just enough of a loop for :class:`TokenBucket`, with a clock that only
+    moves when told to.
+    """
+    def __init__(self, loop):
+        self._loop = loop
+        self.now = 0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def create_future(self):
+        return self._loop.create_future()
+
+    def call_later(self, delay, callback):
+        handle = mock.Mock()
+        self.timers.append((self.now + delay, callback, handle))
+        return handle
+
+    def advance(self, seconds):
+        self.now += seconds
+        due = [t for t in self.timers if t[0] <= self.now]
+        self.timers = [t for t in self.timers if t[0] > self.now]
+        for _, callback, handle in due:
+            if not handle.cancel.called:
+                callback()
+        self._loop.run_until_complete(asyncio.sleep(0, loop=self._loop))
+
+
+class TokenBucketTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.clock = FakeLoop(self.loop)
+
+    def start(self, bucket, cost=1):
+        return asyncio.ensure_future(bucket.acquire(cost), loop=self.loop)
+
+    def test_burst(self):
+        bucket = TokenBucket(1, burst=3, loop=self.clock)
+        acquired = [self.start(bucket) for _ in range(4)]
+        self.clock.advance(0)
+
+        self.assertEqual([a.done() for a in acquired],
+                         [True, True, True, False])
+        self.assertEqual(bucket.waiting, 1)
+
+        self.clock.advance(1)
+        self.assertTrue(acquired[3].done())
+
+    def test_rate(self):
+        bucket = TokenBucket(2, burst=1, loop=self.clock)
+        acquired = [self.start(bucket) for _ in range(3)]
+        self.clock.advance(0)
+        self.assertEqual(sum(a.done() for a in acquired), 1)
+
+        self.clock.advance(0.5)
+        self.assertEqual(sum(a.done() for a in acquired), 2)
+        self.clock.advance(0.5)
+        self.assertEqual(sum(a.done() for a in acquired), 3)
+
+    def test_weighted_costs_are_served_in_order(self):
+        bucket = TokenBucket(1, burst=5, loop=self.clock)
+        self.start(bucket, 5)
+        self.clock.advance(0)
+
+        big = self.start(bucket, 4)
+        small = self.start(bucket, 1)
+        self.clock.advance(1)
+
+        self.assertFalse(big.done())
+        self.assertFalse(small.done())
+
+        self.clock.advance(3)
+        self.assertTrue(big.done())
+        self.assertFalse(small.done())
+
+    def test_cancelled_waiter_does_not_block(self):
+        bucket = TokenBucket(1, burst=2, loop=self.clock)
+        self.start(bucket, 2)
+        first = self.start(bucket, 2)
+        second = self.start(bucket, 1)
+        self.clock.advance(0)
+
+        first.cancel()
+        self.clock.advance(0)
+        self.clock.advance(1)
+
+        self.assertTrue(second.done())
+
+    def test_cost_larger_than_burst(self):
+        bucket = TokenBucket(1, burst=2, loop=self.clock)
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(bucket.acquire(3))
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_buckets_per_origin(self):
+        limiter = RateLimiter(10, loop=self.loop)
+
+        self.loop.run_until_complete(
+            limiter.acquire('GET', 'https://a.example.com/x'))
+        self.loop.run_until_complete(
+            limiter.acquire('GET', 'https://a.example.com/y'))
+        self.loop.run_until_complete(
+            limiter.acquire('GET', 'http://b.example.com/'))
+
+        buckets = limiter.buckets()
+        self.assertEqual(sorted(buckets), ['http://b.example.com',
+                                           'https://a.example.com'])
+        self.assertAlmostEqual(buckets['https://a.example.com'].tokens, 8,
+                               places=2)
+
+    def test_key_cost_and_limits(self):
+        limiter = RateLimiter(
+            10, loop=self.loop,
+            key=lambda method, url: 'search' if '/search' in url else None,
+            cost=lambda method, url: 3 if method == 'POST' else 1,
+            limits={'search': (1, 5)})
+
+        self.loop.run_until_complete(
+            limiter.acquire('POST', 'http://example.com/search'))
+        self.loop.run_until_complete(
+            limiter.acquire('GET', 'http://example.com/other'))
+
+        bucket = limiter.buckets()['search']
+        self.assertEqual((bucket.rate, bucket.burst), (1, 5))
+        self.assertAlmostEqual(bucket.tokens, 2, places=2)
+        self.assertEqual(list(limiter.buckets()), ['search'])
+
+
+class RateLimitedClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_waits_for_a_token(self):
+        pool = mock.Mock()
+        sent = []
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            sent.append(self.loop.time())
+            return FakeResponse()
+
+        pool.request.side_effect = request
+        client = HTTPClient(pool=pool, loop=self.loop,
+                            rate_limiter=RateLimiter(20, burst=1,
+                                                     loop=self.loop))
+
+        self.loop.run_until_complete(asyncio.gather(
+            *[client.get('http://example.com/') for _ in range(3)],
+            loop=self.loop))
+
+        self.assertGreaterEqual(sent[2] - sent[0], 0.09)
@@ -0,0 +1,150 @@
+import asyncio
+import socket
+import unittest
+
+import mock
+
+from aiorequests.resolver import CachingResolver
+
+
+class FakeResolver(object):
+    def __init__(self, loop):
+        self.loop = loop
+        self.calls = []
+        self.result = [{'hostname': 'example.com', 'host': '192.0.2.1',
+                        'port': 80, 'family': socket.AF_INET, 'proto': 0,
+                        'flags': 0}]
+        self.error = None
+        self.delay = 0
+
+    @asyncio.coroutine
+    def resolve(self, host, port=0, family=socket.AF_INET):
+        self.calls.append((host, port, family))
+        if self.delay:
+            yield from asyncio.sleep(self.delay, loop=self.loop)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    @asyncio.coroutine
+    def close(self):
+        pass
+
+
+class CachingResolverTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.now = 1000.0
+        self.loop.time = lambda: self.now
+        self.fake = FakeResolver(self.loop)
+
+    def resolve(self, resolver, host='example.com', port=80):
+        return self.loop.run_until_complete(resolver.resolve(host, port))
+
+    def test_caches_answers_for_ttl(self):
+        resolver = CachingResolver(self.fake, ttl=30, loop=self.loop)
+
+        first = self.resolve(resolver)
+        self.now += 29
+        second = self.resolve(resolver)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.fake.calls), 1)
+
+        self.now += 2
+        self.resolve(resolver)
+        self.assertEqual(len(self.fake.calls), 2)
+
+    def test_honours_reported_ttl(self):
+        self.fake.result[0]['ttl'] = 5
+        resolver = CachingResolver(self.fake, ttl=30, loop=self.loop)
+
+        self.resolve(resolver)
+        self.now += 6
+        self.resolve(resolver)
+
+        self.assertEqual(len(self.fake.calls), 2)
+
+    def test_negative_caching(self):
+        self.fake.error = socket.gaierror(socket.EAI_NONAME, 'nope')
+        resolver = CachingResolver(self.fake, negative_ttl=5, loop=self.loop)
+
+        self.assertRaises(socket.gaierror, self.resolve, resolver)
+        self.assertRaises(socket.gaierror, self.resolve, resolver)
+        self.assertEqual(len(self.fake.calls), 1)
+
+        self.now += 6
+        self.assertRaises(socket.gaierror, self.resolve, resolver)
+        self.assertEqual(len(self.fake.calls), 2)
+
+    def test_timeout_is_cached_as_failure(self):
+        self.fake.delay = 10
+        del self.loop.time
+        resolver = CachingResolver(self.fake, timeout=0.01, loop=self.loop)
+
+        with self.assertRaises(socket.gaierror) as e:
+            self.resolve(resolver)
+        self.assertEqual(e.exception.errno, socket.EAI_AGAIN)
+
+        self.assertRaises(socket.gaierror, self.resolve, resolver)
+        self.assertEqual(len(self.fake.calls), 1)
+
+    def test_concurrent_lookups_share_a_query(self):
+        resolver = CachingResolver(self.fake, loop=self.loop)
+
+        results = self.loop.run_until_complete(asyncio.gather(
+            resolver.resolve('example.com', 80),
+            resolver.resolve('example.com', 80),
+            loop=self.loop))
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(self.fake.calls), 1)
+
+    def test_overrides(self):
+        resolver = CachingResolver(
+            self.fake, overrides={'example.com': ['127.0.0.1', '::1']},
+            loop=self.loop)
+
+        hosts = self.loop.run_until_complete(
+            resolver.resolve('example.com', 443, family=socket.AF_UNSPEC))
+
+        self.assertEqual([(h['host'], h['port'], h['family']) for h in hosts],
+                         [('127.0.0.1', 443, socket.AF_INET),
+                          ('::1', 443, socket.AF_INET6)])
+        self.assertEqual(self.fake.calls, [])
+
+    def test_overrides_filter_by_family(self):
+        resolver = CachingResolver(
+            self.fake, overrides={'example.com': ['127.0.0.1', '::1']},
+            loop=self.loop)
+
+        hosts = self.resolve(resolver)
+
+        self.assertEqual([h['host'] for h in hosts], ['127.0.0.1'])
+
+    def test_maxsize(self):
+        resolver = CachingResolver(self.fake, maxsize=2, loop=self.loop)
+
+        for host in ('a.example', 'b.example', 'c.example'):
+            self.resolve(resolver, host)
+
+        self.assertEqual(len(resolver._cache), 2)
+        self.resolve(resolver, 'a.example')
+        self.assertEqual(len(self.fake.calls), 4)
+
+    def test_clear(self):
+        resolver = CachingResolver(self.fake, loop=self.loop)
+
+        self.resolve(resolver)
+        resolver.clear()
+        self.resolve(resolver)
+
+        self.assertEqual(len(self.fake.calls), 2)
+
+    def test_default_resolver(self):
+        with mock.patch('aiorequests.resolver.DefaultResolver') as default:
+            resolver = CachingResolver(loop=self.loop)
+
+        default.assert_called_once_with(loop=self.loop)
+        self.assertEqual(resolver._resolver, default.return_value)
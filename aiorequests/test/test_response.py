@@ -1,5 +1,8 @@
+import asyncio
 import unittest
 
+from aiorequests.buffers import BufferPool
+from aiorequests.content import collect, content
 from aiorequests.response import _Response
 
 
@@ -64,3 +67,188 @@ class ResponseTests(unittest.TestCase):
     def test_history_notimplemented(self):
         wrapper = _Response(FakeResponse(200, {}), None)
         self.assertRaises(NotImplementedError, wrapper.history)
+
+
+class FakeStream(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reads = 0
+
+    @asyncio.coroutine
+    def readany(self):
+        self.reads += 1
+        yield from asyncio.sleep(0)
+        return self.chunks.pop(0) if self.chunks else b''
+
+    @asyncio.coroutine
+    def read(self, n):
+        chunk = yield from self.readany()
+        if len(chunk) > n:
+            self.chunks.insert(0, chunk[n:])
+            chunk = chunk[:n]
+        return chunk
+
+
+class FakeStreamingResponse(object):
+    url = 'http://example.com/'
+    status = 200
+    version = (1, 1)
+    reason = 'OK'
+    headers = {}
+
+    def __init__(self, chunks, headers=None):
+        self.content = FakeStream(chunks)
+        self.headers = headers or {}
+
+
+class FakeInMemoryResponse(FakeStreamingResponse):
+    def __init__(self, body):
+        self.body = body
+
+    @asyncio.coroutine
+    def read(self):
+        return self.body
+
+
+@asyncio.coroutine
+def drain(iterator):
+    items = []
+    while True:
+        try:
+            items.append((yield from iterator.__anext__()))
+        except StopAsyncIteration:
+            return items
+
+
+class StreamingTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def drain(self, iterator):
+        self.assertIs(iterator.__aiter__(), iterator)
+        return self.loop.run_until_complete(drain(iterator))
+
+    def test_iter_chunks(self):
+        response = _Response(FakeStreamingResponse([b'ab', b'cde']), None)
+
+        self.assertEqual(self.drain(response.iter_chunks()), [b'ab', b'cde'])
+
+    def test_iter_content(self):
+        response = _Response(FakeStreamingResponse([b'abcde', b'f']), None)
+
+        self.assertEqual(self.drain(response.iter_content(2)),
+                         [b'ab', b'cd', b'e', b'f'])
+
+    def test_iter_content_of_a_body_in_memory(self):
+        response = _Response(FakeInMemoryResponse(b'abcde'), None)
+
+        self.assertEqual(self.drain(response.iter_content(2)),
+                         [b'ab', b'cd', b'e'])
+
+    def test_iter_lines(self):
+        response = _Response(
+            FakeStreamingResponse([b'one\r\ntw', b'o\n\nthr', b'ee']), None)
+
+        self.assertEqual(self.drain(response.iter_lines()),
+                         [b'one', b'two', b'', b'three'])
+
+    def test_iter_lines_with_delimiter(self):
+        response = _Response(FakeStreamingResponse([b'a;b', b';c;']), None)
+
+        self.assertEqual(self.drain(response.iter_lines(delimiter=b';')),
+                         [b'a', b'b', b'c'])
+
+    def test_collect_waits_for_the_collector(self):
+        response = _Response(FakeStreamingResponse([b'a', b'b', b'c']), None)
+        stream = response.original.content
+        seen = []
+
+        @asyncio.coroutine
+        def collector(chunk):
+            # Nothing more is read while a chunk is being handled.
+            seen.append((chunk, stream.reads))
+            yield from asyncio.sleep(0)
+
+        self.loop.run_until_complete(collect(response, collector))
+
+        self.assertEqual(seen, [(b'a', 1), (b'b', 2), (b'c', 3)])
+
+    def test_content(self):
+        response = _Response(FakeStreamingResponse([b'a', b'bc']), None)
+
+        self.assertEqual(self.loop.run_until_complete(content(response)),
+                         b'abc')
+
+    def test_content_of_native_coroutines(self):
+        original = FakeInMemoryResponse(None)
+        original.read = lambda: asyncio.sleep(0, b'body', loop=self.loop)
+        response = _Response(original, None)
+
+        @asyncio.coroutine
+        def read():
+            return (yield from response.content())
+
+        self.assertEqual(self.loop.run_until_complete(read()), b'body')
+
+
+class ReadIntoTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_coroutine(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_readinto(self):
+        response = _Response(FakeStreamingResponse([b'abc', b'defg']), None)
+        buffer = bytearray(5)
+
+        self.assertEqual(self.run_coroutine(response.readinto(buffer)), 5)
+        self.assertEqual(buffer, b'abcde')
+        self.assertEqual(self.run_coroutine(response.readinto(buffer)), 2)
+        self.assertEqual(buffer[:2], b'fg')
+        self.assertEqual(self.run_coroutine(response.readinto(buffer)), 0)
+
+    def test_readinto_a_memoryview(self):
+        response = _Response(FakeInMemoryResponse(b'abcdef'), None)
+        buffer = bytearray(8)
+
+        n = self.run_coroutine(response.readinto(memoryview(buffer)[2:]))
+
+        self.assertEqual(n, 6)
+        self.assertEqual(buffer, b'\0\0abcdef')
+
+    def test_body_is_sized_by_content_length(self):
+        pool = BufferPool(min_size=4)
+        original = FakeStreamingResponse([b'abc', b'def'],
+                                         headers={'Content-Length': '6'})
+        response = _Response(original, None, buffer_pool=pool)
+
+        body = self.run_coroutine(response.body())
+
+        self.assertEqual(body.view.tobytes(), b'abcdef')
+        self.assertEqual(pool.allocated, 1)
+        body.release()
+        self.assertEqual(pool.idle_bytes, 8)
+
+    def test_body_grows_without_content_length(self):
+        pool = BufferPool(min_size=4)
+        original = FakeStreamingResponse([b'abc', b'defgh', b'ijklmnopq'])
+        response = _Response(original, None, buffer_pool=pool)
+
+        with self.run_coroutine(response.body()) as body:
+            self.assertEqual(bytes(body), b'abcdefghijklmnopq')
+
+        # The smaller buffers were given back while growing.
+        self.assertEqual(pool.allocated, 4)
+        self.assertEqual(pool.idle_bytes, 4 + 8 + 16 + 32)
+
+    def test_body_that_fills_the_buffer_exactly(self):
+        pool = BufferPool(min_size=4)
+        response = _Response(FakeStreamingResponse([b'abcd']), None,
+                             buffer_pool=pool)
+
+        with self.run_coroutine(response.body()) as body:
+            self.assertEqual(bytes(body), b'abcd')
+        self.assertEqual(pool.allocated, 1)
@@ -0,0 +1,258 @@
+import asyncio
+import io
+import tempfile
+import unittest
+
+import aiohttp
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.retry import RetryBudget, RetryPolicy, replayable_body
+from aiorequests.test.util import FakeResponse
+
+
+class FakeWriter(object):
+    def __init__(self):
+        self.chunks = []
+
+    @asyncio.coroutine
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+
+class RetryBudgetTests(unittest.TestCase):
+    def test_reserve(self):
+        budget = RetryBudget(ratio=0.5, reserve=2)
+
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+    def test_ratio(self):
+        budget = RetryBudget(ratio=0.25, reserve=1)
+        budget.withdraw()
+
+        allowed = 0
+        for _ in range(100):
+            budget.deposit()
+            allowed += budget.withdraw()
+
+        self.assertEqual(allowed, 25)
+
+    def test_balance_capped_by_reserve(self):
+        budget = RetryBudget(ratio=1, reserve=2)
+        for _ in range(10):
+            budget.deposit()
+
+        self.assertEqual(budget.balance, 2)
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.sleeps = []
+
+        @asyncio.coroutine
+        def sleep(delay, loop=None):
+            self.sleeps.append(delay)
+
+        patcher = mock.patch('asyncio.sleep', sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, policy, outcomes):
+        outcomes = list(outcomes)
+
+        @asyncio.coroutine
+        def send():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return self.loop.run_until_complete(policy.call(send, loop=self.loop))
+
+    def test_full_jitter(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, random=lambda: 0.5)
+
+        self.assertEqual([policy.delay(n) for n in range(1, 6)],
+                         [0.5, 1, 2, 2.5, 2.5])
+
+    def test_retry_after(self):
+        policy = RetryPolicy(random=lambda: 0.5)
+
+        self.assertEqual(
+            policy.delay(1, FakeResponse(503, {'Retry-After': '7'})), 7)
+        self.assertIsNone(
+            policy.delay(1, FakeResponse(503, {'Retry-After': '3600'})))
+        self.assertEqual(
+            policy.delay(1, FakeResponse(503, {'Retry-After': 'soon'})), 0.05)
+        self.assertEqual(
+            RetryPolicy(retry_after=False, random=lambda: 1).delay(
+                1, FakeResponse(503, {'Retry-After': '7'})), 0.1)
+
+    def test_retries_statuses(self):
+        policy = RetryPolicy(random=lambda: 1)
+        failed = FakeResponse(503)
+
+        resp = self.call(policy, [failed, FakeResponse(200)])
+
+        self.assertEqual(resp.status, 200)
+        self.assertTrue(failed.released)
+        self.assertEqual(self.sleeps, [0.1])
+        self.assertEqual((policy.attempts, policy.retries), (2, 1))
+
+    def test_retries_exceptions(self):
+        policy = RetryPolicy(random=lambda: 1)
+
+        resp = self.call(policy, [aiohttp.ClientConnectionError(),
+                                  asyncio.TimeoutError(), FakeResponse(200)])
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(self.sleeps, [0.1, 0.2])
+
+    def test_other_exceptions_are_raised(self):
+        policy = RetryPolicy()
+
+        with self.assertRaises(ValueError):
+            self.call(policy, [ValueError()])
+        self.assertEqual(policy.retries, 0)
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=2)
+
+        resp = self.call(policy, [FakeResponse(503), FakeResponse(502)])
+        self.assertEqual(resp.status, 502)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.call(policy, [asyncio.TimeoutError(),
+                               asyncio.TimeoutError()])
+
+    def test_budget_exhausted(self):
+        policy = RetryPolicy(budget=RetryBudget(ratio=0, reserve=1))
+
+        self.call(policy, [FakeResponse(503), FakeResponse(200)])
+        resp = self.call(policy, [FakeResponse(503)])
+
+        self.assertEqual(resp.status, 503)
+        self.assertFalse(resp.released)
+        self.assertEqual(policy.budget_exhausted, 1)
+        self.assertEqual(policy.attempts, 3)
+
+
+class ReplayableBodyTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def write(self, payload):
+        writer = FakeWriter()
+        self.loop.run_until_complete(payload.write(writer))
+        return b''.join(writer.chunks)
+
+    def test_plain_bodies(self):
+        for data in (None, b'body', 'body', {'a': 'b'}):
+            self.assertEqual(replayable_body(data), (data, []))
+
+    def test_file_is_sent_from_the_start_every_time(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b'header:payload')
+            f.seek(len(b'header:'))
+
+            body, payloads = replayable_body(f)
+
+            self.assertEqual(payloads, [body])
+            self.assertEqual(body.size, len(b'payload'))
+            self.assertEqual(self.write(body), b'payload')
+            self.assertEqual(self.write(body), b'payload')
+            self.assertFalse(f.closed)
+
+            body.close()
+            self.assertTrue(f.closed)
+
+    def test_converted_files(self):
+        fobj = io.BytesIO(b'content')
+        data = [('a', 'b'), ('file', ('name.txt', 'text/plain', fobj))]
+
+        body, payloads = replayable_body(data)
+
+        self.assertEqual(body[0], ('a', 'b'))
+        self.assertIs(body[1][1][2], payloads[0])
+        self.assertEqual(payloads[0].size, 7)
+        self.assertEqual(self.write(payloads[0]), b'content')
+        self.assertEqual(self.write(payloads[0]), b'content')
+
+    def test_iterators_are_not_replayable(self):
+        data = iter([b'a', b'b'])
+
+        self.assertEqual(replayable_body(data), (data, None))
+
+
+class RetryingClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.responses = []
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            outcome = self.responses.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.pool.request.side_effect = request
+        self.policy = RetryPolicy(backoff=0)
+        self.client = HTTPClient(pool=self.pool, retry=self.policy,
+                                 loop=self.loop)
+
+    def test_retries_idempotent_requests(self):
+        self.responses.extend([aiohttp.ClientConnectionError(),
+                               FakeResponse(503), FakeResponse(200)])
+
+        resp = self.loop.run_until_complete(
+            self.client.put('http://example.com/', data=b'body'))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.pool.request.call_count, 3)
+        self.assertEqual(self.policy.attempts, 3)
+
+    def test_does_not_retry_post(self):
+        self.responses.append(FakeResponse(503))
+
+        resp = self.loop.run_until_complete(
+            self.client.post('http://example.com/', data=b'body'))
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(self.policy.attempts, 0)
+
+    def test_does_not_retry_iterator_bodies(self):
+        self.responses.append(FakeResponse(503))
+
+        resp = self.loop.run_until_complete(
+            self.client.put('http://example.com/', data=iter([b'a'])))
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(self.pool.request.call_count, 1)
+
+    def test_disabled_per_request(self):
+        self.responses.append(FakeResponse(503))
+
+        resp = self.loop.run_until_complete(
+            self.client.get('http://example.com/', retry=False))
+
+        self.assertEqual(resp.status_code, 503)
+
+    def test_replays_file_body(self):
+        fobj = io.BytesIO(b'content')
+        self.responses.extend([FakeResponse(503), FakeResponse(200)])
+
+        self.loop.run_until_complete(
+            self.client.put('http://example.com/', data=fobj))
+
+        payloads = [call[1]['data'] for call in
+                    self.pool.request.call_args_list]
+        self.assertIs(payloads[0], payloads[1])
+        self.assertTrue(fobj.closed)
@@ -0,0 +1,202 @@
+import asyncio
+import io
+import unittest
+
+import aiohttp
+import mock
+
+from aiohttp import web
+
+from aiorequests.client import HTTPClient
+from aiorequests.streaming import StreamingBody, stream_kind
+
+
+class FakeWriter(object):
+    def __init__(self, loop, blocked=False):
+        self.chunks = []
+        self.unblocked = asyncio.Event(loop=loop)
+        if not blocked:
+            self.unblocked.set()
+
+    @asyncio.coroutine
+    def write(self, chunk):
+        self.chunks.append(bytes(chunk))
+        yield from self.unblocked.wait()
+
+
+class AsyncFile(object):
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+        self.sizes = []
+
+    @asyncio.coroutine
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return self.file.read(size)
+
+
+class AsyncChunks(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        yield from asyncio.sleep(0)
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class StreamingBodyTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def write(self, body, writer=None):
+        writer = writer or FakeWriter(self.loop)
+        self.loop.run_until_complete(body.write(writer))
+        return writer.chunks
+
+    def test_generator(self):
+        body = StreamingBody(c for c in [b'a', 'b', b'', bytearray(b'c')])
+
+        self.assertIsNone(body.size)
+        self.assertEqual(body.content_type, 'application/octet-stream')
+        self.assertEqual(self.write(body), [b'a', b'b', b'c'])
+
+    def test_async_iterator(self):
+        body = StreamingBody(AsyncChunks([b'a', b'bc']))
+
+        self.assertEqual(self.write(body), [b'a', b'bc'])
+
+    def test_async_file(self):
+        source = AsyncFile(b'abcde')
+        body = StreamingBody(source, size=5, chunk_size=2)
+
+        self.assertEqual(body.size, 5)
+        self.assertEqual(self.write(body), [b'ab', b'cd', b'e'])
+        self.assertEqual(source.sizes, [2, 2, 2, 2])
+
+    def test_size_mismatch(self):
+        self.assertRaises(ValueError, self.write,
+                          StreamingBody(iter([b'abc']), size=4))
+        self.assertRaises(ValueError, self.write,
+                          StreamingBody(iter([b'abc', b'de']), size=4))
+
+    def test_sent_once(self):
+        body = StreamingBody(iter([b'a']))
+        self.write(body)
+
+        self.assertRaises(RuntimeError, self.write, body)
+
+    def test_back_pressure(self):
+        produced = []
+
+        def chunks():
+            for chunk in [b'a', b'b', b'c']:
+                produced.append(chunk)
+                yield chunk
+        writer = FakeWriter(self.loop, blocked=True)
+        task = self.loop.create_task(StreamingBody(chunks()).write(writer))
+
+        self.loop.run_until_complete(asyncio.sleep(0.01, loop=self.loop))
+        self.assertEqual(produced, [b'a'])
+
+        writer.unblocked.set()
+        self.loop.run_until_complete(task)
+        self.assertEqual(produced, [b'a', b'b', b'c'])
+
+    def test_cannot_be_decoded(self):
+        body = StreamingBody(iter([b'a']))
+
+        self.assertRaises(TypeError, body.decode)
+        self.assertEqual(self.write(body), [b'a'])
+
+    def test_not_a_stream(self):
+        self.assertRaises(TypeError, StreamingBody, b'abc')
+
+    def test_stream_kind(self):
+        self.assertEqual(stream_kind(AsyncFile(b'')), 'file')
+        self.assertEqual(stream_kind(AsyncChunks([])), 'async')
+        self.assertEqual(stream_kind(x for x in []), 'sync')
+        self.assertEqual(stream_kind(iter([b'a'])), 'sync')
+        self.assertIsNone(stream_kind(io.BytesIO(b'')))
+        self.assertIsNone(stream_kind([b'a']))
+        self.assertIsNone(stream_kind(b'a'))
+        self.assertIsNone(stream_kind({'a': 'b'}))
+
+
+class StreamingRequestTests(unittest.TestCase):
+    """
+    Stream bodies to a local server.
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.received = []
+
+        @asyncio.coroutine
+        def echo(request):
+            body = yield from request.read()
+            self.received.append((dict(request.headers), body))
+            return web.Response(body=b'ok')
+
+        app = web.Application()
+        app.router.add_post('/', echo)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.addCleanup(self.loop.run_until_complete, self.runner.cleanup())
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = 'http://127.0.0.1:{0}/'.format(port)
+
+        session = aiohttp.ClientSession(loop=self.loop)
+        self.addCleanup(self.loop.run_until_complete, session.close())
+        self.client = HTTPClient(pool=session, loop=self.loop)
+
+    def post(self, data, **kwargs):
+        resp = self.loop.run_until_complete(
+            self.client.post(self.url, data=data, **kwargs))
+        self.assertEqual(resp.status_code, 200)
+        return self.received[-1]
+
+    def test_chunked(self):
+        headers, body = self.post(c for c in [b'abc', 'def'])
+
+        self.assertEqual(body, b'abcdef')
+        self.assertEqual(headers['Transfer-Encoding'], 'chunked')
+        self.assertNotIn('Content-Length', headers)
+
+    def test_content_length_header(self):
+        headers, body = self.post(AsyncChunks([b'abc', b'def']),
+                                  headers={'Content-Length': '6'})
+
+        self.assertEqual(body, b'abcdef')
+        self.assertEqual(headers['Content-Length'], '6')
+        self.assertNotIn('Transfer-Encoding', headers)
+
+    def test_streaming_body_with_size(self):
+        headers, body = self.post(StreamingBody(
+            AsyncFile(b'x' * 100000), size=100000, content_type='text/plain'))
+
+        self.assertEqual(body, b'x' * 100000)
+        self.assertEqual(headers['Content-Length'], '100000')
+        self.assertEqual(headers['Content-Type'], 'text/plain')
+
+    def test_streaming_body_is_not_retried(self):
+        policy = mock.Mock()
+        policy.retries_method.return_value = True
+
+        headers, body = self.post(iter([b'abc']), retry=policy)
+
+        self.assertEqual(body, b'abc')
+        self.assertFalse(policy.call.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
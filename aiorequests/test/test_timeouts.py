@@ -0,0 +1,233 @@
+import asyncio
+import unittest
+
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.test.util import FakeResponse
+from aiorequests.timeouts import (
+    ConnectTimeout, Deadlines, FirstByteTimeout, PoolTimeout, ReadTimeout,
+    RequestTimeout, TimerWheel, Timeouts, TotalTimeout, trace_config
+)
+
+
+class FakeStream(object):
+    def __init__(self):
+        self.total_bytes = 0
+        self.eof = False
+
+    def at_eof(self):
+        return self.eof
+
+
+class TimeoutsTests(unittest.TestCase):
+    def test_coerce(self):
+        timeouts = Timeouts(connect=1)
+
+        self.assertIs(Timeouts.coerce(timeouts), timeouts)
+        self.assertEqual(Timeouts.coerce(5).total, 5)
+        self.assertFalse(Timeouts.coerce(None))
+        self.assertTrue(timeouts)
+
+    def test_exceptions(self):
+        error = ConnectTimeout(2)
+
+        self.assertIsInstance(error, asyncio.TimeoutError)
+        self.assertIsInstance(error, RequestTimeout)
+        self.assertEqual(error.phase, 'connect')
+        self.assertEqual(str(error), 'connect timeout of 2s expired.')
+
+
+class TimerWheelTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_one_loop_timer_for_many_callbacks(self):
+        wheel = TimerWheel(resolution=0.01, loop=self.loop)
+        fired = []
+        with mock.patch.object(self.loop, 'call_at',
+                               wraps=self.loop.call_at) as call_at:
+            for i in range(1000):
+                wheel.call_later(0.02, fired.append, i)
+
+        self.assertEqual(call_at.call_count, 1)
+        self.assertEqual(len(wheel), 1000)
+
+        self.loop.run_until_complete(asyncio.sleep(0.05, loop=self.loop))
+
+        self.assertEqual(sorted(fired), list(range(1000)))
+        self.assertEqual(len(wheel), 0)
+
+    def test_order_and_cancel(self):
+        wheel = TimerWheel(resolution=0.01, loop=self.loop)
+        fired = []
+        wheel.call_later(0.04, fired.append, 'late')
+        wheel.call_later(0.01, fired.append, 'early')
+        wheel.call_later(0.02, fired.append, 'cancelled').cancel()
+
+        self.loop.run_until_complete(asyncio.sleep(0.08, loop=self.loop))
+
+        self.assertEqual(fired, ['early', 'late'])
+
+
+class DeadlinesTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.wheel = TimerWheel(resolution=0.005, loop=self.loop)
+
+    def guard(self, deadlines, awaitable):
+        return self.loop.run_until_complete(deadlines.guard(awaitable))
+
+    def test_total(self):
+        deadlines = Deadlines(Timeouts(total=0.01), self.wheel)
+
+        with self.assertRaises(TotalTimeout):
+            self.guard(deadlines, asyncio.sleep(1, loop=self.loop))
+
+    def test_in_time(self):
+        deadlines = Deadlines(Timeouts(total=1), self.wheel)
+
+        self.assertEqual(
+            self.guard(deadlines, asyncio.sleep(0, 'done', loop=self.loop)),
+            'done')
+        deadlines.close()
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_phases(self):
+        timeouts = Timeouts(pool=0.01, connect=0.01, first_byte=0.01)
+        for hook, error in (('connection_queued', PoolTimeout),
+                            ('connecting', ConnectTimeout),
+                            ('connected', FirstByteTimeout)):
+            deadlines = Deadlines(timeouts, self.wheel)
+            getattr(deadlines, hook)()
+
+            with self.assertRaises(error):
+                self.guard(deadlines, asyncio.sleep(1, loop=self.loop))
+
+    def test_finished_phases_are_disarmed(self):
+        deadlines = Deadlines(Timeouts(connect=0.01, first_byte=0.01),
+                              self.wheel)
+        deadlines.connecting()
+        deadlines.connected()
+        deadlines.headers_received()
+
+        self.assertEqual(
+            self.guard(deadlines, asyncio.sleep(0.03, 'ok', loop=self.loop)),
+            'ok')
+
+    def test_expired_while_unguarded(self):
+        deadlines = Deadlines(Timeouts(total=0.01), self.wheel)
+        self.loop.run_until_complete(asyncio.sleep(0.03, loop=self.loop))
+
+        with self.assertRaises(TotalTimeout):
+            self.guard(deadlines, asyncio.sleep(0, loop=self.loop))
+
+    def test_total_takes_back_its_cancellation(self):
+        deadlines = Deadlines(Timeouts(total=0.01), self.wheel)
+        tasks = []
+
+        def current_task():
+            task = asyncio.Task.current_task(loop=self.loop)
+            proxy = mock.Mock(cancel=task.cancel)
+            proxy.uncancel.return_value = 0
+            tasks.append(proxy)
+            return proxy
+
+        with mock.patch('aiorequests.timeouts._current_task', current_task):
+            with self.assertRaises(TotalTimeout):
+                self.guard(deadlines, asyncio.sleep(1, loop=self.loop))
+
+        tasks[0].uncancel.assert_called_once_with()
+
+    def test_cancelled_by_someone_else_too(self):
+        deadlines = Deadlines(Timeouts(total=0.01), self.wheel)
+
+        def current_task():
+            task = asyncio.Task.current_task(loop=self.loop)
+            # Still cancelled once our cancellation is taken back.
+            return mock.Mock(cancel=task.cancel,
+                             uncancel=mock.Mock(return_value=1))
+
+        with mock.patch('aiorequests.timeouts._current_task', current_task):
+            with self.assertRaises(asyncio.CancelledError):
+                self.guard(deadlines, asyncio.sleep(1, loop=self.loop))
+
+    def test_read_idle(self):
+        deadlines = Deadlines(Timeouts(read=0.02), self.wheel)
+        response = FakeResponse(body=self.loop.create_future(),
+                                content=FakeStream())
+
+        @asyncio.coroutine
+        def trickle():
+            for _ in range(4):
+                yield from asyncio.sleep(0.01, loop=self.loop)
+                response.content.total_bytes += 1
+            response.body.set_result(b'body')
+
+        asyncio.ensure_future(trickle(), loop=self.loop)
+        self.assertEqual(self.loop.run_until_complete(
+            deadlines.guard_read(response, response.read())), b'body')
+
+        response = FakeResponse(body=self.loop.create_future(),
+                                content=FakeStream())
+        with self.assertRaises(ReadTimeout):
+            self.loop.run_until_complete(
+                deadlines.guard_read(response, response.read()))
+
+    def test_trace_config(self):
+        config = trace_config()
+
+        self.assertEqual(len(config.on_connection_create_start), 1)
+        self.assertEqual(len(config.on_request_end), 1)
+
+
+class ClientTimeoutTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.pool = mock.Mock()
+        self.client = HTTPClient(pool=self.pool, loop=self.loop)
+        self.client._wheel.resolution = 0.005
+
+    def test_first_byte(self):
+        @asyncio.coroutine
+        def request(method, url, trace_request_ctx=None, **kwargs):
+            trace_request_ctx.connecting()
+            trace_request_ctx.connected()
+            yield from asyncio.sleep(1, loop=self.loop)
+
+        self.pool.request.side_effect = request
+
+        with self.assertRaises(FirstByteTimeout):
+            self.loop.run_until_complete(self.client.get(
+                'http://example.com/',
+                timeout=Timeouts(connect=1, first_byte=0.01)))
+
+    def test_total_covers_the_body(self):
+        response = FakeResponse(body=self.loop.create_future(),
+                                content=FakeStream())
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return response
+
+        self.pool.request.side_effect = request
+
+        resp = self.loop.run_until_complete(
+            self.client.get('http://example.com/', timeout=0.01))
+
+        with self.assertRaises(TotalTimeout):
+            self.loop.run_until_complete(resp.content())
+
+    def test_no_timeouts(self):
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            self.assertNotIn('trace_request_ctx', kwargs)
+            return FakeResponse(body=self.loop.create_future(),
+                                content=FakeStream())
+
+        self.pool.request.side_effect = request
+
+        self.loop.run_until_complete(self.client.get('http://example.com/'))
@@ -0,0 +1,136 @@
+import os
+import ssl
+import unittest
+
+import mock
+
+from aiorequests.pool import _tls_sessions
+from aiorequests.tls import (
+    ResumingSSLContext, SSLContextCache, TLSSessionStore
+)
+
+
+SERVER_PEM = os.path.join(os.path.dirname(__file__), 'server.pem')
+
+
+def _handshake(client_context, server_context, hostname='localhost'):
+    """
+    Run a TLS handshake between two contexts over memory BIOs and return
+    the client ``SSLObject``.
+    """
+    client_in, client_out = ssl.MemoryBIO(), ssl.MemoryBIO()
+    server_in, server_out = ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = client_context.wrap_bio(client_in, client_out,
+                                     server_hostname=hostname)
+    server = server_context.wrap_bio(server_in, server_out, server_side=True)
+
+    done = set()
+    while len(done) < 2:
+        for name, obj in (('client', client), ('server', server)):
+            if name in done:
+                continue
+            try:
+                obj.do_handshake()
+                done.add(name)
+            except ssl.SSLWantReadError:
+                pass
+            server_in.write(client_out.read())
+            client_in.write(server_out.read())
+
+    return client
+
+
+class SSLContextCacheTests(unittest.TestCase):
+    def test_same_settings_share_a_context(self):
+        cache = SSLContextCache()
+
+        self.assertIs(cache.context(), cache.context(verify=True))
+        self.assertIsInstance(cache.context(), ResumingSSLContext)
+
+    def test_verification_settings(self):
+        cache = SSLContextCache()
+
+        verified = cache.context()
+        unverified = cache.context(verify=False)
+
+        self.assertIsNot(verified, unverified)
+        self.assertEqual(verified.verify_mode, ssl.CERT_REQUIRED)
+        self.assertTrue(verified.check_hostname)
+        self.assertEqual(unverified.verify_mode, ssl.CERT_NONE)
+        self.assertFalse(unverified.check_hostname)
+        self.assertEqual(len(cache.contexts()), 2)
+
+    def test_each_context_has_its_own_sessions(self):
+        cache = SSLContextCache()
+
+        self.assertIsNot(cache.context().sessions,
+                         cache.context(verify=False).sessions)
+
+
+class TLSSessionStoreTests(unittest.TestCase):
+    def test_maxsize(self):
+        store = TLSSessionStore(maxsize=2)
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.set('c', 3)
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(store.get('c'), 3)
+
+    def test_ignores_missing_session(self):
+        store = TLSSessionStore()
+        store.set('a', None)
+        self.assertEqual(len(store), 0)
+
+    def test_discard(self):
+        store = TLSSessionStore()
+        store.set('a', 1)
+        store.discard('a')
+        self.assertIsNone(store.get('a'))
+
+
+class SessionResumptionTests(unittest.TestCase):
+    def setUp(self):
+        self.server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.server_context.load_cert_chain(SERVER_PEM)
+        # TLS 1.2 hands out the session with the handshake, TLS 1.3 only
+        # after application data has been read.
+        self.server_context.options |= getattr(ssl, 'OP_NO_TLSv1_3', 0)
+
+        self.context = SSLContextCache().context(cafile=SERVER_PEM)
+
+    def test_second_connection_resumes(self):
+        first = _handshake(self.context, self.server_context)
+        self.context.sessions.record(first)
+        second = _handshake(self.context, self.server_context)
+        self.context.sessions.record(second)
+
+        self.assertFalse(first.session_reused)
+        self.assertTrue(second.session_reused)
+        self.assertEqual(self.context.sessions.full_handshakes, 1)
+        self.assertEqual(self.context.sessions.resumed, 1)
+
+    def test_sessions_are_per_host(self):
+        first = _handshake(self.context, self.server_context)
+        self.context.sessions.record(first)
+
+        self.context.check_hostname = False
+        other = _handshake(self.context, self.server_context, 'other')
+
+        self.assertFalse(other.session_reused)
+
+    def test_tls_sessions_of_a_connection(self):
+        ssl_object = _handshake(self.context, self.server_context)
+        protocol = mock.Mock()
+        protocol.transport.get_extra_info.return_value = ssl_object
+
+        self.assertEqual(_tls_sessions(protocol),
+                         (ssl_object, self.context.sessions))
+
+    def test_tls_sessions_of_a_plain_connection(self):
+        protocol = mock.Mock()
+        protocol.transport.get_extra_info.return_value = None
+
+        self.assertEqual(_tls_sessions(protocol), (None, None))
@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+
+import mock
+
+from aiorequests.client import HTTPClient
+from aiorequests.test.util import FakeResponse
+from aiorequests.urls import BaseURL, EncodedParams, PathTemplate
+
+
+class EncodedParamsTests(unittest.TestCase):
+    def test_encodes_once(self):
+        params = EncodedParams([('a', 1), ('b', ['x y', 'z'])])
+
+        self.assertEqual(params.query, 'a=1&b=x+y&b=z')
+        self.assertEqual(str(params), 'a=1&b=x+y&b=z')
+
+    def test_takes_an_encoded_string(self):
+        self.assertEqual(EncodedParams('a=1').query, 'a=1')
+        self.assertFalse(EncodedParams(''))
+        self.assertEqual(EncodedParams({'a': 1}), EncodedParams('a=1'))
+
+
+class BaseURLTests(unittest.TestCase):
+    def test_joins_relative_urls(self):
+        base = BaseURL('https://api.example.com/v1')
+
+        self.assertEqual(base.join('users'),
+                         'https://api.example.com/v1/users')
+        self.assertEqual(base.join('/users?page=2'),
+                         'https://api.example.com/v1/users?page=2')
+        self.assertEqual(base.join(''), 'https://api.example.com/v1/')
+
+    def test_urls_in_the_query_are_joined(self):
+        base = BaseURL('https://api.example.com/v1')
+
+        self.assertEqual(
+            base.join('login?next=https://other.example/cb'),
+            'https://api.example.com/v1/login?next=https://other.example/cb')
+
+    def test_absolute_urls_are_kept(self):
+        base = BaseURL('https://api.example.com/v1/')
+
+        self.assertEqual(base.join('http://other.com/x'),
+                         'http://other.com/x')
+        self.assertEqual(base.join('mailto:a@example.com'),
+                         'mailto:a@example.com')
+
+    def test_ports_are_not_schemes(self):
+        base = BaseURL('https://api.example.com/v1/')
+
+        self.assertEqual(base.join('users:8080'),
+                         'https://api.example.com/v1/users:8080')
+        self.assertEqual(base.join('2020-01-01T10:00'),
+                         'https://api.example.com/v1/2020-01-01T10:00')
+
+    def test_rejects_bad_bases(self):
+        self.assertRaises(ValueError, BaseURL, '/v1')
+        self.assertRaises(ValueError, BaseURL, 'https://example.com/?a=1')
+
+
+class PathTemplateTests(unittest.TestCase):
+    def test_expand(self):
+        template = PathTemplate('/users/{user}/posts/{post}')
+
+        self.assertEqual(template.fields, frozenset(['user', 'post']))
+        self.assertEqual(template.expand(user='a b/c', post=7),
+                         '/users/a%20b%2Fc/posts/7')
+
+    def test_missing_field(self):
+        self.assertRaises(KeyError, PathTemplate('/{id}').expand)
+
+    def test_plain_fields_only(self):
+        self.assertRaises(ValueError, PathTemplate, '/{id:>10}')
+        self.assertRaises(ValueError, PathTemplate, '/{}')
+
+
+class ClientURLTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.pool = mock.Mock()
+
+        @asyncio.coroutine
+        def request(method, url, **kwargs):
+            return FakeResponse()
+
+        self.pool.request.side_effect = request
+
+    def requested_url(self, client, url, **kwargs):
+        self.loop.run_until_complete(client.get(url, **kwargs))
+        return self.pool.request.call_args[0][1]
+
+    def test_base_url(self):
+        client = HTTPClient(pool=self.pool, loop=self.loop,
+                            base_url='https://api.example.com/v1/')
+        users = PathTemplate('/users/{id}')
+
+        self.assertEqual(
+            self.requested_url(client, users.expand(id=42),
+                               params=EncodedParams({'full': 1})),
+            'https://api.example.com/v1/users/42?full=1')
+        self.assertEqual(self.requested_url(client, 'https://other.com/'),
+                         'https://other.com/')
+
+    def test_query_params_are_appended(self):
+        client = HTTPClient(pool=self.pool, loop=self.loop)
+
+        self.assertEqual(
+            self.requested_url(client, 'http://example.com/?a=1',
+                               params=EncodedParams('b=2')),
+            'http://example.com/?a=1&b=2')
+        self.assertEqual(
+            self.requested_url(client, 'http://example.com/?',
+                               params={'b': 2}),
+            'http://example.com/?b=2')
+        self.assertEqual(
+            self.requested_url(client, 'http://example.com/p?a=1#frag',
+                               params={'b': 2}),
+            'http://example.com/p?a=1&b=2#frag')
+
+    def test_empty_query_adds_nothing(self):
+        client = HTTPClient(pool=self.pool, loop=self.loop)
+
+        self.assertEqual(
+            self.requested_url(client, 'http://example.com/',
+                               params={'a': []}),
+            'http://example.com/')
+        self.assertEqual(
+            self.requested_url(client, 'http://example.com/?a=1#frag',
+                               params={'a': []}),
+            'http://example.com/?a=1#frag')
+
+
+if __name__ == '__main__':
+    unittest.main()
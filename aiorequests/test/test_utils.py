@@ -3,7 +3,9 @@ import asyncio
 
 import mock
 
-from aiorequests._utils import default_loop, default_pool, set_global_pool
+from aiorequests._utils import (
+    default_loop, default_pool, get_global_pool, set_global_pool
+)
 
 
 class DefaultReactorTests(unittest.TestCase):
@@ -24,41 +26,66 @@ class DefaultPoolTests(unittest.TestCase):
         pool_patcher = mock.patch('aiorequests._utils.ClientSession')
 
         self.HTTPConnectionPool = pool_patcher.start()
+        self.HTTPConnectionPool.return_value.closed = False
         self.addCleanup(pool_patcher.stop)
 
+        connector_patcher = mock.patch('aiorequests._utils.PooledConnector')
+
+        self.TCPConnector = connector_patcher.start()
+        self.addCleanup(connector_patcher.stop)
+
+        jar_patcher = mock.patch('aiorequests._utils.DummyCookieJar')
+
+        self.DummyCookieJar = jar_patcher.start()
+        self.addCleanup(jar_patcher.stop)
+
+        trace_patcher = mock.patch('aiorequests._utils.trace_config')
+
+        self.trace_config = trace_patcher.start()
+        self.addCleanup(trace_patcher.stop)
+
         self.reactor = mock.Mock()
+        self.HTTPConnectionPool.return_value._loop = self.reactor
 
-    @unittest.skip('Must skip until persistence is checked')
     def test_persistent_false(self):
         self.assertEqual(
             default_pool(self.reactor, None, False),
             self.HTTPConnectionPool.return_value
         )
 
+        self.TCPConnector.assert_called_once_with(
+            force_close=True, loop=self.reactor
+        )
         self.HTTPConnectionPool.assert_called_once_with(
-            self.reactor, persistent=False
+            connector=self.TCPConnector.return_value,
+            cookie_jar=self.DummyCookieJar.return_value,
+            trace_configs=[self.trace_config.return_value], loop=self.reactor
         )
 
-    @unittest.skip('Must skip until persistence is checked')
     def test_pool_none_persistent_none(self):
         self.assertEqual(
             default_pool(self.reactor, None, None),
             self.HTTPConnectionPool.return_value
         )
 
+        self.TCPConnector.assert_called_once_with(loop=self.reactor)
         self.HTTPConnectionPool.assert_called_once_with(
-            self.reactor, persistent=True
+            connector=self.TCPConnector.return_value,
+            cookie_jar=self.DummyCookieJar.return_value,
+            trace_configs=[self.trace_config.return_value], loop=self.reactor
         )
 
-    @unittest.skip('Must skip until persistence is checked')
     def test_pool_none_persistent_true(self):
         self.assertEqual(
             default_pool(self.reactor, None, True),
             self.HTTPConnectionPool.return_value
         )
 
+        self.TCPConnector.assert_called_once_with(loop=self.reactor)
         self.HTTPConnectionPool.assert_called_once_with(
-            self.reactor, persistent=True
+            connector=self.TCPConnector.return_value,
+            cookie_jar=self.DummyCookieJar.return_value,
+            trace_configs=[self.trace_config.return_value], loop=self.reactor
         )
 
     def test_cached_global_pool(self):
@@ -70,6 +97,17 @@ class DefaultPoolTests(unittest.TestCase):
 
         self.assertEqual(pool1, pool2)
 
+    def test_connector_options_get_a_private_pool(self):
+        shared = default_pool(self.reactor, None, None)
+        self.HTTPConnectionPool.return_value = mock.Mock(closed=False)
+
+        pool = default_pool(self.reactor, None, None, limit_per_host=4)
+
+        self.assertNotEqual(pool, shared)
+        self.assertEqual(get_global_pool(), shared)
+        self.TCPConnector.assert_called_with(loop=self.reactor,
+                                             limit_per_host=4)
+
     def test_specified_pool(self):
         pool = mock.Mock()
 
@@ -79,3 +117,27 @@ class DefaultPoolTests(unittest.TestCase):
         )
 
         self.HTTPConnectionPool.assert_not_called()
+
+    def test_closed_global_pool_is_replaced(self):
+        pool1 = default_pool(self.reactor, None, None)
+        pool1.closed = True
+
+        self.HTTPConnectionPool.return_value = mock.Mock(closed=False)
+
+        pool2 = default_pool(self.reactor, None, None)
+
+        self.assertNotEqual(pool1, pool2)
+        self.assertEqual(get_global_pool(), pool2)
+
+    def test_global_pool_of_another_loop_is_replaced(self):
+        pool1 = default_pool(self.reactor, None, None)
+        other = mock.Mock()
+
+        self.HTTPConnectionPool.return_value = mock.Mock(closed=False,
+                                                         _loop=other)
+
+        pool2 = default_pool(other, None, None)
+
+        self.assertNotEqual(pool1, pool2)
+        self.assertEqual(get_global_pool(), pool2)
+        self.assertEqual(default_pool(other, None, None), pool2)
@@ -4,6 +4,8 @@ import platform
 
 import mock
 
+from multidict import CIMultiDict
+
 import aiorequests
 
 # TODO: Change later
@@ -49,3 +51,52 @@ class Clock(object):
 
     def pump(self, timings):
         pass
+
+
+class FakeClock(object):
+    """
+    A ``clock`` callable that only moves when ``now`` is set.
+    """
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse(object):
+    """
+    Just enough of an ``aiohttp.ClientResponse`` for the client and its
+    policies.  ``body`` may be a future, which ``read`` waits for.
+    """
+    version = (1, 1)
+    reason = 'OK'
+
+    def __init__(self, status=200, headers=None, body=b'body',
+                 url='http://example.com/', content=None, cookies=None,
+                 on_release=None):
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDict(headers or {})
+        self.body = body
+        self.content = content
+        self.cookies = cookies
+        self.on_release = on_release
+        self.read_count = 0
+        self.released = False
+
+    @asyncio.coroutine
+    def read(self):
+        self.read_count += 1
+        if isinstance(self.body, asyncio.Future):
+            return (yield from self.body)
+        yield from asyncio.sleep(0)
+        return self.body
+
+    def release(self):
+        if not self.released and self.on_release is not None:
+            self.on_release()
+        self.released = True
+
+    def get_encoding(self):
+        return 'utf-8'
@@ -0,0 +1,302 @@
+"""
+Per-phase request deadlines on a shared, coarse-grained timer wheel.
+"""
+
+import asyncio
+import heapq
+import math
+
+import aiohttp
+
+
+try:
+    _current_task = asyncio.current_task
+except AttributeError:
+    _current_task = asyncio.Task.current_task
+
+
+class RequestTimeout(asyncio.TimeoutError):
+    """
+    A deadline of a request expired.  ``phase`` names which one.
+    """
+    phase = None
+
+    def __init__(self, timeout):
+        super(RequestTimeout, self).__init__(
+            '{0} timeout of {1}s expired.'.format(self.phase, timeout))
+        self.timeout = timeout
+
+
+class PoolTimeout(RequestTimeout):
+    phase = 'pool'
+
+
+class ConnectTimeout(RequestTimeout):
+    phase = 'connect'
+
+
+class FirstByteTimeout(RequestTimeout):
+    phase = 'first_byte'
+
+
+class ReadTimeout(RequestTimeout):
+    phase = 'read'
+
+
+class TotalTimeout(RequestTimeout):
+    phase = 'total'
+
+
+_EXCEPTIONS = dict((cls.phase, cls) for cls in (
+    PoolTimeout, ConnectTimeout, FirstByteTimeout, ReadTimeout, TotalTimeout))
+
+
+class Timeouts(object):
+    """
+    Deadlines of the phases of a request, in seconds; ``None`` for none.
+
+    :param float total: From sending the request until its body has been
+        read.
+    :param float connect: Opening a connection, including DNS and TLS.
+    :param float pool: Waiting for a free connection of the pool.
+    :param float first_byte: From having a connection until the response
+        headers arrive.
+    :param float read: Time without any bytes of the body arriving while it
+        is being read.
+
+    Every phase but ``total`` and ``read`` is observed through trace hooks
+    that pools made by aiorequests install; see :func:`trace_config`.
+    """
+    def __init__(self, total=None, connect=None, pool=None, first_byte=None,
+                 read=None):
+        self.total = total
+        self.connect = connect
+        self.pool = pool
+        self.first_byte = first_byte
+        self.read = read
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        Accept a :class:`Timeouts`, a number of seconds for ``total``, or
+        ``None``.
+        """
+        if isinstance(value, cls):
+            return value
+        return cls(total=value)
+
+    def __bool__(self):
+        return any(v is not None for v in (self.total, self.connect,
+                                           self.pool, self.first_byte,
+                                           self.read))
+
+    def __repr__(self):
+        return ('Timeouts(total={0!r}, connect={1!r}, pool={2!r}, '
+                'first_byte={3!r}, read={4!r})'.format(
+                    self.total, self.connect, self.pool, self.first_byte,
+                    self.read))
+
+
+class _WheelHandle(object):
+    __slots__ = ('_wheel', '_tick', '_callback', '_args')
+
+    def __init__(self, wheel, tick, callback, args):
+        self._wheel = wheel
+        self._tick = tick
+        self._callback = callback
+        self._args = args
+
+    def cancel(self):
+        if self._wheel is not None:
+            self._wheel._discard(self)
+            self._wheel = None
+
+
+class TimerWheel(object):
+    """
+    Schedules callbacks into slots of ``resolution`` seconds.  However many
+    are pending, the event loop only has one timer, for the earliest slot,
+    and cancelling is O(1); callbacks run up to ``resolution`` late.
+    """
+    def __init__(self, resolution=0.05, loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self.resolution = resolution
+        self._slots = {}
+        self._ticks = []
+        self._timer = None
+        self._timer_tick = None
+
+    def __len__(self):
+        return sum(len(slot) for slot in self._slots.values())
+
+    def call_later(self, delay, callback, *args):
+        tick = int(math.ceil((self._loop.time() + delay) / self.resolution))
+        handle = _WheelHandle(self, tick, callback, args)
+        slot = self._slots.get(tick)
+        if slot is None:
+            slot = self._slots[tick] = set()
+            heapq.heappush(self._ticks, tick)
+        slot.add(handle)
+        if self._timer_tick is None or tick < self._timer_tick:
+            self._schedule(tick)
+        return handle
+
+    def _discard(self, handle):
+        slot = self._slots.get(handle._tick)
+        if slot is not None:
+            slot.discard(handle)
+            if not slot:
+                # Its tick stays in the heap and is skipped when due.
+                del self._slots[handle._tick]
+
+    def _schedule(self, tick):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_tick = tick
+        self._timer = self._loop.call_at(tick * self.resolution, self._run)
+
+    def _run(self):
+        self._timer = self._timer_tick = None
+        now = int(math.floor(self._loop.time() / self.resolution))
+        while self._ticks and self._ticks[0] <= now:
+            tick = heapq.heappop(self._ticks)
+            for handle in self._slots.pop(tick, ()):
+                handle._wheel = None
+                handle._callback(*handle._args)
+        while self._ticks and self._ticks[0] not in self._slots:
+            heapq.heappop(self._ticks)
+        if self._ticks:
+            self._schedule(self._ticks[0])
+
+
+class Deadlines(object):
+    """
+    The deadlines of one request.  While a guarded awaitable runs, an
+    expiring deadline cancels the task running it and the awaitable raises
+    the :class:`RequestTimeout` of the phase instead.
+    """
+    def __init__(self, timeouts, wheel):
+        self.timeouts = timeouts
+        self._wheel = wheel
+        self._timers = {}
+        self._task = None
+        # Whether an expired deadline cancelled the guarded task.
+        self._cancelled = False
+        self.expired = None
+        self._arm('total')
+
+    def _arm(self, phase, callback=None, *args):
+        timeout = getattr(self.timeouts, phase)
+        if timeout is None:
+            return
+        self._disarm(phase)
+        self._timers[phase] = self._wheel.call_later(
+            timeout, callback or self._expire, phase, *args)
+
+    def _disarm(self, phase):
+        timer = self._timers.pop(phase, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _expire(self, phase):
+        self._timers.pop(phase, None)
+        if self.expired is None:
+            self.expired = phase
+        if self._task is not None and not self._cancelled:
+            self._cancelled = True
+            self._task.cancel()
+
+    def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    def _error(self):
+        return _EXCEPTIONS[self.expired](getattr(self.timeouts, self.expired))
+
+    @asyncio.coroutine
+    def guard(self, awaitable):
+        if self.expired is not None:
+            if hasattr(awaitable, 'close'):
+                awaitable.close()
+            raise self._error()
+        task = self._task = _current_task()
+        self._cancelled = False
+        try:
+            return (yield from awaitable)
+        except asyncio.CancelledError:
+            if self.expired is None:
+                raise
+            if self._cancelled:
+                # Take back our cancellation (Python 3.11+), so that it does
+                # not linger on the task, unless it was cancelled by someone
+                # else as well.
+                uncancel = getattr(task, 'uncancel', None)
+                if uncancel is not None and uncancel() > 0:
+                    raise
+            raise self._error() from None
+        finally:
+            self._task = None
+            self._cancelled = False
+
+    @asyncio.coroutine
+    def guard_read(self, response, awaitable):
+        """
+        Guard reading the body of ``response``, which is taking too long if
+        no bytes arrive for ``read`` seconds.
+        """
+        stream = getattr(response, 'content', None)
+        if hasattr(stream, 'total_bytes'):
+            self._arm('read', self._check_read, stream, stream.total_bytes)
+        try:
+            return (yield from self.guard(awaitable))
+        finally:
+            self._disarm('read')
+
+    def _check_read(self, phase, stream, seen):
+        if stream.total_bytes == seen and not stream.at_eof():
+            self._expire(phase)
+        else:
+            self._arm('read', self._check_read, stream, stream.total_bytes)
+
+    # Trace hooks
+
+    def connection_queued(self):
+        self._arm('pool')
+
+    def connection_dequeued(self):
+        self._disarm('pool')
+
+    def connecting(self):
+        self._arm('connect')
+
+    def connected(self):
+        self._disarm('connect')
+        self._arm('first_byte')
+
+    def headers_received(self):
+        self._disarm('first_byte')
+
+
+def _hook(name):
+    @asyncio.coroutine
+    def hook(session, context, params):
+        deadlines = context.trace_request_ctx
+        if isinstance(deadlines, Deadlines):
+            getattr(deadlines, name)()
+    return hook
+
+
+def trace_config():
+    """
+    Return an ``aiohttp.TraceConfig`` that reports the phases of requests
+    made with :class:`Deadlines` as their ``trace_request_ctx``.
+    """
+    config = aiohttp.TraceConfig()
+    config.on_connection_queued_start.append(_hook('connection_queued'))
+    config.on_connection_queued_end.append(_hook('connection_dequeued'))
+    config.on_connection_create_start.append(_hook('connecting'))
+    config.on_connection_create_end.append(_hook('connected'))
+    config.on_connection_reuseconn.append(_hook('connected'))
+    config.on_request_end.append(_hook('headers_received'))
+    return config
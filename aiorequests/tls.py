@@ -0,0 +1,118 @@
+"""
+Reusable TLS contexts and client-side session resumption.
+"""
+
+import ssl
+
+from collections import OrderedDict
+
+
+class TLSSessionStore(object):
+    """
+    Keep the most recent TLS session of every host so new connections can
+    resume it instead of running a full handshake.
+
+    :param int maxsize: Maximum number of hosts to remember.
+    """
+    def __init__(self, maxsize=1024):
+        self._maxsize = maxsize
+        self._sessions = OrderedDict()
+        self.resumed = 0
+        self.full_handshakes = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, host):
+        return self._sessions.get(host)
+
+    def set(self, host, session):
+        if session is None:
+            return
+        self._sessions.pop(host, None)
+        self._sessions[host] = session
+        while len(self._sessions) > self._maxsize:
+            self._sessions.popitem(last=False)
+
+    def discard(self, host):
+        self._sessions.pop(host, None)
+
+    def record(self, ssl_object):
+        """
+        Remember the session of a freshly handshaken ``ssl.SSLObject`` and
+        count whether it was resumed.
+        """
+        if ssl_object is None or ssl_object.server_hostname is None:
+            return
+        if ssl_object.session_reused:
+            self.resumed += 1
+        else:
+            self.full_handshakes += 1
+        self.set(ssl_object.server_hostname, ssl_object.session)
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    An ``ssl.SSLContext`` that offers the last session it saw for a host to
+    every new client connection to that host.
+    """
+    sessions = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        if (session is None and not server_side and server_hostname and
+                self.sessions is not None):
+            session = self.sessions.get(server_hostname)
+        return super(ResumingSSLContext, self).wrap_bio(
+            incoming, outgoing, server_side=server_side,
+            server_hostname=server_hostname, session=session)
+
+
+class SSLContextCache(object):
+    """
+    Build each distinct client ``SSLContext`` once and share it, together
+    with its :class:`TLSSessionStore`, between all connections.
+    """
+    def __init__(self):
+        self._contexts = {}
+
+    def context(self, verify=True, cafile=None, capath=None, certfile=None,
+                keyfile=None):
+        """
+        Return the context for the given verification settings.
+
+        :param bool verify: Verify the server certificate and host name.
+        :param str cafile: CA bundle to verify against instead of the system
+            defaults.
+        :param str capath: Directory of CA certificates.
+        :param str certfile: Client certificate to present.
+        :param str keyfile: Private key of ``certfile``.
+        """
+        key = (bool(verify), cafile, capath, certfile, keyfile)
+        context = self._contexts.get(key)
+        if context is None:
+            context = self._contexts[key] = self._build(*key)
+        return context
+
+    def contexts(self):
+        return list(self._contexts.values())
+
+    @staticmethod
+    def _build(verify, cafile, capath, certfile, keyfile):
+        context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+        context.options |= getattr(ssl, 'OP_NO_COMPRESSION', 0)
+        if verify:
+            context.check_hostname = True
+            context.verify_mode = ssl.CERT_REQUIRED
+        else:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        if cafile or capath:
+            context.load_verify_locations(cafile=cafile, capath=capath)
+        else:
+            context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+        if certfile:
+            context.load_cert_chain(certfile, keyfile)
+        context.sessions = TLSSessionStore()
+        return context
@@ -0,0 +1,113 @@
+"""
+Building request URLs without re-parsing and re-encoding them every time.
+"""
+
+import re
+
+from string import Formatter
+from urllib.parse import quote, urlencode, urlsplit
+
+
+# A scheme as RFC 3986 defines it, unless all that follows the colon is a
+# port, as urlsplit() tells them apart.
+_SCHEME = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*:(?![0-9]+$)')
+
+
+class EncodedParams(object):
+    """
+    Query parameters encoded once, to pass as ``params`` to any number of
+    requests.
+
+    :param params: ``dict`` or sequence of ``(name, value)`` pairs, as
+        ``params`` of a request takes, or an already encoded query string.
+    """
+    __slots__ = ('query',)
+
+    def __init__(self, params):
+        if isinstance(params, str):
+            self.query = params
+        else:
+            self.query = urlencode(params, doseq=True)
+
+    def __bool__(self):
+        return bool(self.query)
+
+    def __eq__(self, other):
+        return (isinstance(other, EncodedParams) and
+                self.query == other.query)
+
+    def __hash__(self):
+        return hash(self.query)
+
+    def __str__(self):
+        return self.query
+
+    def __repr__(self):
+        return 'EncodedParams({0!r})'.format(self.query)
+
+
+class BaseURL(object):
+    """
+    The URL an :class:`aiorequests.client.HTTPClient` made with
+    ``base_url`` resolves relative URLs against.
+
+    The path of the base is a prefix of every relative URL, whether that
+    starts with a slash or not: with a base of ``https://api.example.com/v1``
+    both ``users`` and ``/users`` are ``https://api.example.com/v1/users``.
+    URLs with a scheme are used as they are.
+    """
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if not parts.scheme or not parts.netloc:
+            raise ValueError("base URL must be absolute: {0!r}".format(url))
+        if parts.query or parts.fragment:
+            raise ValueError(
+                "base URL cannot have a query or fragment: {0!r}".format(url))
+        self.url = url
+        self._prefix = url if url.endswith('/') else url + '/'
+
+    def join(self, url):
+        if _SCHEME.match(url):
+            return url
+        return self._prefix + url.lstrip('/')
+
+    def __repr__(self):
+        return 'BaseURL({0!r})'.format(self.url)
+
+
+class PathTemplate(object):
+    """
+    A path such as ``'/users/{user}/posts/{post}'``, parsed once and filled
+    in with :meth:`expand`.
+
+    Values are percent-encoded, slashes included, so a value is always a
+    single path segment.
+    """
+    def __init__(self, template):
+        self.template = template
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion or field == '':
+                raise ValueError("path templates only take plain fields, "
+                                 "not {0!r}".format(template))
+            self._parts.append((literal, field))
+        self.fields = frozenset(field for _, field in self._parts if field)
+
+    def expand(self, **values):
+        """
+        Return the path with every field replaced by its value.
+
+        :raises KeyError: if a field has no value.
+        """
+        path = []
+        for literal, field in self._parts:
+            path.append(literal)
+            if field:
+                value = values[field]
+                if not isinstance(value, (str, bytes)):
+                    value = str(value)
+                path.append(quote(value, safe=''))
+        return ''.join(path)
+
+    def __repr__(self):
+        return 'PathTemplate({0!r})'.format(self.template)
@@ -0,0 +1,134 @@
+"""
+CPU per request of HTTPClient.request against a PreparedRequest sent again
+and again, and against request() as it was at the ``baseline`` revision,
+before requests had a pool, policies or a prepared path.  Requests go to a
+pool that answers at once, so only the work aiorequests does per request is
+measured.
+
+Run it from a git checkout; the baseline code is taken from the repository
+with ``git archive`` and timed in a process of its own:
+
+    python benchmarks/prepared.py [requests] [baseline revision]
+
+The baseline revision defaults to the first commit of the repository.
+"""
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Response(object):
+    url = 'http://example.com/'
+    status = 200
+    version = (1, 1)
+    reason = 'OK'
+    headers = {}
+
+
+@asyncio.coroutine
+def answer(method, url, **kwargs):
+    return Response()
+
+
+class Pool(object):
+    request = staticmethod(answer)
+
+
+KWARGS = dict(params={'q': 'search', 'page': 2},
+              headers={'Accept': 'application/json', 'X-Trace': ['a', 'b']},
+              cookies={'session': 'abc'}, auth=('user', 'secret'),
+              data=b'{"field": "value"}')
+
+URL = 'http://example.com/search'
+
+
+def measure(loop, send, n):
+    @asyncio.coroutine
+    def run():
+        for _ in range(n):
+            yield from send()
+
+    started = time.process_time()
+    loop.run_until_complete(run())
+    return (time.process_time() - started) / n * 1e6
+
+
+def measure_baseline(tree, n):
+    """
+    Time request() of the aiorequests in ``tree``, which sent requests with
+    ``aiohttp.request`` rather than through a pool.
+    """
+    sys.path.insert(0, tree)
+    import aiohttp
+    from aiorequests.client import HTTPClient
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    client = HTTPClient()
+    # A plain generator there, so it needs wrapping to be awaited.
+    send = asyncio.coroutine(HTTPClient.request)
+
+    def request():
+        return send(client, 'POST', URL, **KWARGS)
+
+    with mock.patch.object(aiohttp, 'request', answer):
+        measure(loop, request, 1000)
+        print(measure(loop, request, n))
+    loop.close()
+
+
+def baseline(revision, n):
+    if revision is None:
+        revision = subprocess.check_output(
+            ['git', 'rev-list', '--max-parents=0', 'HEAD'],
+            cwd=ROOT).decode('ascii').split()[-1]
+    archive = subprocess.check_output(
+        ['git', 'archive', revision, 'aiorequests'], cwd=ROOT)
+    with tempfile.TemporaryDirectory() as tree:
+        tarfile.open(fileobj=io.BytesIO(archive)).extractall(tree)
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--baseline-tree', tree, str(n)])
+    return revision, float(output)
+
+
+def main(n=20000, revision=None):
+    sys.path.insert(0, ROOT)
+    from aiorequests.client import HTTPClient
+
+    loop = asyncio.new_event_loop()
+    client = HTTPClient(pool=Pool(), loop=loop)
+    prepared = client.prepare('POST', URL, **KWARGS)
+
+    def request():
+        return client.request('POST', URL, **KWARGS)
+
+    # Warm up both paths first.
+    measure(loop, request, 1000)
+    measure(loop, prepared.send, 1000)
+
+    direct = measure(loop, request, n)
+    again = measure(loop, prepared.send, n)
+    loop.close()
+    revision, before = baseline(revision, n)
+
+    print('baseline request(): {0:7.1f} us/request ({1:.7})'.format(
+        before, revision))
+    print('request():          {0:7.1f} us/request'.format(direct))
+    print('prepared.send():    {0:7.1f} us/request'.format(again))
+    print('saved vs baseline:  {0:7.1%}'.format(1 - again / before))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--baseline-tree']:
+        measure_baseline(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:2]] + sys.argv[2:3])
@@ -1,14 +1,13 @@
 import asyncio
-import json
-from _utils import print_response
 
-import aiorequests
+from aiorequests.client import HTTPClient
+
 
 def download_file(*args):
     url, destination_filename = 'http://httpbin.org/get', 'download.txt'
-    destination = open(destination_filename, 'wb')
-    r = yield from aiorequests.get(url)
-    destination.write((yield from r.text()))
-    destination.close()
+    client = HTTPClient()
+    result = yield from client.download(url, destination_filename)
+    print('{0} bytes at {1:.0f} bytes/s'.format(result.size,
+                                                 result.throughput))
 
 asyncio.get_event_loop().run_until_complete(download_file())
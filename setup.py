@@ -24,9 +24,9 @@ setup(
     version=__version__,
     packages=find_packages(),
     install_requires=[
-        "aiohttp", "requests",
+        "aiohttp>=3.3",
     ],
-    package_data={"aiorequests": ["_version"]},
+    package_data={"aiorequests": ["_version", "test/server.pem"]},
     author="Jonathan Sandoval",
     author_email="jsandoval@utp.edu.co",
     classifiers=classifiers,